@@ -1,12 +1,17 @@
 import collections
+import logging
+from multiprocessing.pool import ThreadPool
 import warnings
 
 import numpy as np
 
 from nengo.builder.signal import Signal, SignalDict
 from nengo.builder.operator import TimeUpdate
-from nengo.cache import NoDecoderCache
-from nengo.exceptions import BuildError
+from nengo.cache import cache_stats, NoDecoderCache
+from nengo.exceptions import BuildError, ValidationError
+from nengo.utils.compat import iteritems
+
+logger = logging.getLogger(__name__)
 
 
 class Model(object):
@@ -20,13 +25,36 @@ class Model(object):
         A name or description to differentiate models.
     decoder_cache : DecoderCache, optional (Default: ``NoDecoderCache()``)
         Interface to a cache for expensive parts of the build process.
+    sparse_threshold : float or None, optional (Default: 0.1)
+        Large connection weight matrices with a smaller fraction of nonzero
+        elements are simulated as sparse matrices (see `.SparseDotInc`).
+        If None, only transforms given as sparse matrices are sparse.
+    validation : 'eager', 'deferred', or 'off', optional (Default: 'eager')
+        When operators are checked by calling their ``make_step`` function
+        (see `.Model.add_op`). If ``'eager'``, each operator is checked as it
+        is added. If ``'deferred'``, all operators are checked together after
+        the outermost call to `.Model.build`. If ``'off'``, operators are not
+        checked, and errors only occur when creating the `.Simulator`.
+    n_threads : int, optional (Default: None)
+        If greater than 1, the decoders of the connections in each network
+        are solved concurrently on a pool of this many threads.
 
     Attributes
     ----------
+    activity_cache : dict
+        Mapping from ensembles to their encoded evaluation points and
+        activities, which are shared by the connections leaving them.
+        Cleared at the end of the outermost `.Model.build`.
+    cache_stats : dict
+        Statistics on the use of the decoder cache while building this
+        model (see `.DecoderCache.stats`).
     config : Config or None
         Build functions can set a config object here to affect sub-builders.
     decoder_cache : DecoderCache
         Interface to a cache for expensive parts of the build process.
+    decoder_results : dict
+        Mapping from connections to the pending results of solving for their
+        decoders on ``solver_pool``.
     dt : float
         The length of each timestep, in seconds.
     label : str or None
@@ -40,6 +68,9 @@ class Model(object):
     probes : list
         List of all probes. Probes must be added to this list in the build
         process, as this list is used by Simulator.
+    probed_weights : set
+        Connections whose weights are probed. Their weights are always
+        simulated as dense matrices, so that the probed data has their shape.
     seeded : dict
         All objects are assigned a seed, whether the user defined the seed
         or it was automatically generated. 'seeded' keeps track of whether
@@ -49,10 +80,17 @@ class Model(object):
         ancestor network of the network in which the object resides.
     seeds : dict
         Mapping from objects to the integer seed assigned to that object.
+    sparse_threshold : float or None
+        Large connection weight matrices with a smaller fraction of nonzero
+        elements are simulated as sparse matrices.
+    n_threads : int or None
+        The number of threads on which decoders are solved.
     sig : dict
         A dictionary of dictionaries that organizes all of the signals
         created in the build process, as build functions often need to
         access signals created by other build functions.
+    solver_pool : `multiprocessing.pool.ThreadPool` or None
+        The thread pool on which decoders are solved while building.
     step : Signal
         The current step (i.e., how many timesteps have occurred thus far).
     time : Signal
@@ -61,12 +99,25 @@ class Model(object):
         The top-level network being built.
         This is sometimes useful for accessing network elements after build,
         or for the network builder to determine if it is the top-level network.
+    validation : str
+        When operators are checked by calling their ``make_step`` function.
     """
 
-    def __init__(self, dt=0.001, label=None, decoder_cache=NoDecoderCache()):
+    validation_modes = ('eager', 'deferred', 'off')
+
+    def __init__(self, dt=0.001, label=None, decoder_cache=NoDecoderCache(),
+                 sparse_threshold=0.1, validation='eager', n_threads=None):
+        if validation not in self.validation_modes:
+            raise ValidationError(
+                "Must be one of %s" % (self.validation_modes,),
+                attr='validation', obj=self)
+
         self.dt = dt
         self.label = label
         self.decoder_cache = decoder_cache
+        self.sparse_threshold = sparse_threshold
+        self.validation = validation
+        self.n_threads = n_threads
 
         # Will be filled in by the network builder
         self.toplevel = None
@@ -76,8 +127,15 @@ class Model(object):
         self.operators = []
         self.params = {}
         self.probes = []
+        self.probed_weights = set()
         self.seeds = {}
         self.seeded = {}
+        self._building = False
+        self._unvalidated = []
+        self.solver_pool = None
+        self.decoder_results = {}
+        self.activity_cache = {}
+        self.cache_stats = dict.fromkeys(cache_stats, 0)
 
         self.sig = collections.defaultdict(dict)
         self.sig['common'][0] = Signal(0., readonly=True, name='ZERO')
@@ -99,12 +157,45 @@ class Model(object):
         not properly initialized, which aids debugging. For that reason,
         we recommend calling this method over directly accessing
         the ``operators`` attribute.
+
+        Depending on ``validation``, the check is done immediately,
+        deferred until `.Model.validate` is called, or skipped.
         """
         self.operators.append(op)
-        # Fail fast by trying make_step with a temporary sigdict
+        if self.validation == 'eager':
+            # Fail fast by trying make_step with a temporary sigdict
+            signals = SignalDict()
+            op.init_signals(signals)
+            op.make_step(signals, self.dt, np.random)
+        elif self.validation == 'deferred':
+            self._unvalidated.append(op)
+
+    def validate(self):
+        """Check all operators added since the last call to this method.
+
+        Calls ``make_step`` on each operator, using a single `.SignalDict`
+        for all of them. This is called automatically at the end of
+        `.Model.build` when ``validation`` is ``'deferred'``.
+
+        Raises
+        ------
+        BuildError
+            If any operator fails; the message lists each failing operator
+            along with its error.
+        """
         signals = SignalDict()
-        op.init_signals(signals)
-        op.make_step(signals, self.dt, np.random)
+        errors = []
+        for op in self._unvalidated:
+            try:
+                op.init_signals(signals)
+                op.make_step(signals, self.dt, np.random)
+            except Exception as e:
+                errors.append("%s: %s: %s" % (op, type(e).__name__, e))
+        self._unvalidated = []
+
+        if len(errors) > 0:
+            raise BuildError("%d operator(s) failed validation:\n%s" % (
+                len(errors), "\n".join(errors)))
 
     def build(self, obj, *args, **kwargs):
         """Build an object into this model.
@@ -116,7 +207,35 @@ class Model(object):
         obj : object
             The object to build into this model.
         """
-        return Builder.build(self, obj, *args, **kwargs)
+        toplevel = not self._building
+        self._building = True
+        if toplevel:
+            stats_start = self.decoder_cache.stats()
+        if toplevel and self.n_threads is not None and self.n_threads > 1:
+            self.solver_pool = ThreadPool(self.n_threads)
+        try:
+            built = Builder.build(self, obj, *args, **kwargs)
+        finally:
+            if toplevel:
+                stats = self.decoder_cache.stats()
+                for name, value in iteritems(stats):
+                    self.cache_stats[name] += value - stats_start[name]
+                self._building = False
+                if self.solver_pool is not None:
+                    self.solver_pool.close()
+                    self.solver_pool.join()
+                    self.solver_pool = None
+                self.decoder_results.clear()
+                self.activity_cache.clear()
+
+        if toplevel and self.cache_stats['hits'] + self.cache_stats['misses']:
+            logger.info(
+                "Decoder cache: %(hits)d hits, %(misses)d misses, "
+                "%(time_saved).3f s saved, %(key_time).3f s hashing, "
+                "%(io_time).3f s reading and writing.", self.cache_stats)
+        if toplevel and self.validation == 'deferred':
+            self.validate()
+        return built
 
     def has_built(self, obj):
         """Returns true if the object has already been built in this model.
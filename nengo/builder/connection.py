@@ -1,4 +1,5 @@
 import collections
+import time
 
 import numpy as np
 
@@ -6,7 +7,8 @@ from nengo.builder import Builder, Signal
 from nengo.builder.ensemble import gen_eval_points, get_activities
 from nengo.builder.node import SimPyFunc
 from nengo.builder.operator import (
-    DotInc, ElementwiseInc, PreserveValue, Reset, SlicedCopy)
+    DotInc, ElementwiseInc, PreserveValue, Reset, SlicedCopy, SparseDotInc,
+    SpikeDotInc)
 from nengo.connection import Connection
 from nengo.dists import Distribution
 from nengo.ensemble import Ensemble, Neurons
@@ -14,6 +16,15 @@ from nengo.exceptions import BuildError, ObsoleteError
 from nengo.neurons import Direct
 from nengo.node import Node
 from nengo.utils.compat import is_iterable, itervalues
+from nengo.utils.numpy import is_spmatrix
+
+# Dense weight matrices with fewer elements are never made sparse,
+# since the optimizer can merge the corresponding DotInc operators
+SPARSE_MIN_SIZE = 10000
+# Dense products with fewer rows are faster than only using the columns
+# of neurons that spiked, and can be merged by the optimizer; this excludes
+# most decoded connections
+SPIKE_MIN_ROWS = 64
 
 built_attrs = ['eval_points', 'solver_info', 'weights', 'transform']
 
@@ -36,11 +47,13 @@ class BuiltConnection(collections.namedtuple('BuiltConnection', built_attrs)):
         Evaluation points.
     solver_info : dict
         Information dictionary returned by the `.Solver`.
-    weights : ndarray
+    weights : ndarray or scipy.sparse.csr_matrix
         Connection weights. May be synaptic connection weights defined in
         the connection's transform, or a combination of the decoders
         automatically solved for and the specified transform.
-    transform : ndarray
+        Sparse if the transform is a sparse matrix and the connection
+        is not decoded.
+    transform : ndarray or scipy.sparse.csr_matrix
         The transform matrix.
     """
 
@@ -93,40 +106,120 @@ def build_linear_system(model, conn, rng):
 
 
 def build_decoders(model, conn, rng, transform):
-    encoders = model.params[conn.pre_obj].encoders
-    gain = model.params[conn.pre_obj].gain
-    bias = model.params[conn.pre_obj].bias
+    """Solves for the weights of the decoded connection ``conn``.
+
+    If the connection is seeded, the weights are stored in the decoder
+    cache, keyed by everything they depend on, and loaded from there on
+    later builds. This skips computing the activities and solving for the
+    decoders, but not evaluating the connection function, since the cache
+    cannot tell whether the function has changed.
+    """
+    built_pre = model.params[conn.pre_obj]
+    gain = built_pre.gain
+    bias = built_pre.bias
 
     eval_points = get_eval_points(model, conn, rng)
     targets = get_targets(model, conn, eval_points)
 
-    x = np.dot(eval_points, encoders.T / conn.pre_obj.radius)
     E = None
     if conn.solver.weights:
         E = model.params[conn.post_obj].scaled_encoders.T[conn.post_slice]
+
+    key = None
+    if model.seeded[conn]:
+        key = model.decoder_cache.get_key(
+            BuiltConnection, model.seeds[conn], conn.solver,
+            conn.pre_obj.neuron_type, conn.pre_obj.radius, built_pre.encoders,
+            gain, bias, eval_points, targets, transform, E)
+    loaded = None if key is None else model.decoder_cache.load(key)
+    if loaded is not None:
+        solver_info, weights = loaded
+        return eval_points, weights, solver_info
+
+    start = time.time()
+    x, activities = get_encoded_activities(model, conn, eval_points)
+    if conn.solver.weights:
         # include transform in solved weights
         targets = multiply(targets, transform.T)
 
     try:
+        # results with a key are stored below, so only use the decoder
+        # cache's solver wrapper for seeded connections without one
         wrapped_solver = (model.decoder_cache.wrap_solver(solve_for_decoders)
-                          if model.seeded[conn] else solve_for_decoders)
+                          if model.seeded[conn] and key is None
+                          else solve_for_decoders)
         decoders, solver_info = wrapped_solver(
             conn.solver, conn.pre_obj.neuron_type, gain, bias, x, targets,
-            rng=rng, E=E)
+            rng=rng, E=E, activities=activities)
     except BuildError:
         raise BuildError(
             "Building %s: 'activities' matrix is all zero for %s. "
             "This is because no evaluation points fall in the firing "
             "ranges of any neurons." % (conn, conn.pre_obj))
 
-    weights = (decoders.T if conn.solver.weights else
-               multiply(transform, decoders.T))
+    # decoders may be memory-mapped from the decoder cache, so avoid copying
+    # them when the transform is the default scalar 1
+    weights = (decoders.T if conn.solver.weights or (
+        transform.ndim == 0 and transform == 1) else
+        multiply(transform, decoders.T))
+    if key is not None:
+        model.decoder_cache.store(key, solver_info, weights,
+                                  duration=time.time() - start)
     return eval_points, weights, solver_info
 
 
-def solve_for_decoders(
-        solver, neuron_type, gain, bias, x, targets, rng, E=None):
-    activities = neuron_type.rates(x, gain, bias)
+def solve_decoders_async(model, conns):
+    """Starts solving for the decoders of ``conns`` on ``model.solver_pool``.
+
+    The results are stored in ``model.decoder_results`` and used by
+    `.build_connection`. Each connection uses its own random number
+    generator seeded from ``model.seeds``, so the results do not depend on
+    the order in which the decoders are solved.
+    """
+    for conn in conns:
+        if (isinstance(conn.pre_obj, Ensemble)
+                and not isinstance(conn.pre_obj.neuron_type, Direct)
+                and conn not in model.params):
+            model.decoder_results[conn] = model.solver_pool.apply_async(
+                solve_connection_decoders, (model, conn))
+
+
+def solve_connection_decoders(model, conn):
+    """Solves for the decoders of ``conn`` as `.build_connection` would."""
+    rng = np.random.RandomState(model.seeds[conn])
+    transform = sample_transform(conn, rng)
+    if is_spmatrix(transform):
+        transform = transform.toarray()
+    return build_decoders(model, conn, rng, transform)
+
+
+def get_encoded_activities(model, conn, eval_points):
+    """Returns the encoded eval points and activities of ``conn.pre_obj``.
+
+    If the connection uses the ensemble's evaluation points, these are
+    computed once per build and shared by all connections leaving the
+    ensemble (see ``Model.activity_cache``). The shared arrays are readonly,
+    which lets solvers reuse factorizations of the activities.
+    """
+    ens = conn.pre_obj
+    if conn.eval_points is None and ens in model.activity_cache:
+        return model.activity_cache[ens]
+
+    built_ens = model.params[ens]
+    x = np.dot(eval_points, built_ens.encoders.T / ens.radius)
+    activities = ens.neuron_type.rates(x, built_ens.gain, built_ens.bias)
+    if conn.eval_points is not None:
+        return x, activities
+
+    x.setflags(write=False)
+    activities.setflags(write=False)
+    return model.activity_cache.setdefault(ens, (x, activities))
+
+
+def solve_for_decoders(solver, neuron_type, gain, bias, x, targets, rng,
+                       E=None, activities=None):
+    if activities is None:
+        activities = neuron_type.rates(x, gain, bias)
     if np.count_nonzero(activities) == 0:
         raise BuildError()
 
@@ -138,8 +231,23 @@ def solve_for_decoders(
     return decoders, solver_info
 
 
+def sample_transform(conn, rng):
+    """Returns the transform of ``conn``, sampled if it is a distribution."""
+    if isinstance(conn.transform, Distribution):
+        return conn.transform.sample(conn.size_out, conn.size_mid, rng=rng)
+    elif is_spmatrix(conn.transform):
+        return conn.transform
+    else:
+        return np.array(conn.transform)
+
+
 def multiply(x, y):
-    if x.ndim <= 2 and y.ndim < 2:
+    if is_spmatrix(y) and x.ndim < 2:
+        # scale the rows of the sparse matrix
+        y = y.tocsr(copy=True)
+        y.data *= np.repeat(np.broadcast_to(x, y.shape[:1]), np.diff(y.indptr))
+        return y
+    elif x.ndim <= 2 and y.ndim < 2:
         return x * y
     elif x.ndim < 2 and y.ndim == 2:
         return x.reshape(-1, 1) * y
@@ -161,6 +269,38 @@ def slice_signal(model, signal, sl):
         return sliced_signal
 
 
+def sparse_weights(model, conn, weights):
+    """Returns a CSR representation of ``weights`` if it should be sparse.
+
+    SciPy sparse matrices are always represented as sparse, unless the
+    weights are learned or probed. Dense matrices are represented as sparse
+    if they have a fraction of nonzero elements below
+    ``model.sparse_threshold``. Returns None for dense weights.
+    """
+    if conn.learning_rule is not None or conn in model.probed_weights:
+        return None
+    if is_spmatrix(weights):
+        return weights.data, weights.indices, weights.indptr
+    if (model.sparse_threshold is None or weights.ndim != 2
+            or weights.size < SPARSE_MIN_SIZE):
+        return None
+    if np.count_nonzero(weights) > model.sparse_threshold * weights.size:
+        return None
+
+    rows, cols = np.nonzero(weights)
+    indptr = np.zeros(weights.shape[0] + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=weights.shape[0]), out=indptr[1:])
+    return weights[rows, cols], cols, indptr
+
+
+def is_spiking(conn):
+    """Whether the input to the connection weights is a spike vector."""
+    pre = (conn.pre_obj.ensemble if isinstance(conn.pre_obj, Neurons)
+           else conn.pre_obj)
+    return (isinstance(pre, Ensemble)
+            and 'spikes' in pre.neuron_type.probeable)
+
+
 @Builder.register(Connection)  # noqa: C901
 def build_connection(model, conn):
     """Builds a `.Connection` object into a model.
@@ -220,9 +360,7 @@ def build_connection(model, conn):
     post_slice = conn.post_slice
 
     # Sample transform if given a distribution
-    transform = (conn.transform.sample(conn.size_out, conn.size_mid, rng=rng)
-                 if isinstance(conn.transform, Distribution) else
-                 np.array(conn.transform))
+    transform = sample_transform(conn, rng)
 
     # Figure out the signal going across this connection
     in_signal = model.sig[conn]['in']
@@ -238,8 +376,14 @@ def build_connection(model, conn):
         else:
             in_signal = sliced_in
     elif isinstance(conn.pre_obj, Ensemble):  # Normal decoded connection
-        eval_points, weights, solver_info = build_decoders(
-            model, conn, rng, transform)
+        if is_spmatrix(transform):
+            transform = transform.toarray()
+        if conn in model.decoder_results:
+            eval_points, weights, solver_info = model.decoder_results.pop(
+                conn).get()
+        else:
+            eval_points, weights, solver_info = build_decoders(
+                model, conn, rng, transform)
         if conn.solver.weights:
             model.sig[conn]['out'] = model.sig[conn.post_obj.neurons]['in']
             signal_size = conn.post_obj.neurons.size_in
@@ -252,16 +396,43 @@ def build_connection(model, conn):
         weights = multiply(
             model.params[conn.post_obj.ensemble].gain[post_slice], weights)
 
+    if is_spmatrix(weights) and (conn.learning_rule is not None
+                                 or conn in model.probed_weights):
+        weights = weights.toarray()
+
     # Add operator for applying weights
-    model.sig[conn]['weights'] = Signal(
-        weights, name="%s.weights" % conn, readonly=True)
     signal = Signal(np.zeros(signal_size), name="%s.weighted" % conn)
     model.add_op(Reset(signal))
-    op = ElementwiseInc if weights.ndim < 2 else DotInc
-    model.add_op(op(model.sig[conn]['weights'],
-                    in_signal,
-                    signal,
-                    tag="%s.weights_elementwiseinc" % conn))
+    csr = sparse_weights(model, conn, weights)
+    if csr is not None:
+        data, indices, indptr = csr
+        model.sig[conn]['weights'] = Signal(
+            data, name="%s.weights" % conn, readonly=True)
+        model.add_op(SparseDotInc(model.sig[conn]['weights'],
+                                  in_signal,
+                                  signal,
+                                  indices,
+                                  indptr,
+                                  tag="%s.weights_sparsedotinc" % conn))
+    elif (weights.ndim == 2 and weights.shape[0] >= SPIKE_MIN_ROWS
+            and is_spiking(conn)):
+        # column-major, so that the columns of the neurons that spiked are
+        # contiguous and SpikeDotInc does not need a transposed copy
+        model.sig[conn]['weights'] = Signal(
+            np.asfortranarray(weights), name="%s.weights" % conn,
+            readonly=True)
+        model.add_op(SpikeDotInc(model.sig[conn]['weights'],
+                                 in_signal,
+                                 signal,
+                                 tag="%s.weights_spikedotinc" % conn))
+    else:
+        model.sig[conn]['weights'] = Signal(
+            weights, name="%s.weights" % conn, readonly=True)
+        op = ElementwiseInc if weights.ndim < 2 else DotInc
+        model.add_op(op(model.sig[conn]['weights'],
+                        in_signal,
+                        signal,
+                        tag="%s.weights_elementwiseinc" % conn))
 
     # Add operator for filtering
     if conn.synapse is not None:
@@ -1,4 +1,5 @@
 import collections
+import time
 import warnings
 
 import numpy as np
@@ -106,6 +107,83 @@ def get_gain_bias(ens, rng=np.random):
     return gain, bias, max_rates, intercepts
 
 
+# The parameters that the BuiltEnsemble depends on, besides the seed
+ensemble_cache_params = ('n_neurons', 'dimensions', 'radius', 'encoders',
+                         'intercepts', 'max_rates', 'eval_points',
+                         'n_eval_points', 'neuron_type', 'gain', 'bias')
+
+
+def sample_ensemble(ens, rng):
+    """Generates the arrays used to build ``ens``.
+
+    The arrays are readonly, so that they can be shared by connections
+    and the decoder cache only needs to hash them once.
+
+    Returns
+    -------
+    BuiltEnsemble
+    """
+    eval_points = gen_eval_points(ens, ens.eval_points, rng=rng)
+
+    # Set up encoders
+    if isinstance(ens.neuron_type, Direct):
+        encoders = np.identity(ens.dimensions)
+    elif isinstance(ens.encoders, Distribution):
+        encoders = sample(ens.encoders, ens.n_neurons, ens.dimensions, rng=rng)
+    else:
+        encoders = npext.array(ens.encoders, min_dims=2, dtype=np.float64)
+    encoders /= npext.norm(encoders, axis=1, keepdims=True)
+
+    # Determine the neuron parameters
+    gain, bias, max_rates, intercepts = get_gain_bias(ens, rng)
+
+    # Scale the encoders
+    if isinstance(ens.neuron_type, Direct):
+        scaled_encoders = encoders
+    else:
+        scaled_encoders = encoders * (gain / ens.radius)[:, np.newaxis]
+
+    return readonly_ensemble(BuiltEnsemble(eval_points=eval_points,
+                                           encoders=encoders,
+                                           intercepts=intercepts,
+                                           max_rates=max_rates,
+                                           scaled_encoders=scaled_encoders,
+                                           gain=gain,
+                                           bias=bias))
+
+
+def readonly_ensemble(built_ens):
+    """Marks the arrays of a `.BuiltEnsemble` readonly and returns it."""
+    for x in built_ens:
+        if isinstance(x, np.ndarray):
+            x.setflags(write=False)
+    return built_ens
+
+
+def get_built_ensemble(model, ens, rng):
+    """Returns the arrays used to build ``ens``.
+
+    If the ensemble is seeded, the arrays are stored in the decoder cache,
+    keyed by the seed and the parameters of the ensemble, and loaded from
+    there on later builds instead of being generated again.
+    """
+    key = None
+    if model.seeded[ens]:
+        key = model.decoder_cache.get_key(
+            BuiltEnsemble, model.seeds[ens],
+            *[getattr(ens, attr) for attr in ensemble_cache_params])
+    loaded = None if key is None else model.decoder_cache.load(key)
+    if loaded is not None:
+        return readonly_ensemble(loaded[0])
+
+    start = time.time()
+    built_ens = sample_ensemble(ens, rng)
+    if key is not None:
+        model.decoder_cache.store(key, built_ens, np.zeros(0),
+                                  duration=time.time() - start)
+    return built_ens
+
+
 @Builder.register(Ensemble)  # noqa: C901
 def build_ensemble(model, ens):
     """Builds an `.Ensemble` object into a model.
@@ -125,7 +203,8 @@ def build_ensemble(model, ens):
 
     Some of these steps may be altered or omitted depending on the parameters
     of the ensemble, in particular the neuron type. For example, most steps are
-    omitted for the `.Direct` neuron type.
+    omitted for the `.Direct` neuron type. Steps 1 to 3 and 7 are skipped if
+    their results are found in the decoder cache (see `.get_built_ensemble`).
 
     Parameters
     ----------
@@ -142,25 +221,13 @@ def build_ensemble(model, ens):
     # Create random number generator
     rng = np.random.RandomState(model.seeds[ens])
 
-    eval_points = gen_eval_points(ens, ens.eval_points, rng=rng)
+    built_ens = get_built_ensemble(model, ens, rng)
 
     # Set up signal
     model.sig[ens]['in'] = Signal(np.zeros(ens.dimensions),
                                   name="%s.signal" % ens)
     model.add_op(Reset(model.sig[ens]['in']))
 
-    # Set up encoders
-    if isinstance(ens.neuron_type, Direct):
-        encoders = np.identity(ens.dimensions)
-    elif isinstance(ens.encoders, Distribution):
-        encoders = sample(ens.encoders, ens.n_neurons, ens.dimensions, rng=rng)
-    else:
-        encoders = npext.array(ens.encoders, min_dims=2, dtype=np.float64)
-    encoders /= npext.norm(encoders, axis=1, keepdims=True)
-
-    # Build the neurons
-    gain, bias, max_rates, intercepts = get_gain_bias(ens, rng)
-
     if isinstance(ens.neuron_type, Direct):
         model.sig[ens.neurons]['in'] = Signal(
             np.zeros(ens.dimensions), name='%s.neuron_in' % ens)
@@ -171,19 +238,14 @@ def build_ensemble(model, ens):
             np.zeros(ens.n_neurons), name="%s.neuron_in" % ens)
         model.sig[ens.neurons]['out'] = Signal(
             np.zeros(ens.n_neurons), name="%s.neuron_out" % ens)
-        bias_sig = Signal(bias, name="%s.bias" % ens, readonly=True)
+        bias_sig = Signal(built_ens.bias, name="%s.bias" % ens, readonly=True)
         model.add_op(Copy(src=bias_sig, dst=model.sig[ens.neurons]['in']))
         # This adds the neuron's operator and sets other signals
         model.build(ens.neuron_type, ens.neurons)
 
-    # Scale the encoders
-    if isinstance(ens.neuron_type, Direct):
-        scaled_encoders = encoders
-    else:
-        scaled_encoders = encoders * (gain / ens.radius)[:, np.newaxis]
-
-    model.sig[ens]['encoders'] = Signal(
-        scaled_encoders, name="%s.scaled_encoders" % ens, readonly=True)
+    model.sig[ens]['encoders'] = Signal(built_ens.scaled_encoders,
+                                        name="%s.scaled_encoders" % ens,
+                                        readonly=True)
 
     # Inject noise if specified
     if ens.noise is not None:
@@ -199,10 +261,4 @@ def build_ensemble(model, ens):
     # Output is neural output
     model.sig[ens]['out'] = model.sig[ens.neurons]['out']
 
-    model.params[ens] = BuiltEnsemble(eval_points=eval_points,
-                                      encoders=encoders,
-                                      intercepts=intercepts,
-                                      max_rates=max_rates,
-                                      scaled_encoders=scaled_encoders,
-                                      gain=gain,
-                                      bias=bias)
+    model.params[ens] = built_ens
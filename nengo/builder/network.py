@@ -4,6 +4,7 @@ import numpy as np
 
 import nengo.utils.numpy as npext
 from nengo.builder import Builder
+from nengo.builder.connection import solve_decoders_async
 from nengo.network import Network
 
 logger = logging.getLogger(__name__)
@@ -49,6 +50,9 @@ def build_network(model, network):
         model.toplevel = network
         model.seeds[network] = get_seed(network, np.random)
         model.seeded[network] = getattr(network, 'seed', None) is not None
+        model.probed_weights.update(
+            probe.obj for probe in network.all_probes
+            if probe.attr == 'weights')
 
     # Set config
     old_config = model.config
@@ -72,6 +76,8 @@ def build_network(model, network):
         model.build(subnetwork)
 
     logger.debug("Network step 3: Building connections")
+    if model.solver_pool is not None:
+        solve_decoders_async(model, network.connections)
     for conn in network.connections:
         # NB: we do these in the order in which they're defined, and build the
         # learning rule in the connection builder. Because learning rules are
@@ -8,7 +8,8 @@ from nengo.neurons import (
 class SimNeurons(Operator):
     """Set a neuron model output for the given input current.
 
-    Implements ``neurons.step_math(dt, J, output, *states)``.
+    Implements ``neurons.step_math(dt, J, output, *states)``, using the
+    step function returned by ``neurons.make_step``.
 
     Parameters
     ----------
@@ -64,9 +65,11 @@ class SimNeurons(Operator):
         output = signals[self.output]
         states = [signals[state] for state in self.states]
 
-        def step_simneurons():
-            self.neurons.step_math(dt, J, output, *states)
-        return step_simneurons
+        return self.neurons.make_step(dt, J, output, *states)
+
+    def make_batched_step(self, signals, dt, rng):
+        # ``step_math`` is elementwise, so it can handle the trial axis
+        return self.make_step(signals, dt, rng)
 
 
 @Builder.register(NeuronType)
@@ -178,6 +178,32 @@ class Operator(object):
         """
         raise NotImplementedError("subclasses must implement this method.")
 
+    def make_batched_step(self, signals, dt, rng):
+        """Returns a callable that performs the computation for all trials.
+
+        ``signals`` maps signals to ndarrays with a leading trial axis
+        (see `.TrialSignalDict`). By default, a step function is made with
+        `.Operator.make_step` for each trial, and all of them are called in
+        turn. Subclasses can override this method to compute all trials
+        with one vectorized call.
+
+        Parameters
+        ----------
+        signals : TrialSignalDict
+            A mapping from signals to their associated live ndarrays.
+        dt : float
+            Length of each simulation timestep, in seconds.
+        rng : `numpy.random.RandomState`
+            Random number generator for stochastic operators.
+        """
+        steps = [self.make_step(signals.trial(i), dt, rng)
+                 for i in range(signals.n_trials)]
+
+        def step_trials():
+            for step in steps:
+                step()
+        return step_trials
+
 
 class TimeUpdate(Operator):
     """Updates the simulation step and time.
@@ -234,6 +260,9 @@ class TimeUpdate(Operator):
 
         return step_timeupdate
 
+    def make_batched_step(self, signals, dt, rng):
+        return self.make_step(signals, dt, rng)
+
 
 class PreserveValue(Operator):
     """Marks a signal as ``set`` for the graph checker.
@@ -280,6 +309,9 @@ class PreserveValue(Operator):
             pass
         return step_preservevalue
 
+    def make_batched_step(self, signals, dt, rng):
+        return self.make_step(signals, dt, rng)
+
 
 class Reset(Operator):
     """Assign a constant value to a Signal.
@@ -333,6 +365,9 @@ class Reset(Operator):
             target[...] = value
         return step_reset
 
+    def make_batched_step(self, signals, dt, rng):
+        return self.make_step(signals, dt, rng)
+
 
 class Copy(Operator):
     """Assign the value of one signal to another.
@@ -386,6 +421,9 @@ class Copy(Operator):
             dst[...] = src
         return step_copy
 
+    def make_batched_step(self, signals, dt, rng):
+        return self.make_step(signals, dt, rng)
+
 
 class SlicedCopy(Operator):
     """Assign the value of a slice of one signal to another slice.
@@ -472,6 +510,25 @@ class SlicedCopy(Operator):
                 dst[dst_slice] = src[src_slice]
         return step_slicedcopy
 
+    def make_batched_step(self, signals, dt, rng):
+        def trial_slice(sig, index):
+            if index is Ellipsis or not signals.is_batched(sig):
+                return index
+            return (slice(None), index)
+
+        src = signals[self.src]
+        dst = signals[self.dst]
+        src_slice = trial_slice(self.src, self.src_slice)
+        dst_slice = trial_slice(self.dst, self.dst_slice)
+        inc = self.inc
+
+        def step_slicedcopy():
+            if inc:
+                dst[dst_slice] += src[src_slice]
+            else:
+                dst[dst_slice] = src[src_slice]
+        return step_slicedcopy
+
 
 class ElementwiseInc(Operator):
     """Increment signal ``Y`` by ``A * X`` (with broadcasting).
@@ -542,6 +599,19 @@ class ElementwiseInc(Operator):
             Y[...] += A * X
         return step_elementwiseinc
 
+    def make_batched_step(self, signals, dt, rng):
+        # check broadcasting shapes
+        self.make_step(signals.trial(0), dt, rng)
+
+        ndim = max(self.A.ndim, self.X.ndim, self.Y.ndim)
+        A = signals.expand(self.A, ndim)
+        X = signals.expand(self.X, ndim)
+        Y = signals.expand(self.Y, ndim)
+
+        def step_elementwiseinc():
+            Y[...] += A * X
+        return step_elementwiseinc
+
 
 def reshape_dot(A, X, Y, tag=None):
     """Checks if the dot product needs to be reshaped.
@@ -642,6 +712,331 @@ class DotInc(Operator):
             Y[...] += inc
         return step_dotinc
 
+    def make_batched_step(self, signals, dt, rng):
+        if not (self.A.ndim == 2 and self.X.ndim == 1 and self.Y.ndim == 1):
+            return super(DotInc, self).make_batched_step(signals, dt, rng)
+
+        A = signals[self.A]
+        X = signals[self.X]
+        Y = signals[self.Y]
+        A_batched = signals.is_batched(self.A)
+        X_batched = signals.is_batched(self.X)
+        if not A_batched:
+            AT = A.T
+
+            def step_dotinc():
+                Y[...] += np.dot(X, AT)
+        else:
+            subscripts = 'tij,%sj->ti' % ('t' if X_batched else '')
+
+            def step_dotinc():
+                Y[...] += np.einsum(subscripts, A, X)
+        return step_dotinc
+
+
+class BatchDotInc(Operator):
+    """Increment each block of ``Y`` by the product of blocks of ``A`` and ``X``.
+
+    Implements ``Y[i] += np.dot(A[i], X[i])`` for each block ``i``.
+
+    This is equivalent to a `.DotInc` with a block-diagonal matrix, and is
+    used by the optimizer to merge many `.DotInc` operators with
+    identically-shaped matrices into a single operator.
+
+    Parameters
+    ----------
+    A : Signal
+        The blocks of the first signal to be multiplied,
+        of shape ``(n_blocks, m, n)``.
+    X : Signal
+        The blocks of the second signal to be multiplied,
+        of shape ``(n_blocks, n)``.
+    Y : Signal
+        The blocks of the signal to be incremented,
+        of shape ``(n_blocks, m)``.
+    tag : str, optional (Default: None)
+        A label associated with the operator, for debugging purposes.
+
+    Attributes
+    ----------
+    A : Signal
+        The blocks of the first signal to be multiplied.
+    tag : str or None
+        A label associated with the operator, for debugging purposes.
+    X : Signal
+        The blocks of the second signal to be multiplied.
+    Y : Signal
+        The blocks of the signal to be incremented.
+
+    Notes
+    -----
+    1. sets ``[]``
+    2. incs ``[Y]``
+    3. reads ``[A, X]``
+    4. updates ``[]``
+    """
+
+    def __init__(self, A, X, Y, tag=None):
+        super(BatchDotInc, self).__init__(tag=tag)
+
+        if A.ndim != 3 or X.ndim != 2 or Y.ndim != 2:
+            raise BuildError("A must have 3 dimensions, X and Y must have 2")
+        if (A.shape[0] != X.shape[0] or A.shape[0] != Y.shape[0]
+                or A.shape[1] != Y.shape[1] or A.shape[2] != X.shape[1]):
+            raise BuildError("shape mismatch in %s: %s x %s -> %s"
+                             % (tag, A.shape, X.shape, Y.shape))
+
+        self.A = A
+        self.X = X
+        self.Y = Y
+
+        self.sets = []
+        self.incs = [Y]
+        self.reads = [A, X]
+        self.updates = []
+
+    def _descstr(self):
+        return '%s, %s -> %s' % (self.A, self.X, self.Y)
+
+    def make_step(self, signals, dt, rng):
+        X = signals[self.X]
+        A = signals[self.A]
+        Y = signals[self.Y]
+
+        def step_batchdotinc():
+            Y[...] += np.einsum('ijk,ik->ij', A, X)
+        return step_batchdotinc
+
+    def make_batched_step(self, signals, dt, rng):
+        X = signals[self.X]
+        A = signals[self.A]
+        Y = signals[self.Y]
+        A_trials = 't' if signals.is_batched(self.A) else ''
+        X_trials = 't' if signals.is_batched(self.X) else ''
+        subscripts = '%sijk,%sik->%sij' % (
+            A_trials, X_trials, 't' if A_trials or X_trials else '')
+
+        def step_batchdotinc():
+            Y[...] += np.einsum(subscripts, A, X)
+        return step_batchdotinc
+
+
+class SparseDotInc(Operator):
+    """Increment signal ``Y`` by ``dot(A, X)`` for a sparse matrix ``A``.
+
+    ``A`` is stored in compressed sparse row (CSR) format. Only the nonzero
+    values of ``A`` are stored in a signal; the sparsity structure
+    (``indices`` and ``indptr``, as in `scipy.sparse.csr_matrix`) is
+    fixed when the operator is created.
+
+    If SciPy is installed, the product is computed with
+    `scipy.sparse.csr_matrix`; otherwise, it is computed with NumPy.
+
+    Parameters
+    ----------
+    A : Signal
+        The nonzero values of the sparse matrix, in CSR order.
+    X : Signal
+        The signal to be multiplied (a vector).
+    Y : Signal
+        The signal to be incremented.
+    indices : (nnz,) array_like
+        The column index of each nonzero value.
+    indptr : (n_rows + 1,) array_like
+        The nonzero values of row ``i`` are ``A[indptr[i]:indptr[i+1]]``.
+    tag : str, optional (Default: None)
+        A label associated with the operator, for debugging purposes.
+
+    Attributes
+    ----------
+    A : Signal
+        The nonzero values of the sparse matrix.
+    indices : ndarray
+        The column index of each nonzero value.
+    indptr : ndarray
+        The index in ``A`` of the first nonzero value of each row.
+    shape : tuple
+        The shape of the sparse matrix.
+    tag : str or None
+        A label associated with the operator, for debugging purposes.
+    X : Signal
+        The signal to be multiplied.
+    Y : Signal
+        The signal to be incremented.
+
+    Notes
+    -----
+    1. sets ``[]``
+    2. incs ``[Y]``
+    3. reads ``[A, X]``
+    4. updates ``[]``
+    """
+
+    def __init__(self, A, X, Y, indices, indptr, tag=None):
+        super(SparseDotInc, self).__init__(tag=tag)
+
+        self.indices = np.array(indices, dtype=np.int32)
+        self.indptr = np.array(indptr, dtype=np.int32)
+        self.shape = (Y.size, X.size)
+        if A.ndim != 1 or X.ndim != 1 or Y.ndim != 1:
+            raise BuildError("A, X and Y must be vectors")
+        if (self.indices.shape != A.shape
+                or self.indptr.shape != (Y.size + 1,)
+                or self.indptr[-1] != A.size):
+            raise BuildError("sparsity structure does not match %s in %s"
+                             % (A, tag))
+        if A.size > 0 and self.indices.max() >= X.size:
+            raise BuildError("column indices out of range for %s in %s"
+                             % (X, tag))
+
+        self.A = A
+        self.X = X
+        self.Y = Y
+
+        self.sets = []
+        self.incs = [Y]
+        self.reads = [A, X]
+        self.updates = []
+
+    def _descstr(self):
+        return '%s, %s -> %s' % (self.A, self.X, self.Y)
+
+    def make_step(self, signals, dt, rng):
+        X = signals[self.X]
+        A = signals[self.A]
+        Y = signals[self.Y]
+
+        try:
+            import scipy.sparse
+        except ImportError:
+            rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+            indices = self.indices
+            n_rows = self.shape[0]
+
+            def step_sparsedotinc():
+                Y[...] += np.bincount(
+                    rows, weights=A * X[indices], minlength=n_rows)
+        else:
+            matrix = scipy.sparse.csr_matrix(
+                (A, self.indices, self.indptr), shape=self.shape, copy=False)
+            matrix.data = A  # always read the current values of A
+
+            def step_sparsedotinc():
+                Y[...] += matrix.dot(X)
+        return step_sparsedotinc
+
+
+class SpikeDotInc(Operator):
+    """Increment signal ``Y`` by ``dot(A, X)`` for a spike vector ``X``.
+
+    Implements ``Y[...] += np.dot(A, X)`` like `.DotInc`, but only uses the
+    columns of ``A`` for which ``X`` is nonzero. Since most neurons do not
+    spike on any given timestep, this is much faster than a dense product
+    when ``A`` has many rows (e.g., a weight matrix between two
+    populations of neurons).
+
+    The columns of ``A`` are read fastest if they are contiguous in memory,
+    i.e. if ``A`` is stored in column-major (Fortran) order, as done by the
+    builder. Otherwise they are gathered from ``A`` on each step; ``A`` is
+    never copied.
+
+    Parameters
+    ----------
+    A : Signal
+        The first signal to be multiplied (a matrix).
+    X : Signal
+        The spikes to be multiplied (a vector).
+    Y : Signal
+        The signal to be incremented.
+    tag : str, optional (Default: None)
+        A label associated with the operator, for debugging purposes.
+
+    Attributes
+    ----------
+    A : Signal
+        The first signal to be multiplied.
+    tag : str or None
+        A label associated with the operator, for debugging purposes.
+    X : Signal
+        The spikes to be multiplied.
+    Y : Signal
+        The signal to be incremented.
+
+    Notes
+    -----
+    1. sets ``[]``
+    2. incs ``[Y]``
+    3. reads ``[A, X]``
+    4. updates ``[]``
+    """
+
+    def __init__(self, A, X, Y, tag=None):
+        super(SpikeDotInc, self).__init__(tag=tag)
+
+        if A.ndim != 2 or X.ndim != 1 or Y.ndim != 1:
+            raise BuildError("A must be a matrix, X and Y must be vectors")
+        if A.shape != (Y.size, X.size):
+            raise BuildError("shape mismatch in %s: %s x %s -> %s"
+                             % (tag, A.shape, X.shape, Y.shape))
+
+        self.A = A
+        self.X = X
+        self.Y = Y
+
+        self.sets = []
+        self.incs = [Y]
+        self.reads = [A, X]
+        self.updates = []
+
+    def _descstr(self):
+        return '%s, %s -> %s' % (self.A, self.X, self.Y)
+
+    def make_step(self, signals, dt, rng):
+        X = signals[self.X]
+        Y = signals[self.Y]
+        columns = self._columns(signals[self.A])
+
+        def step_spikedotinc():
+            spiked = np.flatnonzero(X)
+            if spiked.size > 0:
+                Y[...] += np.dot(X[spiked], columns(spiked))
+        return step_spikedotinc
+
+    def make_batched_step(self, signals, dt, rng):
+        A = signals[self.A]
+        AT = A.T
+        if (signals.is_batched(self.A) or not signals.is_batched(self.X)
+                or not AT.flags.c_contiguous):
+            return super(SpikeDotInc, self).make_batched_step(
+                signals, dt, rng)
+
+        try:
+            import scipy.sparse
+        except ImportError:
+            # each trial reads the columns of ``A`` shared by all trials
+            return super(SpikeDotInc, self).make_batched_step(
+                signals, dt, rng)
+
+        X = signals[self.X]
+        Y = signals[self.Y]
+
+        def step_spikedotinc():
+            # only the rows of ``AT`` for each spike in each trial are added
+            Y[...] += scipy.sparse.csr_matrix(X).dot(AT)
+        return step_spikedotinc
+
+    @staticmethod
+    def _columns(A):
+        """Returns a function giving the columns of ``A`` at some indices.
+
+        The columns are returned as the rows of a matrix. If ``A`` is in
+        column-major order, they are read from a transposed view of ``A``.
+        """
+        AT = A.T
+        if AT.flags.c_contiguous:
+            return lambda spiked: AT[spiked]
+        return lambda spiked: A[:, spiked].T
+
 
 class SimPyFunc(Operator):
     """Apply a Python function to a signal, with optional arguments.
@@ -0,0 +1,570 @@
+"""Operator graph optimizations for the reference simulator.
+
+The reference simulator calls one Python function per operator per timestep.
+For large models, the overhead of these calls can dominate the actual
+computation. The optimizer in this module reduces that overhead by merging
+operators of the same type that do not depend on each other into single
+operators acting on contiguous blocks of memory.
+"""
+
+import logging
+from collections import defaultdict, OrderedDict
+
+import numpy as np
+
+from nengo.builder.neurons import SimNeurons
+from nengo.builder.operator import (
+    BatchDotInc, Copy, DotInc, ElementwiseInc, Reset, SlicedCopy)
+from nengo.builder.processes import SimProcess
+from nengo.builder.signal import Signal
+from nengo.synapses import LinearFilter
+from nengo.utils.compat import iteritems, itervalues
+from nengo.utils.simulator import (
+    operator_depencency_graph, operator_layers)
+
+logger = logging.getLogger(__name__)
+
+
+def optimize(model, dg, max_passes=None):
+    """Merges operators in ``model`` to reduce the per-step overhead.
+
+    Operators of the same type that are in the same layer of the dependency
+    graph (i.e., that cannot depend on each other) are merged into a single
+    operator if their signals can be laid out contiguously in memory.
+    Base signals are concatenated as necessary to achieve this; all operators
+    and entries in ``model.sig`` referring to those signals are updated to
+    refer to views on the concatenated signals instead.
+
+    The merged operators compute the same values as the original operators,
+    so the results of the simulation do not change, except for rounding
+    differences in dot products (whose rounding depends on the alignment
+    of the signals in memory).
+
+    Concatenating base signals copies them, including readonly signals
+    that are memory maps of decoder cache files. Merging these is still
+    worth it: in a chain of 300 cached 50-neuron ensembles, merging the
+    memory-mapped weights takes about 0.5 ms per step, while leaving them
+    unmerged takes about 1.9 ms per step, and copying them does not
+    measurably slow down the build.
+
+    Parameters
+    ----------
+    model : Model
+        The model to optimize. ``model.operators`` and ``model.sig``
+        will be modified in place.
+    dg : dict
+        The dependency graph of the operators in ``model``.
+    max_passes : int, optional (Default: None)
+        Maximum number of merging passes. Merges done in one pass may enable
+        further merges in the next pass. If None, passes will be done until
+        no more operators can be merged.
+
+    Returns
+    -------
+    dict
+        The dependency graph of the optimized operators.
+    """
+    n_initial = len(model.operators)
+    merger = OpMerger(model)
+
+    n_passes = 0
+    while max_passes is None or n_passes < max_passes:
+        n_passes += 1
+        if not merger.merge_pass(dg):
+            break
+        dg = operator_depencency_graph(model.operators)
+
+    merger.update_model_signals()
+    logger.info("Optimizer merged %d operators into %d in %d passes.",
+                n_initial, len(model.operators), n_passes)
+    return dg
+
+
+class OpMerger(object):
+    """Merges operators of a model and keeps track of replaced signals.
+
+    Signals that are concatenated into a new base signal are said to be
+    *moved*. Operators referring to moved signals (or views on them) are
+    updated right away, so that the signals of all operators always reflect
+    the current memory layout. Other references (e.g., in ``model.sig``)
+    are updated at the end with `.OpMerger.update_model_signals`.
+
+    Parameters
+    ----------
+    model : Model
+        The model whose operators will be merged.
+    """
+
+    mergers = {}
+
+    def __init__(self, model):
+        self.model = model
+        self.moved = {}  # moved base signal -> (new base signal, byte offset)
+        self.replacements = {}  # moved signal -> view on the new base
+        self.users = defaultdict(set)  # base signal -> ops using it
+        self.base_order = {}  # base signal -> int, for deterministic sorting
+        for op in model.operators:
+            self._add_user(op)
+
+    @classmethod
+    def register(cls, op_type):
+        """A decorator for adding a merger to the registry.
+
+        Parameters
+        ----------
+        op_type : type
+            The operator type that can be merged by the decorated
+            `.Merger` subclass.
+        """
+        def register_merger(merger_cls):
+            cls.mergers[op_type] = merger_cls()
+            return merger_cls
+        return register_merger
+
+    def merge_pass(self, dg):
+        """Does one pass of merging over all operators.
+
+        Returns True if any operators were merged.
+        """
+        layers = operator_layers(dg)
+        buckets = OrderedDict()
+        for op in self.model.operators:
+            if type(op) in self.mergers:
+                buckets.setdefault((layers[op], type(op)), []).append(op)
+
+        def bucket_order(item):
+            (layer, op_type), _ = item
+            return (-self.mergers[op_type].priority, layer)
+
+        merged = {}  # original op -> merged op
+        for (_, op_type), ops in sorted(iteritems(buckets), key=bucket_order):
+            merger = self.mergers[op_type]
+            for mode, group in merger.group(ops):
+                for run in self._runs(merger, mode, group):
+                    new_op = self._merge_run(merger, mode, run)
+                    if new_op is not None:
+                        for op in run:
+                            merged[op] = new_op
+
+        if len(merged) == 0:
+            return False
+        self._replace_ops(merged)
+        return True
+
+    def _replace_ops(self, merged):
+        """Replaces merged ops in the model, keeping the order of ops."""
+        operators = []
+        added = set()
+        for op in self.model.operators:
+            op = merged.get(op, op)
+            if op not in added:
+                operators.append(op)
+                added.add(op)
+        self.model.operators[:] = operators
+
+    def update_model_signals(self):
+        """Replaces moved signals referenced by the model."""
+        for sigs in itervalues(self.model.sig):
+            for key, sig in list(iteritems(sigs)):
+                if isinstance(sig, Signal):
+                    sigs[key] = self.current(sig)
+        self.model.step = self.current(self.model.step)
+        self.model.time = self.current(self.model.time)
+
+    def current(self, sig):
+        """Returns the signal referring to the current location of ``sig``."""
+        while sig.base in self.moved:
+            if sig not in self.replacements:
+                base, offset = self.moved[sig.base]
+                view = np.ndarray(
+                    shape=sig.shape, dtype=sig.dtype, strides=sig.strides,
+                    buffer=base.initial_value,
+                    offset=offset + sig.offset - sig.base.offset)
+                self.replacements[sig] = Signal(
+                    view, name=sig.name, base=base, readonly=sig.readonly)
+            sig = self.replacements[sig]
+        return sig
+
+    def _add_user(self, op):
+        for sig in op.all_signals:
+            self.users[sig.base].add(op)
+            self.base_order.setdefault(sig.base, len(self.base_order))
+
+    def _remove_user(self, op):
+        for sig in op.all_signals:
+            self.users[sig.base].discard(op)
+
+    def _update_op(self, op):
+        for key, value in list(iteritems(vars(op))):
+            if isinstance(value, Signal):
+                op.__dict__[key] = self.current(value)
+            elif isinstance(value, (list, tuple)) and any(
+                    isinstance(v, Signal) for v in value):
+                op.__dict__[key] = type(value)(
+                    self.current(v) if isinstance(v, Signal) else v
+                    for v in value)
+
+    def _sort_key(self, sig):
+        return (self.base_order.setdefault(sig.base, len(self.base_order)),
+                sig.offset)
+
+    def _runs(self, merger, mode, ops):
+        """Splits ``ops`` into runs of operators that can be merged."""
+        def sort_key(op):
+            return [self._sort_key(s) for s in merger.signals(op, mode)[0]]
+
+        ops = sorted(ops, key=sort_key)
+        runs = []
+        run = SignalRun(*merger.signals(ops[0], mode))
+        run_ops = [ops[0]]
+        for op in ops[1:]:
+            if run.extend(*merger.signals(op, mode)):
+                run_ops.append(op)
+            else:
+                if len(run_ops) > 1:
+                    runs.append(run_ops)
+                run = SignalRun(*merger.signals(op, mode))
+                run_ops = [op]
+        if len(run_ops) > 1:
+            runs.append(run_ops)
+        return runs
+
+    def _merge_run(self, merger, mode, ops):
+        # previous merges may have moved signals, so check the run again
+        run = SignalRun(*merger.signals(ops[0], mode))
+        if not all(run.extend(*merger.signals(op, mode)) for op in ops[1:]):
+            return None
+
+        concat = []
+        for sigs, kind in zip(run.concat, run.kinds):
+            if kind == SignalRun.WHOLE:
+                concat.append(self._concatenate(sigs))
+            else:
+                concat.append(self._span(sigs))
+        shared = run.shared
+
+        for op in ops:
+            self._remove_user(op)
+        new_op = merger.merge(ops, mode, concat, shared)
+        self._add_user(new_op)
+        return new_op
+
+    def _concatenate(self, sigs):
+        """Concatenates the bases of ``sigs`` into a new base signal.
+
+        Each of ``sigs`` must cover all of its base signal.
+        """
+        new_base = Signal(
+            np.concatenate([s.initial_value for s in sigs], axis=0),
+            name="merged<%s, ..., %s>" % (sigs[0].name, sigs[-1].name),
+            readonly=sigs[0].readonly)
+
+        offset = 0
+        for sig in sigs:
+            self.moved[sig.base] = (new_base, offset)
+            offset += sig.initial_value.nbytes
+
+        for sig in sigs:
+            for op in self.users.pop(sig.base, ()):
+                self._update_op(op)
+                self.users[new_base].add(op)
+        return new_base
+
+    @staticmethod
+    def _span(sigs):
+        """Returns a view spanning contiguous views of the same base."""
+        base = sigs[0].base
+        start = sigs[0].elemoffset - base.elemoffset
+        stop = sigs[-1].elemoffset - base.elemoffset + sigs[-1].size
+        shape = (sum(s.shape[0] for s in sigs),) + sigs[0].shape[1:]
+        if (start == 0 and shape == base.shape and
+                base.readonly == sigs[0].readonly):
+            return base
+        view = base.reshape(-1)[start:stop].reshape(shape)
+        view.readonly = sigs[0].readonly
+        return view
+
+
+def reshape(sig, shape):
+    """Reshapes ``sig``, keeping it readonly if it was readonly."""
+    view = sig.reshape(shape)
+    view.readonly = sig.readonly
+    return view
+
+
+class SignalRun(object):
+    """Tracks whether the signals of several operators can be merged.
+
+    Each operator has a list of signals that will be concatenated with the
+    corresponding signals of the other operators, and a list of signals
+    that must be shared by all operators.
+
+    Signals in a concatenated slot must either all cover their whole base
+    signal (in which case the bases will be concatenated into a new base
+    signal), or all be views on the same base signal directly following each
+    other in memory (in which case a view spanning them will be used).
+    """
+
+    WHOLE = 'whole'
+    SPAN = 'span'
+
+    def __init__(self, concat, shared):
+        self.concat = [[sig] for sig in concat]
+        self.kinds = [None for _ in concat]
+        self.shared = shared
+        self.concat_bases = set(
+            sig.base for sig in concat if self.whole(sig))
+        self.other_bases = set(
+            sig.base for sig in concat if not self.whole(sig)).union(
+                sig.base for sig in shared)
+
+    @staticmethod
+    def whole(sig):
+        """Whether ``sig`` refers to all of its base, in the same order."""
+        base = sig.base
+        return (sig.ndim >= 1 and sig.size > 0 and sig.size == base.size and
+                sig.offset == base.offset and sig.readonly == base.readonly and
+                sig.initial_value.flags.c_contiguous and
+                base.initial_value.flags.c_contiguous)
+
+    @staticmethod
+    def follows(sig, last):
+        """Whether ``sig`` directly follows ``last`` in memory."""
+        return (sig.base is last.base and
+                sig.offset == last.offset + last.initial_value.nbytes and
+                sig.initial_value.flags.c_contiguous and
+                last.initial_value.flags.c_contiguous)
+
+    def extend(self, concat, shared):
+        """Adds the signals of another operator if they can be merged."""
+        if len(shared) != len(self.shared) or any(
+                s is not t for s, t in zip(shared, self.shared)):
+            return False
+
+        kinds = []
+        new_concat_bases = set()
+        new_other_bases = set()
+        for sigs, kind, sig in zip(self.concat, self.kinds, concat):
+            first, last = sigs[0], sigs[-1]
+            if (sig.dtype != first.dtype or sig.ndim != first.ndim or
+                    sig.ndim < 1 or sig.shape[1:] != first.shape[1:] or
+                    sig.readonly != first.readonly):
+                return False
+
+            if (kind != self.SPAN and self.whole(sig) and self.whole(last)
+                    and sig.base is not last.base):
+                if (sig.base in self.concat_bases or
+                        sig.base in self.other_bases or
+                        sig.base in new_concat_bases or
+                        sig.base in new_other_bases):
+                    return False
+                new_concat_bases.add(sig.base)
+                kinds.append(self.WHOLE)
+            elif kind != self.WHOLE and self.follows(sig, last):
+                if (sig.base in self.concat_bases or
+                        sig.base in new_concat_bases):
+                    return False
+                new_other_bases.add(sig.base)
+                kinds.append(self.SPAN)
+            else:
+                return False
+
+        for sigs, sig in zip(self.concat, concat):
+            sigs.append(sig)
+        self.kinds = kinds
+        self.concat_bases.update(new_concat_bases)
+        self.other_bases.update(new_other_bases)
+        return True
+
+
+class Merger(object):
+    """Describes how to merge operators of a particular type.
+
+    Subclasses should be registered with `.OpMerger.register`.
+
+    Attributes
+    ----------
+    priority : int
+        Operators of mergers with higher priority are merged first in each
+        pass, so that their signals are laid out as they require. Other
+        operators are merged in the order of their dependency graph layers.
+    """
+
+    priority = 0
+
+    def group(self, ops):
+        """Partitions ``ops`` into groups of potentially mergeable operators.
+
+        Returns a list of ``(mode, ops)`` tuples, where ``mode`` will be
+        passed to `.Merger.signals` and `.Merger.merge`.
+        """
+        groups = OrderedDict()
+        for op in ops:
+            key = self.key(op)
+            if key is not None:
+                groups.setdefault(key, []).append(op)
+        return [(None, group) for group in itervalues(groups)
+                if len(group) > 1]
+
+    def key(self, op):
+        """Operators with equal keys are compatible; None if not mergeable."""
+        return ()
+
+    def signals(self, op, mode):
+        """Returns the concatenated and the shared signals of ``op``."""
+        raise NotImplementedError("Mergers must implement signals")
+
+    def merge(self, ops, mode, concat, shared):
+        """Creates the merged operator from the merged signals."""
+        raise NotImplementedError("Mergers must implement merge")
+
+
+@OpMerger.register(Reset)
+class ResetMerger(Merger):
+    def key(self, op):
+        return op.value
+
+    def signals(self, op, mode):
+        return [op.dst], []
+
+    def merge(self, ops, mode, concat, shared):
+        return Reset(concat[0], value=ops[0].value)
+
+
+@OpMerger.register(Copy)
+class CopyMerger(Merger):
+    def signals(self, op, mode):
+        return [op.src, op.dst], []
+
+    def merge(self, ops, mode, concat, shared):
+        return Copy(concat[0], concat[1])
+
+
+@OpMerger.register(SlicedCopy)
+class SlicedCopyMerger(Merger):
+    def key(self, op):
+        if op.src_slice is Ellipsis and op.dst_slice is Ellipsis:
+            return op.inc
+        return None
+
+    def signals(self, op, mode):
+        return [op.src, op.dst], []
+
+    def merge(self, ops, mode, concat, shared):
+        return SlicedCopy(concat[0], concat[1], inc=ops[0].inc)
+
+
+@OpMerger.register(ElementwiseInc)
+class ElementwiseIncMerger(Merger):
+    def key(self, op):
+        if op.A.shape == op.X.shape == op.Y.shape:
+            return ()
+        return None
+
+    def signals(self, op, mode):
+        return [op.A, op.X, op.Y], []
+
+    def merge(self, ops, mode, concat, shared):
+        return ElementwiseInc(concat[0], concat[1], concat[2])
+
+
+@OpMerger.register(DotInc)
+class DotIncMerger(Merger):
+    """Merges `.DotInc` operators.
+
+    Operators sharing the same ``X`` are merged by stacking their ``A``
+    matrices. Other operators with matrices of the same shape are merged
+    into a `.BatchDotInc`.
+    """
+
+    def group(self, ops):
+        by_x = OrderedDict()
+        for op in ops:
+            if op.A.ndim == 2 and op.X.ndim == 1 and op.Y.ndim == 1:
+                by_x.setdefault(op.X, []).append(op)
+
+        groups = []
+        by_shape = OrderedDict()
+        for x_ops in itervalues(by_x):
+            if len(x_ops) > 1:
+                groups.append(('stack', x_ops))
+            else:
+                by_shape.setdefault(x_ops[0].A.shape, []).append(x_ops[0])
+        groups.extend(('batch', shape_ops) for shape_ops in
+                      itervalues(by_shape) if len(shape_ops) > 1)
+        return groups
+
+    def signals(self, op, mode):
+        if mode == 'stack':
+            return [op.A, op.Y], [op.X]
+        return [op.A, op.X, op.Y], []
+
+    def merge(self, ops, mode, concat, shared):
+        if mode == 'stack':
+            return DotInc(concat[0], shared[0], concat[1])
+        n_blocks = len(ops)
+        A, X, Y = [reshape(sig, (n_blocks,) + orig.shape) for sig, orig in
+                   zip(concat, (ops[0].A, ops[0].X, ops[0].Y))]
+        return BatchDotInc(A, X, Y)
+
+
+@OpMerger.register(BatchDotInc)
+class BatchDotIncMerger(Merger):
+    def key(self, op):
+        return op.A.shape[1:]
+
+    def signals(self, op, mode):
+        return [op.A, op.X, op.Y], []
+
+    def merge(self, ops, mode, concat, shared):
+        return BatchDotInc(concat[0], concat[1], concat[2])
+
+
+@OpMerger.register(SimProcess)
+class SimProcessMerger(Merger):
+    """Merges `.SimProcess` operators simulating the same linear filter.
+
+    Linear filters operate on each element of their input independently,
+    so several of them can be simulated as one filter on the
+    concatenated inputs and outputs.
+    """
+
+    def key(self, op):
+        if (isinstance(op.process, LinearFilter) and
+                op.input is not None and op.output is not None and
+                op.input.ndim == op.output.ndim == 1):
+            return (op.process, op.mode)
+        return None
+
+    def signals(self, op, mode):
+        return [op.input, op.output], [op.t]
+
+    def merge(self, ops, mode, concat, shared):
+        return SimProcess(ops[0].process, concat[0], concat[1], shared[0],
+                          mode=ops[0].mode)
+
+
+@OpMerger.register(SimNeurons)
+class SimNeuronsMerger(Merger):
+    """Merges `.SimNeurons` operators with equal neuron types.
+
+    Neuron types update each neuron independently, so all populations of
+    one neuron type with the same parameters can be simulated by a single
+    call to its step function on the concatenated currents and states.
+    These operators are merged first, so that the currents of populations
+    with the same neuron type are placed next to each other in memory.
+    """
+
+    priority = 1
+
+    def key(self, op):
+        if all(sig.ndim == 1 for sig in [op.J, op.output] + op.states):
+            return (op.neurons, len(op.states))
+        return None
+
+    def signals(self, op, mode):
+        return [op.J, op.output] + op.states, []
+
+    def merge(self, ops, mode, concat, shared):
+        return SimNeurons(ops[0].neurons, concat[0], concat[1],
+                          states=concat[2:])
@@ -2,7 +2,7 @@ import numpy as np
 
 from nengo.builder import Builder, Operator, Signal
 from nengo.processes import Process
-from nengo.synapses import Synapse
+from nengo.synapses import LinearFilter, Synapse
 
 
 class SimProcess(Operator):
@@ -91,6 +91,15 @@ class SimProcess(Operator):
 
         return step_simprocess
 
+    def make_batched_step(self, signals, dt, rng):
+        # linear filters are elementwise, so they can handle the trial axis
+        if (isinstance(self.process, LinearFilter) and
+                self.input is not None and self.output is not None and
+                signals.is_batched(self.input) and
+                signals.is_batched(self.output)):
+            return self.make_step(signals, dt, rng)
+        return super(SimProcess, self).make_batched_step(signals, dt, rng)
+
 
 @Builder.register(Process)
 def build_process(model, process, sig_in=None, sig_out=None, inc=False):
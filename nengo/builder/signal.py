@@ -1,10 +1,12 @@
 from __future__ import division
 
+from collections import OrderedDict
+
 import numpy as np
 
 import nengo.utils.numpy as npext
 from nengo.exceptions import SignalError
-from nengo.utils.compat import StringIO, is_integer
+from nengo.utils.compat import is_integer, iteritems, StringIO
 
 
 class Signal(object):
@@ -208,17 +210,29 @@ class SignalDict(dict):
     these arrays never get copied, which wastes time and space.
 
     Use ``init`` to set the ndarray initially.
+
+    Base signals can be packed into a few large buffers with ``pack`` before
+    they are initialized, in which case their ndarrays will be views on those
+    buffers.
+
+    Attributes
+    ----------
+    buffers : list of ndarray
+        The buffers that packed signals are views on.
     """
+
+    def __init__(self, *args, **kwargs):
+        super(SignalDict, self).__init__(*args, **kwargs)
+        self.buffers = []
+        self._packed = {}
+
     def __getitem__(self, key):
         try:
             return dict.__getitem__(self, key)
         except KeyError:
             if isinstance(key, Signal) and key.base is not key:
                 # return a view on the base signal
-                base = dict.__getitem__(self, key.base)
-                return np.ndarray(
-                    buffer=base, dtype=key.dtype, shape=key.shape,
-                    offset=key.offset, strides=key.strides)
+                return self._make_view(key, dict.__getitem__(self, key.base))
             else:
                 raise
 
@@ -239,6 +253,40 @@ class SignalDict(dict):
             sio.write("%s %s\n" % (repr(k), repr(self[k])))
         return sio.getvalue()
 
+    def pack(self, signals):
+        """Lay out the given base signals contiguously in shared buffers.
+
+        The writeable base signals in ``signals`` are grouped by dtype and
+        placed one after the other, in the given order, into one buffer per
+        dtype. When these signals are later added with ``init``, their
+        ndarrays will be views on those buffers instead of separate arrays.
+        Passing signals in the order in which they are accessed
+        (e.g., grouped by the operators using them) improves cache locality.
+
+        Readonly signals are not packed, as they are not copied by ``init``.
+        Signals that have already been initialized or packed are skipped.
+
+        Parameters
+        ----------
+        signals : iterable of Signal
+            The signals to pack. Views are replaced by their base signal.
+        """
+        groups = OrderedDict()
+        for sig in signals:
+            sig = sig.base
+            if (sig.readonly or sig in self or sig in self._packed or
+                    not sig.initial_value.flags.c_contiguous):
+                continue
+            groups.setdefault(sig.dtype, OrderedDict())[sig] = None
+
+        for dtype, sigs in iteritems(groups):
+            buf = np.zeros(sum(sig.size for sig in sigs), dtype=dtype)
+            self.buffers.append(buf)
+            i = 0
+            for sig in sigs:
+                self._packed[sig] = buf[i:i + sig.size].reshape(sig.shape)
+                i += sig.size
+
     def init(self, signal):
         """Set up a permanent mapping from signal -> ndarray."""
         if signal in self:
@@ -250,16 +298,118 @@ class SignalDict(dict):
                 self.init(signal.base)
 
             # get a view onto the base data
-            offset = npext.array_offset(x)
-            view = np.ndarray(shape=x.shape, strides=x.strides, offset=offset,
-                              dtype=x.dtype, buffer=self[signal.base].data)
+            view = self._make_view(signal, self[signal.base])
             view.setflags(write=not signal.readonly)
             dict.__setitem__(self, signal, view)
+        elif signal in self._packed:
+            view = self._packed.pop(signal)
+            view[...] = x
+            dict.__setitem__(self, signal, view)
         else:
-            x = x.view() if signal.readonly else x.copy()
-            dict.__setitem__(self, signal, x)
+            dict.__setitem__(self, signal, self._make_base(signal))
+
+    def _make_base(self, signal):
+        """Returns the ndarray for the base signal ``signal``."""
+        x = signal.initial_value
+        return x.view() if signal.readonly else x.copy()
+
+    def _make_view(self, signal, base):
+        """Returns a view for ``signal`` on ``base``, its base's ndarray."""
+        x = signal.initial_value
+        return np.ndarray(shape=x.shape, strides=x.strides,
+                          offset=npext.array_offset(x), dtype=x.dtype,
+                          buffer=base.data)
 
     def reset(self, signal):
         """Reset ndarray to the base value of the signal that maps to it"""
         if not signal.readonly:
             self[signal] = signal.initial_value
+
+
+class TrialSignalDict(SignalDict):
+    """Map from Signal -> ndarray with a leading axis for independent trials.
+
+    Signals that can change during a simulation get an additional leading
+    axis of length ``n_trials``, so that several independent trials can be
+    simulated at once. Readonly signals (e.g., decoders and encoders) and
+    the signals in ``shared`` are the same for all trials, and do not get
+    a trial axis.
+
+    Parameters
+    ----------
+    n_trials : int
+        The number of trials.
+    shared : iterable of Signal, optional (Default: ())
+        Writeable base signals that are shared by all trials
+        (e.g., the simulation time).
+
+    Attributes
+    ----------
+    n_trials : int
+        The number of trials.
+    shared : set of Signal
+        Writeable base signals that are shared by all trials.
+    """
+
+    def __init__(self, n_trials, shared=()):
+        super(TrialSignalDict, self).__init__()
+        self.n_trials = n_trials
+        self.shared = set(shared)
+
+    def is_batched(self, signal):
+        """Whether the ndarray of ``signal`` has a leading trial axis."""
+        return not (signal.base.readonly or signal.base in self.shared)
+
+    def expand(self, signal, ndim):
+        """Returns the ndarray of ``signal`` broadcastable to ``ndim`` dims.
+
+        For signals with a trial axis, new axes are inserted after the
+        trial axis so that the other axes line up with the trailing axes of
+        signals with ``ndim`` dimensions.
+        """
+        x = self[signal]
+        if self.is_batched(signal) and signal.ndim < ndim:
+            x = x[(slice(None),) + (None,) * (ndim - signal.ndim)]
+        return x
+
+    def pack(self, signals):
+        """Does nothing; signals with a trial axis are not packed."""
+        pass
+
+    def trial(self, i):
+        """Returns a mapping from Signal -> ndarray for trial ``i`` only."""
+        return TrialSignals(self, i)
+
+    def _make_base(self, signal):
+        if not self.is_batched(signal):
+            return super(TrialSignalDict, self)._make_base(signal)
+        x = np.empty((self.n_trials,) + signal.shape, dtype=signal.dtype)
+        x[...] = signal.initial_value
+        return x
+
+    def _make_view(self, signal, base):
+        if not self.is_batched(signal):
+            return super(TrialSignalDict, self)._make_view(signal, base)
+        x = signal.initial_value
+        return np.ndarray(shape=(self.n_trials,) + x.shape,
+                          strides=base.strides[:1] + x.strides,
+                          offset=npext.array_offset(x), dtype=x.dtype,
+                          buffer=base.data)
+
+
+class TrialSignals(object):
+    """Map from Signal -> ndarray for one trial of a `.TrialSignalDict`.
+
+    Signals shared by all trials map to the same ndarray in all trials.
+    """
+
+    def __init__(self, signals, trial):
+        self.signals = signals
+        self.trial = trial
+
+    def __contains__(self, key):
+        return key in self.signals
+
+    def __getitem__(self, key):
+        x = self.signals[key]
+        return x[self.trial, ...] if self.signals.is_batched(key) else x
@@ -1,26 +1,38 @@
 """Caching capabilities for a faster build process."""
 
+from collections import defaultdict, OrderedDict
 import errno
 import hashlib
 import inspect
+import io
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 import struct
+import threading
+import time
 from uuid import uuid1
 import warnings
+import weakref
 
 import numpy as np
 
 from nengo.exceptions import FingerprintError, TimeoutError
+from nengo.params import FrozenObject
 from nengo.rc import rc
 from nengo.utils import nco
+import nengo.utils.numpy as npext
 from nengo.utils.cache import byte_align, bytes2human, human2bytes
-from nengo.utils.compat import is_string, pickle, PY2
+from nengo.utils.compat import is_string, iteritems, pickle
 from nengo.utils.lock import FileLock
 
 logger = logging.getLogger(__name__)
 
+# The statistics returned by `.DecoderCache.stats`
+cache_stats = ('hits', 'shared_hits', 'misses', 'bytes_read',
+               'bytes_written', 'time_saved', 'key_time', 'io_time')
+
 
 def get_fragment_size(path):
     try:
@@ -46,6 +58,16 @@ def safe_remove(path):
         logger.warning("OSError during safe_remove: %s", err)
 
 
+def replace(src, dst):
+    """Renames ``src`` to ``dst``, replacing ``dst`` if it exists."""
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
 def safe_makedirs(path):
     if not os.path.exists(path):
         try:
@@ -54,6 +76,77 @@ def safe_makedirs(path):
             logger.warning("OSError during safe_makedirs: %s", err)
 
 
+def default_hash():
+    """Returns a new hash object for computing decoder cache keys.
+
+    Uses BLAKE2b where it is available (Python >= 3.6), which is
+    considerably faster than SHA1 on large arrays, and SHA1 otherwise.
+    """
+    if hasattr(hashlib, 'blake2b'):
+        return hashlib.blake2b(digest_size=20)
+    return hashlib.sha1()
+
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def memoized_digest(obj, key, digest):
+    """Returns ``digest()``, reusing the result for the same ``obj``.
+
+    Results are kept until ``obj`` is freed, so ``obj`` must not change
+    while it is alive. The caller is responsible for only passing such
+    objects (e.g., readonly arrays and `.FrozenObject` instances).
+
+    Parameters
+    ----------
+    obj : object
+        The object that the digest is computed from. Must support weak
+        references.
+    key : hashable
+        Identifies the digest (e.g., the hash function and the part of
+        ``obj`` being hashed).
+    digest : callable
+        Computes the digest.
+    """
+    def remove(ref, i=id(obj)):
+        with _digests_lock:
+            if _digests.get(i, (None,))[0] is ref:
+                del _digests[i]
+
+    with _digests_lock:
+        ref, digests = _digests.get(id(obj), (None, None))
+        if ref is None or ref() is not obj:
+            digests = {}
+            _digests[id(obj)] = (weakref.ref(obj, remove), digests)
+        if key in digests:
+            return digests[key]
+
+    return digests.setdefault(key, digest())
+
+
+def array_digest(x, hash_fn=default_hash):
+    """Returns the digest of the contents, shape and dtype of ``x``.
+
+    If the base of ``x`` is readonly, the digest is memoized, so that views
+    on the same data (e.g., the encoders of an ensemble) are only hashed
+    once per hash function.
+    """
+    x = np.asarray(x)
+
+    def digest():
+        h = hash_fn()
+        h.update(("%s%s" % (x.dtype.str, x.shape)).encode('utf-8'))
+        h.update(np.ascontiguousarray(x).data)
+        return h.digest()
+
+    base = npext.array_base(x)
+    if base.flags.writeable:
+        return digest()
+    key = (hash_fn, npext.array_offset(x), x.shape, x.strides, x.dtype.str)
+    return memoized_digest(base, key, digest)
+
+
 class Fingerprint(object):
     """Fingerprint of an object instance.
 
@@ -82,69 +175,304 @@ class Fingerprint(object):
 
 
 class CacheIndex(object):
-    def __init__(self, filename):
+    """Maps cache keys to the location of the cached data on disk.
+
+    The index is stored as an append-only log in which each line either
+    adds an entry (``+ key path start end``), marks a file as accessed
+    (``@ path``), or removes all entries stored in a file (``- path``).
+    Paths are relative to the directory containing the index. Each change
+    is appended immediately with a single write, so any number of processes
+    can add entries concurrently without locking. Reads do not lock either;
+    entries appended by other processes are read in when a key is not found.
+
+    The index also keeps track of the size of each file and the order in
+    which the files were last accessed, as given by the order of the
+    records in the log, so that the least recently used files can be found
+    without listing or stat-ing the cache directory.
+
+    When the log holds many more records than live entries, `.sync`
+    compacts it by writing the live entries to a new file and renaming
+    it over the log. Only one process compacts at a time; if the lock is
+    taken, compaction is skipped. Entries appended by other processes
+    while compacting may be lost, which only causes cache misses.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the index log.
+    compact_ratio : float, optional (Default: 2.)
+        The log is compacted when it has more than this many records per
+        live entry (and at least ``compact_min`` records).
+    compact_min : int, optional (Default: 1000)
+        Minimum number of records before the log is compacted.
+    fragment_size : int, optional (Default: 1)
+        File sizes are rounded up to a multiple of this size.
+
+    Attributes
+    ----------
+    size_in_bytes : int
+        Total size of the files with entries in the index.
+    """
+
+    def __init__(self, filename, compact_ratio=2., compact_min=1000,
+                 fragment_size=1):
         self.filename = filename
-        self._lock = FileLock(self.filename + '.lock')
-        self._index = None
-        self._updates = {}
-        self._deletes = set()
-        self._removed_files = set()
+        self.compact_ratio = compact_ratio
+        self.compact_min = compact_min
+        self.fragment_size = fragment_size
+        self.size_in_bytes = 0
+        self._dir = os.path.dirname(filename)
+        self._lock = FileLock(self.filename + '.lock', timeout=0.)
+        self._index = {}
+        self._keys_by_path = defaultdict(set)
+        self._files = OrderedDict()  # path -> size, least recently used first
+        self._n_records = 0
+        self._offset = 0
+        self._inode = None
+        self._fd = None
 
     def __getitem__(self, key):
-        if key in self._updates:
-            return self._updates[key]
-        else:
-            return self._index[key]
+        if key not in self._index:
+            self.refresh()
+        path, start, end = self._index[key]
+        return os.path.join(self._dir, path), start, end
 
     def __setitem__(self, key, value):
-        self._updates[key] = value
+        path, start, end = value
+        path = os.path.relpath(path, self._dir)
+        self._append("+\t%s\t%s\t%d\t%d\n" % (key, path, start, end))
+        self._add(key, (path, start, end))
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
 
-    def __delitem__(self, key):
-        self._deletes.add(key)
+    def __len__(self):
+        return len(self._index)
 
     def remove_file_entry(self, filename):
-        self._removed_files.add(filename)
+        path = os.path.relpath(filename, self._dir)
+        self._append("-\t%s\n" % path)
+        self._remove_path(path)
+
+    def touch(self, filename):
+        """Marks the file ``filename`` as most recently used."""
+        path = os.path.relpath(filename, self._dir)
+        if path in self._files and next(reversed(self._files)) != path:
+            self._append("@\t%s\n" % path)
+            self._files[path] = self._files.pop(path)
+
+    def items(self):
+        """Returns a list of ``(key, (filename, start, end))`` entries."""
+        return [(key, (os.path.join(self._dir, path), start, end))
+                for key, (path, start, end) in iteritems(self._index)]
+
+    def files(self):
+        """Returns a list of ``(filename, size)``, least recently used first.
+        """
+        return [(os.path.join(self._dir, path), size)
+                for path, size in iteritems(self._files)]
+
+    def pop_least_recently_used(self):
+        """Removes the entries of the least recently used file.
+
+        Returns
+        -------
+        (str, int)
+            The path of the file and its size in bytes.
+
+        Raises
+        ------
+        KeyError
+            If the index is empty.
+        """
+        if not self._files:
+            raise KeyError("Cache index is empty.")
+        path = next(iter(self._files))
+        size = self._files[path]
+        filename = os.path.join(self._dir, path)
+        self.remove_file_entry(filename)
+        return filename, size
 
     def __enter__(self):
-        with self._lock:
-            self._index = self._load_index()
+        self._open_log()
+        self.refresh()
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.sync()
+        self._close()
 
-    def _load_index(self):
-        assert self._lock.acquired
+    def refresh(self):
+        """Reads the records appended to the log since the last read."""
         try:
             with open(self.filename, 'rb') as f:
-                return pickle.load(f)
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._inode or stat.st_size < self._offset:
+                    # the log was compacted (or created) by another process
+                    self._inode = stat.st_ino
+                    self._index.clear()
+                    self._keys_by_path.clear()
+                    self._files.clear()
+                    self.size_in_bytes = 0
+                    self._n_records = self._offset = 0
+                f.seek(self._offset)
+                data = f.read()
         except IOError as err:
             if err.errno == errno.ENOENT:
-                return {}
-            else:
-                raise
+                return
+            raise
+
+        # only read up to the last newline, as a record may be partly written
+        data = data[:data.rfind(b'\n') + 1]
+        self._offset += len(data)
+        for line in data.decode('utf-8').splitlines():
+            self._parse(line)
+
+    def _parse(self, line):
+        record = line.split('\t')
+        if record[0] == '+' and len(record) == 5:
+            self._add(record[1], (record[2], int(record[3]), int(record[4])))
+        elif record[0] == '@' and len(record) == 2:
+            if record[1] in self._files:
+                self._files[record[1]] = self._files.pop(record[1])
+        elif record[0] == '-' and len(record) == 2:
+            self._remove_path(record[1])
+        else:
+            logger.warning("Ignoring corrupted cache index record %r.", line)
+            return
+        self._n_records += 1
+
+    def _add(self, key, entry):
+        path, _, end = entry
+        if key in self._index:
+            self._keys_by_path[self._index[key][0]].discard(key)
+        self._index[key] = entry
+        self._keys_by_path[path].add(key)
+
+        # files are only appended to, so the last entry gives their size
+        old_size = self._files.pop(path, 0)
+        size = max(old_size, byte_align(end, self.fragment_size))
+        self._files[path] = size
+        self.size_in_bytes += size - old_size
+
+    def _remove_path(self, path):
+        for key in self._keys_by_path.pop(path, ()):
+            del self._index[key]
+        self.size_in_bytes -= self._files.pop(path, 0)
+
+    def _append(self, record):
+        """Appends a record to the log with a single write."""
+        os.write(self._open_log(), record.encode('utf-8'))
+
+    def _open_log(self):
+        """Returns a file descriptor for appending to the current log."""
+        try:
+            inode = os.stat(self.filename).st_ino
+        except OSError:
+            inode = None
+        if self._fd is None or inode != os.fstat(self._fd).st_ino:
+            self._close()
+            self._fd = os.open(
+                self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+        return self._fd
+
+    def _close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
 
     def sync(self):
+        """Compacts the log if it holds many more records than entries.
+
+        Records are written as they are added, so nothing else needs to be
+        synchronized.
+        """
+        self.refresh()
+        if (self._n_records < self.compact_min or
+                self._n_records <= self.compact_ratio * len(self._index)):
+            return
+
         try:
             with self._lock:
-                self._index = self._load_index()
-                self._index.update(self._updates)
+                self.refresh()
+                tmp = "%s.%s.tmp" % (self.filename, uuid1())
+                with open(tmp, 'wb') as f:
+                    # write the files in order of access to keep that order
+                    for path in self._files:
+                        for key in self._keys_by_path[path]:
+                            _, start, end = self._index[key]
+                            f.write(("+\t%s\t%s\t%d\t%d\n" % (
+                                key, path, start, end)).encode('utf-8'))
+                replace(tmp, self.filename)
+        except TimeoutError:
+            logger.debug("Cache index is being compacted by another process.")
+            return
 
-                for key in self._deletes:
-                    del self._index[key]
+        self._close()
+        self._inode = None
+        self.refresh()
 
-                with open(self.filename, 'wb') as f:
-                    pickle.dump(
-                        {k: v for k, v in self._index.items()
-                         if v[0] not in self._removed_files},
-                        f, pickle.HIGHEST_PROTOCOL)
-        except TimeoutError:
-            warnings.warn(
-                "Decoder cache index could not acquire lock. "
-                "Cache index was not synced.")
 
-        self._updates.clear()
-        self._deletes.clear()
+class SharedStore(object):
+    """A key-value store shared by the decoder caches of several machines.
+
+    See the ``shared`` argument of `.DecoderCache`. Stores only need to
+    support getting and putting whole values. They should be safe to use
+    from several processes, as decoder caches on different machines may
+    put the same key at the same time. All of them put the same value.
+    """
+
+    def get(self, key):
+        """Returns the bytes stored under ``key``, or None if there are none.
+        """
+        raise NotImplementedError("SharedStore must implement get")
+
+    def put(self, key, data):
+        """Stores the bytes ``data`` under ``key``."""
+        raise NotImplementedError("SharedStore must implement put")
+
+
+class DirectoryStore(SharedStore):
+    """Shared store keeping each value in a file in a directory.
+
+    Values are written to a temporary file that is then renamed, so readers
+    never see partially written values. This makes the store suitable for
+    directories on network file systems like NFS.
+
+    Parameters
+    ----------
+    path : str
+        The directory in which values are stored. It will be created if it
+        does not exist.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        safe_makedirs(self.path)
+
+    def _key2path(self, key):
+        return os.path.join(self.path, key[:2], key[2:])
+
+    def get(self, key):
+        try:
+            with open(self._key2path(key), 'rb') as f:
+                return f.read()
+        except IOError as err:
+            if err.errno == errno.ENOENT:
+                return None
+            raise
+
+    def put(self, key, data):
+        path = self._key2path(key)
+        safe_makedirs(os.path.dirname(path))
+        tmp = "%s.%s.tmp" % (path, uuid1())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        replace(tmp, path)
 
 
 class DecoderCache(object):
@@ -166,16 +494,30 @@ class DecoderCache(object):
         Path to the directory in which the cache will be stored. It will be
         created if it does not exists. Will use the value returned by
         :func:`get_default_dir`, if `None`.
+    hash_fn : callable or None
+        Returns a new ``hashlib``-like hash object, which is used to compute
+        the cache keys (e.g., ``hashlib.sha1`` or ``xxhash.xxh64``).
+        Will use :func:`default_hash`, if `None`.
+    shared : SharedStore or None
+        A second cache tier shared by several machines (e.g., a
+        `.DirectoryStore` on a network file system). Results that are not
+        found in this cache are loaded from the shared store, and new
+        results are written to it in the background.
     """
 
     _CACHE_EXT = '.nco'
     _INDEX = 'index'
     _LEGACY = 'legacy.txt'
-    _LEGACY_VERSION = 1
+    _LEGACY_VERSION = 3
     _PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
 
-    def __init__(self, readonly=False, cache_dir=None):
+    def __init__(self, readonly=False, cache_dir=None, hash_fn=None,
+                 shared=None):
         self.readonly = readonly
+        self.shared = shared
+        self._shared_pool = None
+        self.hash_fn = default_hash if hash_fn is None else hash_fn
+        self._stats = dict.fromkeys(cache_stats, 0)
         if cache_dir is None:
             cache_dir = self.get_default_dir()
         self.cache_dir = cache_dir
@@ -183,6 +525,8 @@ class DecoderCache(object):
         self._fragment_size = get_fragment_size(self.cache_dir)
         self._index = None
         self._fd = None
+        # guards the index and the open file when solving on several threads
+        self._thread_lock = threading.Lock()
 
     def _get_fd(self):
         if self._fd is None:
@@ -197,7 +541,8 @@ class DecoderCache(object):
     def __enter__(self):
         try:
             self._remove_legacy_files()
-            self._index = CacheIndex(os.path.join(self.cache_dir, self._INDEX))
+            self._index = CacheIndex(os.path.join(self.cache_dir, self._INDEX),
+                                     fragment_size=self._fragment_size)
             self._index.__enter__()
         except TimeoutError:
             warnings.warn(
@@ -207,6 +552,11 @@ class DecoderCache(object):
 
     def __exit__(self, exc_type, exc_value, traceback):
         self._close_fd()
+        if self._shared_pool is not None:
+            # wait for the results to be written to the shared store
+            self._shared_pool.close()
+            self._shared_pool.join()
+            self._shared_pool = None
         if self._index is not None:
             return self._index.__exit__(exc_type, exc_value, traceback)
 
@@ -244,15 +594,25 @@ class DecoderCache(object):
         """
         return bytes2human(self.get_size_in_bytes())
 
-    def shrink(self, limit=None):
+    def shrink(self, limit=None, watermark=0.9):
         """Reduces the size of the cache to meet a limit.
 
+        The least recently used cache files are removed first. The sizes
+        and access order of the files are tracked by the cache index, so
+        nothing needs to be done unless the limit is exceeded, and only the
+        removed files are touched on disk. Once the limit is exceeded, files
+        are removed until the cache is at most ``watermark * limit``, so
+        that the next builds do not have to shrink the cache again.
+
         Parameters
         ----------
         limit : int, optional
             Maximum size of the cache in bytes.
+        watermark : float, optional (Default: 0.9)
+            Fraction of ``limit`` to reduce the size of the cache to if it
+            exceeds ``limit``.
         """
-        if self.readonly:
+        if self.readonly or self._index is None:
             return
 
         if limit is None:
@@ -260,26 +620,13 @@ class DecoderCache(object):
         if is_string(limit):
             limit = human2bytes(limit)
 
-        self._close_fd()
-
-        fileinfo = []
-        excess = -limit
-        for path in self.get_files():
-            stat = safe_stat(path)
-            if stat is not None:
-                aligned_size = byte_align(stat.st_size, self._fragment_size)
-                excess += aligned_size
-                fileinfo.append((stat.st_atime, aligned_size, path))
-
-        # Remove the least recently accessed first
-        fileinfo.sort()
-
-        for _, size, path in fileinfo:
-            if excess <= 0:
-                break
+        self._index.refresh()
+        if self._index.size_in_bytes <= limit:
+            return
 
-            excess -= size
-            self._index.remove_file_entry(path)
+        self._close_fd()
+        while self._index.size_in_bytes > watermark * limit:
+            path, _ = self._index.pop_least_recently_used()
             safe_remove(path)
 
         self._index.sync()
@@ -288,8 +635,53 @@ class DecoderCache(object):
         """Invalidates the cache (i.e. removes all cache files)."""
         self._close_fd()
         for path in self.get_files():
+            if self._index is not None:
+                self._index.remove_file_entry(path)
             safe_remove(path)
 
+    def verify(self, remove=False):
+        """Checks that all cached results can be read.
+
+        Parameters
+        ----------
+        remove : bool, optional (Default: False)
+            Whether to remove the files with unreadable results and the
+            files that are not referenced by the index.
+
+        Returns
+        -------
+        broken : list of str
+            Files containing results that cannot be read.
+        unreferenced : list of str
+            Files without entries in the index.
+        """
+        self._close_fd()
+        self._index.refresh()
+        broken = set()
+        for key, (path, start, end) in self._index.items():
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    nco.read(f, mmap_mode='r')
+                    f.seek(0, os.SEEK_END)
+                    if f.tell() < end:
+                        raise IOError("File %r is truncated." % path)
+            except Exception as err:
+                logger.warning("Cannot read cached result [%s]: %s", key, err)
+                broken.add(path)
+
+        indexed = set(path for path, _ in self._index.files())
+        unreferenced = [path for path in self.get_files()
+                        if path not in indexed]
+
+        if remove and not self.readonly:
+            for path in broken:
+                self._index.remove_file_entry(path)
+            for path in list(broken) + unreferenced:
+                safe_remove(path)
+            self._index.sync()
+        return sorted(broken), sorted(unreferenced)
+
     def _check_legacy_file(self):
         """Checks if the legacy file is up to date."""
         legacy_file = os.path.join(self.cache_dir, self._LEGACY)
@@ -358,7 +750,7 @@ class DecoderCache(object):
             Wrapped decoder solver.
         """
         def cached_solver(solver, neuron_type, gain, bias, x, targets,
-                          rng=None, E=None):
+                          rng=None, E=None, activities=None):
             try:
                 args, _, _, defaults = inspect.getargspec(solver)
             except TypeError:
@@ -371,45 +763,186 @@ class DecoderCache(object):
 
             key = self._get_cache_key(
                 solver_fn, solver, neuron_type, gain, bias, x, targets, rng, E)
-            try:
-                path, start, end = self._index[key]
-                if self._fd is not None:
-                    self._fd.flush()
-                with open(path, 'rb') as f:
-                    f.seek(start)
-                    solver_info, decoders = nco.read(f)
-            except:
+            loaded = self.load(key)
+            if loaded is None:
                 logger.debug("Cache miss [%s].", key)
+                start = time.time()
                 decoders, solver_info = solver_fn(
-                    solver, neuron_type, gain, bias, x, targets, rng=rng, E=E)
-                if not self.readonly:
-                    fd = self._get_fd()
-                    start = fd.tell()
-                    nco.write(fd, solver_info, decoders)
-                    end = fd.tell()
-                    self._index[key] = (fd.name, start, end)
+                    solver, neuron_type, gain, bias, x, targets, rng=rng, E=E,
+                    activities=activities)
+                self.store(key, solver_info, decoders,
+                           duration=time.time() - start)
             else:
                 logger.debug("Cache hit [%s]: Loaded stored decoders.", key)
+                solver_info, decoders = loaded
             return decoders, solver_info
         return cached_solver
 
+    def get_key(self, *args):
+        """Returns a cache key for build results depending only on ``args``.
+
+        Arrays are identified by their contents (see `.array_digest`) and
+        other objects by their `.Fingerprint`. Callers have to pass
+        everything the results depend on, including seeds and something
+        identifying the kind of result (e.g., the class of the result).
+
+        Returns
+        -------
+        str or None
+            The cache key, or None if some of ``args`` cannot be
+            fingerprinted and the results should not be cached.
+        """
+        start = time.time()
+        h = self.hash_fn()
+        try:
+            for arg in args:
+                h.update(array_digest(arg, self.hash_fn)
+                         if isinstance(arg, np.ndarray) else
+                         self._fingerprint(arg))
+        except FingerprintError as err:
+            logger.debug("Cannot compute cache key: %s", err)
+            return None
+        finally:
+            self._count(key_time=time.time() - start)
+        return h.hexdigest()
+
+    def load(self, key):
+        """Returns the ``(info, array)`` stored under ``key``.
+
+        The array is a read-only memory map of the cache file.
+        Results that are not in this cache are looked up in the ``shared``
+        store, and copied to this cache if found there.
+        Returns None if there is nothing stored under ``key``.
+        """
+        io_start = time.time()
+        try:
+            with self._thread_lock:
+                path, start, end = self._index[key]
+                self._index.touch(path)
+                if self._fd is not None:
+                    self._fd.flush()
+            with open(path, 'rb') as f:
+                f.seek(start)
+                (info, duration), array = nco.read(f, mmap_mode='r')
+            shared_hits = 0
+        except Exception:
+            loaded = self._load_shared(key)
+            if loaded is None:
+                self._count(misses=1, io_time=time.time() - io_start)
+                return None
+            (info, duration), array, data = loaded
+            start, end, shared_hits = 0, len(data), 1
+        self._count(hits=1, shared_hits=shared_hits, bytes_read=end - start,
+                    time_saved=duration, io_time=time.time() - io_start)
+        return info, array
+
+    def _load_shared(self, key):
+        if self.shared is None:
+            return None
+        try:
+            data = self.shared.get(key)
+            if data is None:
+                return None
+            metadata, array = nco.read(io.BytesIO(data))
+        except Exception as err:
+            logger.warning("Cannot load [%s] from shared cache: %s", key, err)
+            return None
+
+        array.setflags(write=False)
+        if not self.readonly and self._index is not None:
+            self._store_data(key, data)
+        return metadata, array, data
+
+    def store(self, key, info, array, duration=0.):
+        """Stores the picklable ``info`` and ``array`` under ``key``.
+
+        The result is also written to the ``shared`` store in the
+        background. Nothing is stored if the cache is readonly.
+
+        Parameters
+        ----------
+        key : str
+            The cache key.
+        info : object
+            Picklable data to store.
+        array : ndarray
+            Array to store, which is memory-mapped when loaded.
+        duration : float, optional (Default: 0.)
+            Time in seconds it took to compute ``info`` and ``array``,
+            which is counted as saved time when they are loaded.
+        """
+        if self.readonly:
+            return
+        io_start = time.time()
+        if self.shared is None:
+            with self._thread_lock:
+                fd = self._get_fd()
+                start = fd.tell()
+                nco.write(fd, (info, duration), array)
+                end = fd.tell()
+                self._index[key] = (fd.name, start, end)
+            n_bytes = end - start
+        else:
+            buf = io.BytesIO()
+            nco.write(buf, (info, duration), array)
+            data = buf.getvalue()
+            self._store_data(key, data)
+            with self._thread_lock:
+                if self._shared_pool is None:
+                    self._shared_pool = ThreadPool(1)
+                self._shared_pool.apply_async(self._put_shared, (key, data))
+            n_bytes = len(data)
+        self._count(bytes_written=n_bytes, io_time=time.time() - io_start)
+
+    def _store_data(self, key, data):
+        """Stores a result serialized with `.nco.write` under ``key``."""
+        with self._thread_lock:
+            fd = self._get_fd()
+            start = fd.tell()
+            fd.write(data)
+            self._index[key] = (fd.name, start, start + len(data))
+
+    def _put_shared(self, key, data):
+        try:
+            self.shared.put(key, data)
+        except Exception as err:
+            logger.warning("Cannot write [%s] to shared cache: %s", key, err)
+
+    def stats(self):
+        """Returns statistics on the use of the cache.
+
+        The statistics are counted since the cache was created.
+
+        Returns
+        -------
+        dict
+            Maps the names in `.cache_stats` to the number of cache ``hits``
+            (of which ``shared_hits`` were loaded from the shared store)
+            and ``misses``, the ``bytes_read`` and ``bytes_written``,
+            the ``time_saved`` (in seconds) by not computing the loaded
+            results, and the time spent computing cache keys (``key_time``)
+            and reading and writing the cache (``io_time``).
+        """
+        with self._thread_lock:
+            return dict(self._stats)
+
+    def _count(self, **increments):
+        with self._thread_lock:
+            for name, increment in iteritems(increments):
+                self._stats[name] += increment
+
     def _get_cache_key(self, solver_fn, solver, neuron_type, gain, bias,
                        x, targets, rng, E):
-        h = hashlib.sha1()
+        start = time.time()
+        h = self.hash_fn()
 
-        if PY2:
-            h.update(str(Fingerprint(solver_fn)))
-            h.update(str(Fingerprint(solver)))
-            h.update(str(Fingerprint(neuron_type)))
-        else:
-            h.update(str(Fingerprint(solver_fn)).encode('utf-8'))
-            h.update(str(Fingerprint(solver)).encode('utf-8'))
-            h.update(str(Fingerprint(neuron_type)).encode('utf-8'))
+        for obj in (solver_fn, solver, neuron_type):
+            h.update(self._fingerprint(obj))
 
-        h.update(np.ascontiguousarray(gain).data)
-        h.update(np.ascontiguousarray(bias).data)
-        h.update(np.ascontiguousarray(x).data)
-        h.update(np.ascontiguousarray(targets).data)
+        h.update(array_digest(gain, self.hash_fn))
+        h.update(array_digest(bias, self.hash_fn))
+        h.update(array_digest(x, self.hash_fn))
+        h.update(array_digest(targets, self.hash_fn))
 
         # rng format doc:
         # noqa <http://docs.scipy.org/doc/numpy/reference/generated/numpy.random.RandomState.get_state.html#numpy.random.RandomState.get_state>
@@ -421,9 +954,20 @@ class DecoderCache(object):
         h.update(struct.pack('d', state[4]))  # float cached_gaussian
 
         if E is not None:
-            h.update(np.ascontiguousarray(E).data)
+            h.update(array_digest(E, self.hash_fn))
+        self._count(key_time=time.time() - start)
         return h.hexdigest()
 
+    @staticmethod
+    def _fingerprint(obj):
+        def digest():
+            return str(Fingerprint(obj)).encode('utf-8')
+
+        # frozen objects cannot change, so they only need to be pickled once
+        if isinstance(obj, FrozenObject):
+            return memoized_digest(obj, Fingerprint, digest)
+        return digest()
+
     def _key2path(self, key):
         prefix = key[:2]
         suffix = key[2:]
@@ -444,13 +988,25 @@ class NoDecoderCache(object):
     def wrap_solver(self, solver_fn):
         return solver_fn
 
+    def get_key(self, *args):
+        return None
+
+    def load(self, key):
+        return None
+
+    def store(self, key, info, array, duration=0.):
+        pass
+
+    def stats(self):
+        return dict.fromkeys(cache_stats, 0)
+
     def get_size_in_bytes(self):
         return 0
 
     def get_size(self):
         return '0 B'
 
-    def shrink(self, limit=0):
+    def shrink(self, limit=0, watermark=0.9):
         pass
 
     def invalidate(self):
@@ -459,8 +1015,67 @@ class NoDecoderCache(object):
 
 def get_default_decoder_cache():
     if rc.getboolean('decoder_cache', 'enabled'):
+        shared_path = rc.get('decoder_cache', 'shared_path')
         decoder_cache = DecoderCache(
-            rc.getboolean('decoder_cache', 'readonly'))
+            rc.getboolean('decoder_cache', 'readonly'),
+            shared=DirectoryStore(shared_path) if shared_path else None)
     else:
         decoder_cache = NoDecoderCache()
     return decoder_cache
+
+
+def main(argv=None):
+    """Inspects, verifies, or prunes a decoder cache directory.
+
+    Installed as the ``nengo-cache`` command. Run ``nengo-cache --help``
+    for usage information.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='nengo-cache', description=main.__doc__.splitlines()[0])
+    parser.add_argument(
+        '--cache-dir', default=None,
+        help="The cache directory (default: %s)." % (
+            DecoderCache.get_default_dir(),))
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('info', help="Show the size and use of the cache.")
+    verify = commands.add_parser(
+        'verify', help="Check that all cached results can be read.")
+    verify.add_argument(
+        '--remove', action='store_true',
+        help="Remove unreadable and unreferenced files.")
+    prune = commands.add_parser(
+        'prune', help="Remove the least recently used results.")
+    prune.add_argument(
+        '--size', default=None,
+        help="Size limit, e.g. '100 MB' (default: the decoder_cache size "
+             "in the nengorc file).")
+    prune.add_argument(
+        '--all', action='store_true', help="Remove all cached results.")
+    args = parser.parse_args(argv)
+
+    with DecoderCache(cache_dir=args.cache_dir) as cache:
+        if args.command == 'verify':
+            broken, unreferenced = cache.verify(remove=args.remove)
+            for path in broken:
+                print("Unreadable: %s" % path)
+            for path in unreferenced:
+                print("Unreferenced: %s" % path)
+            print("%d unreadable and %d unreferenced files%s." % (
+                len(broken), len(unreferenced),
+                " removed" if args.remove else ""))
+            return 1 if (broken or unreferenced) and not args.remove else 0
+        elif args.command == 'prune':
+            if args.all:
+                cache.invalidate()
+            else:
+                cache.shrink(args.size, watermark=1.)
+
+        files = cache._index.files()
+        print("Cache directory: %s" % cache.cache_dir)
+        print("Size: %s in %d files" % (cache.get_size(), len(files)))
+        print("Entries: %d" % len(cache._index))
+        if len(files) > 0:
+            print("Least recently used: %s" % files[0][0])
+    return 0
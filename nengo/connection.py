@@ -10,10 +10,11 @@ from nengo.exceptions import ValidationError
 from nengo.learning_rules import LearningRuleType, LearningRuleTypeParam
 from nengo.node import Node
 from nengo.params import (Default, Unconfigurable, ObsoleteParam,
-                          BoolParam, FunctionParam)
+                          BoolParam, FunctionParam, Parameter)
 from nengo.solvers import LstsqL2, SolverParam
 from nengo.synapses import Lowpass, SynapseParam
 from nengo.utils.compat import is_iterable, iteritems
+from nengo.utils.numpy import is_spmatrix
 
 logger = logging.getLogger(__name__)
 
@@ -137,6 +138,12 @@ class ConnectionFunctionParam(FunctionParam):
         transform = conn.transform
         size_mid = conn.size_in if function is None else size
 
+        if is_spmatrix(transform) and size_mid != transform.shape[1]:
+            raise ValidationError(
+                "%s output size (%d) not equal to transform input size "
+                "(%d)" % (type_pre, size_mid, transform.shape[1]),
+                attr=self.name, obj=conn)
+
         if isinstance(transform, np.ndarray):
             if transform.ndim < 2 and size_mid != conn.size_out:
                 raise ValidationError(
@@ -166,6 +173,16 @@ class TransformParam(DistOrArrayParam):
             name, default, (), optional, readonly)
 
     def validate(self, conn, transform):
+        if is_spmatrix(transform):
+            self.check_repeated_inds(conn)
+            if transform.shape[0] != conn.size_out:
+                raise ValidationError(
+                    "Shape[0] should be %d, got %d"
+                    % (conn.size_out, transform.shape[0]),
+                    attr=self.name, obj=conn)
+            Parameter.validate(self, conn, transform)
+            return transform.tocsr().astype(np.float64)
+
         if not isinstance(transform, Distribution):
             # if transform is an array, figure out what the correct shape
             # should be
@@ -178,20 +195,7 @@ class TransformParam(DistOrArrayParam):
             elif transform.ndim == 2:
                 # Actually (size_out, size_mid) but Function handles size_mid
                 self.shape = ('size_out', '*')
-
-                # check for repeated dimensions in lists, as these don't work
-                # for two-dimensional transforms
-                def repeated_inds(x):
-                    return (not isinstance(x, slice) and
-                            np.unique(x).size != len(x))
-                if repeated_inds(conn.pre_slice):
-                    raise ValidationError(
-                        "Input object selection has repeated indices",
-                        attr=self.name, obj=conn)
-                if repeated_inds(conn.post_slice):
-                    raise ValidationError(
-                        "Output object selection has repeated indices",
-                        attr=self.name, obj=conn)
+                self.check_repeated_inds(conn)
             else:
                 raise ValidationError(
                     "Cannot handle transforms with dimensions > 2",
@@ -201,6 +205,21 @@ class TransformParam(DistOrArrayParam):
 
         return transform
 
+    def check_repeated_inds(self, conn):
+        # check for repeated dimensions in lists, as these don't work
+        # for two-dimensional transforms
+        def repeated_inds(x):
+            return (not isinstance(x, slice) and
+                    np.unique(x).size != len(x))
+        if repeated_inds(conn.pre_slice):
+            raise ValidationError(
+                "Input object selection has repeated indices",
+                attr=self.name, obj=conn)
+        if repeated_inds(conn.post_slice):
+            raise ValidationError(
+                "Output object selection has repeated indices",
+                attr=self.name, obj=conn)
+
 
 class Connection(NengoObject):
     """Connects two objects together.
@@ -245,6 +264,9 @@ class Connection(NengoObject):
         before the transform, so if a function is computed across the
         connection, the transform must be of shape
         ``(len(function(np.zeros(post.size_in))), pre.size_out)``.
+        A 2-D transform may also be given as a SciPy sparse matrix,
+        in which case connections from nodes and neurons are simulated
+        with a `.SparseDotInc` operator.
     solver : Solver, optional (Default: ``nengo.solvers.LstsqL2()``)
         Solver instance to compute decoders or weights
         (see `~nengo.solvers.Solver`). If ``solver.weights`` is True, a full
@@ -1,16 +1,24 @@
 from __future__ import division
 
 import logging
+import weakref
 
 import numpy as np
 
 from nengo.exceptions import SimulationError, ValidationError
 from nengo.params import Parameter, NumberParam, FrozenObject
 from nengo.utils.compat import range
-from nengo.utils.neurons import settled_firingrate
+from nengo.utils.neurons import RateGrid, RateTable, settled_firingrate
+from nengo.utils.stdlib import WeakKeyIDDictionary
 
 logger = logging.getLogger(__name__)
 
+# neuron type -> RateTable, for neuron types with a table_tolerance
+_rate_tables = WeakKeyIDDictionary()
+# neuron type -> RateGrid, for neuron types with a rate_resolution; keyed by
+# parameters, so that equal neuron types share a grid
+_rate_grids = weakref.WeakKeyDictionary()
+
 
 class NeuronType(FrozenObject):
     """Base class for Nengo neuron models.
@@ -129,6 +137,28 @@ class NeuronType(FrozenObject):
         """
         raise NotImplementedError("Neurons must provide step_math")
 
+    def make_step(self, dt, J, output, *states):
+        """Returns a function applying `.step_math` to the given arrays.
+
+        The returned function takes no arguments and updates ``output``
+        and ``states`` in place each time it is called. Subclasses can
+        override this to allocate the memory needed by each step only once.
+
+        Parameters
+        ----------
+        dt : float
+            Simulation timestep.
+        J : ndarray(dtype=float64)
+            Input currents associated with each neuron.
+        output : ndarray(dtype=float64)
+            Output activities associated with each neuron.
+        *states : ndarray(dtype=float64)
+            Additional state arrays passed to `.step_math`.
+        """
+        def step():
+            self.step_math(dt, J, output, *states)
+        return step
+
 
 class Direct(NeuronType):
     """Signifies that an ensemble should simulate in direct mode.
@@ -182,19 +212,57 @@ class RectifiedLinear(NeuronType):
 
 
 class Sigmoid(NeuronType):
-    """A neuron model whose response curve is a sigmoid."""
+    """A neuron model whose response curve is a sigmoid.
+
+    Parameters
+    ----------
+    tau_ref : float
+        The reciprocal of the maximum firing rate, in seconds.
+    table_tolerance : float, optional (Default: None)
+        If given, rates are interpolated in a `.RateTable` with at most this
+        error (in Hz), rather than computed exactly. See `.rate_table`.
+    """
 
     probeable = ('rates',)
 
     tau_ref = NumberParam('tau_ref', low=0)
+    table_tolerance = NumberParam(
+        'table_tolerance', low=0, low_open=True, optional=True)
 
-    def __init__(self, tau_ref=0.002):
+    def __init__(self, tau_ref=0.002, table_tolerance=None):
         super(Sigmoid, self).__init__()
         self.tau_ref = tau_ref
+        self.table_tolerance = table_tolerance
 
     @property
     def _argreprs(self):
-        return [] if self.tau_ref == 0.002 else ["tau_ref=%s" % self.tau_ref]
+        args = []
+        if self.tau_ref != 0.002:
+            args.append("tau_ref=%s" % self.tau_ref)
+        if self.table_tolerance is not None:
+            args.append("table_tolerance=%s" % self.table_tolerance)
+        return args
+
+    @property
+    def rate_table(self):
+        """The `.RateTable` used to compute rates, or None.
+
+        The table is only used if ``table_tolerance`` is set. It covers the
+        currents at which the rate is more than ``table_tolerance`` away
+        from both zero and the maximum rate.
+        """
+        if self.table_tolerance is None:
+            return None
+        if self not in _rate_tables:
+            tau_ref = self.tau_ref
+
+            def rates(J):
+                return (1. / tau_ref) / (1.0 + np.exp(-J))
+
+            limit = max(np.log(1. / (tau_ref * self.table_tolerance)), 1.)
+            _rate_tables[self] = RateTable(
+                rates, -limit, limit, self.table_tolerance, clip=True)
+        return _rate_tables[self]
 
     def gain_bias(self, max_rates, intercepts):
         """Analytically determine gain, bias."""
@@ -206,7 +274,15 @@ class Sigmoid(NeuronType):
 
     def step_math(self, dt, J, output):
         """Implement the sigmoid nonlinearity."""
-        output[...] = (1. / self.tau_ref) / (1.0 + np.exp(-J))
+        if self.table_tolerance is not None:
+            self.rate_table(J, output)
+        else:
+            output[...] = (1. / self.tau_ref) / (1.0 + np.exp(-J))
+
+    def make_step(self, dt, J, output):
+        if self.table_tolerance is not None:
+            return self.rate_table.make_lookup(J, output)
+        return super(Sigmoid, self).make_step(dt, J, output)
 
 
 class LIFRate(NeuronType):
@@ -220,17 +296,23 @@ class LIFRate(NeuronType):
     tau_ref : float
         Absolute refractory period, in seconds. This is how long the
         membrane voltage is held at zero after a spike.
+    table_tolerance : float, optional (Default: None)
+        If given, rates are interpolated in a `.RateTable` with at most this
+        error (in Hz), rather than computed exactly. See `.rate_table`.
     """
 
     probeable = ('rates',)
 
     tau_rc = NumberParam('tau_rc', low=0, low_open=True)
     tau_ref = NumberParam('tau_ref', low=0)
+    table_tolerance = NumberParam(
+        'table_tolerance', low=0, low_open=True, optional=True)
 
-    def __init__(self, tau_rc=0.02, tau_ref=0.002):
+    def __init__(self, tau_rc=0.02, tau_ref=0.002, table_tolerance=None):
         super(LIFRate, self).__init__()
         self.tau_rc = tau_rc
         self.tau_ref = tau_ref
+        self.table_tolerance = table_tolerance
 
     @property
     def _argreprs(self):
@@ -239,8 +321,33 @@ class LIFRate(NeuronType):
             args.append("tau_rc=%s" % self.tau_rc)
         if self.tau_ref != 0.002:
             args.append("tau_ref=%s" % self.tau_ref)
+        if self.table_tolerance is not None:
+            args.append("table_tolerance=%s" % self.table_tolerance)
         return args
 
+    @property
+    def rate_table(self):
+        """The `.RateTable` used to compute rates, or None.
+
+        The table is only used if ``table_tolerance`` is set. It covers
+        input currents from the threshold of 1 to 101; rates for currents
+        just above the threshold, where the response curve is too steep to
+        interpolate, and above 101 are computed exactly.
+        """
+        if self.table_tolerance is None:
+            return None
+        if self not in _rate_tables:
+            exact = LIFRate(tau_rc=self.tau_rc, tau_ref=self.tau_ref)
+
+            def rates(J):
+                out = np.zeros_like(J)
+                LIFRate.step_math(exact, 1., J, out)
+                return out
+
+            _rate_tables[self] = RateTable(
+                rates, 1., 101., self.table_tolerance)
+        return _rate_tables[self]
+
     def gain_bias(self, max_rates, intercepts):
         """Analytically determine gain, bias."""
         inv_tau_ref = 1. / self.tau_ref if self.tau_ref > 0 else np.inf
@@ -265,6 +372,10 @@ class LIFRate(NeuronType):
 
     def step_math(self, dt, J, output):
         """Implement the LIFRate nonlinearity."""
+        if self.table_tolerance is not None:
+            self.rate_table(J, output)
+            return
+
         j = J - 1
         output[:] = 0  # faster than output[j <= 0] = 0
         output[j > 0] = 1. / (
@@ -272,6 +383,11 @@ class LIFRate(NeuronType):
         # the above line is designed to throw an error if any j is nan
         # (nan > 0 -> error), and not pass x < -1 to log1p
 
+    def make_step(self, dt, J, output):
+        if self.table_tolerance is not None:
+            return self.rate_table.make_lookup(J, output)
+        return super(LIFRate, self).make_step(dt, J, output)
+
 
 class LIF(LIFRate):
     """Spiking version of the leaky integrate-and-fire (LIF) neuron model.
@@ -287,44 +403,84 @@ class LIF(LIFRate):
     min_voltage : float
         Minimum value for the membrane voltage. If ``-np.inf``, the voltage
         is never clipped.
+    table_tolerance : float, optional (Default: None)
+        If given, `.rates` are interpolated in a `.RateTable` with at most
+        this error (in Hz). The spiking simulation is not affected.
     """
 
     probeable = ('spikes', 'voltage', 'refractory_time')
 
     min_voltage = NumberParam('min_voltage', high=0)
 
-    def __init__(self, tau_rc=0.02, tau_ref=0.002, min_voltage=0):
-        super(LIF, self).__init__(tau_rc=tau_rc, tau_ref=tau_ref)
+    def __init__(self, tau_rc=0.02, tau_ref=0.002, min_voltage=0,
+                 table_tolerance=None):
+        super(LIF, self).__init__(tau_rc=tau_rc, tau_ref=tau_ref,
+                                  table_tolerance=table_tolerance)
         self.min_voltage = min_voltage
 
     def step_math(self, dt, J, spiked, voltage, refractory_time):
-        # reduce all refractory times by dt
-        refractory_time -= dt
-
-        # compute effective dt for each neuron, based on remaining time.
-        # note that refractory times that have completed midway into this
-        # timestep will be given a partial timestep, and moreover these will
-        # be subtracted to zero at the next timestep (or reset by a spike)
-        delta_t = (dt - refractory_time).clip(0, dt)
-
-        # update voltage using discretized lowpass filter
-        # since v(t) = v(0) + (J - v(0))*(1 - exp(-t/tau)) assuming
-        # J is constant over the interval [t, t + dt)
-        voltage -= (J - voltage) * np.expm1(-delta_t / self.tau_rc)
-
-        # determine which neurons spiked (set them to 1/dt, else 0)
-        spiked_mask = voltage > 1
-        spiked[:] = spiked_mask / dt
-
-        # set v(0) = 1 and solve for t to compute the spike time
-        t_spike = dt + self.tau_rc * np.log1p(
-            -(voltage[spiked_mask] - 1) / (J[spiked_mask] - 1))
-
-        # set spiked voltages to zero, refractory times to tau_ref, and
-        # rectify negative voltages to a floor of min_voltage
-        voltage[voltage < self.min_voltage] = self.min_voltage
-        voltage[spiked_mask] = 0
-        refractory_time[spiked_mask] = self.tau_ref + t_spike
+        LIF._make_step(self, dt, J, spiked, voltage, refractory_time)()
+
+    def make_step(self, dt, J, spiked, voltage, refractory_time):
+        # subclasses that override ``step_math`` must be simulated with it
+        # (``==`` since unbound methods are not identical on Python 2)
+        if type(self).step_math != LIF.step_math:
+            return NeuronType.make_step(
+                self, dt, J, spiked, voltage, refractory_time)
+        return LIF._make_step(self, dt, J, spiked, voltage, refractory_time)
+
+    def _make_step(self, dt, J, spiked, voltage, refractory_time):
+        tau_rc = self.tau_rc
+        tau_ref = self.tau_ref
+        min_voltage = self.min_voltage
+
+        # scratch buffers, so that steps allocate memory only for spiking
+        # neurons
+        x = np.empty_like(voltage)
+        y = np.empty_like(voltage)
+        spiked_mask = np.empty(voltage.shape, dtype=bool)
+        below = np.empty(voltage.shape, dtype=bool)
+
+        def step():
+            # reduce all refractory times by dt
+            np.subtract(refractory_time, dt, out=refractory_time)
+
+            # compute effective dt for each neuron, based on remaining time.
+            # note that refractory times that have completed midway into this
+            # timestep will be given a partial timestep, and moreover these
+            # will be subtracted to zero at the next timestep (or reset by a
+            # spike)
+            np.subtract(dt, refractory_time, out=x)
+            np.clip(x, 0, dt, out=x)
+
+            # update voltage using discretized lowpass filter
+            # since v(t) = v(0) + (J - v(0))*(1 - exp(-t/tau)) assuming
+            # J is constant over the interval [t, t + dt)
+            np.divide(x, -tau_rc, out=x)
+            np.expm1(x, out=x)
+            np.subtract(J, voltage, out=y)
+            np.multiply(y, x, out=y)
+            np.subtract(voltage, y, out=voltage)
+
+            # determine which neurons spiked (set them to 1/dt, else 0)
+            np.greater(voltage, 1, out=spiked_mask)
+            np.divide(spiked_mask, dt, out=spiked)
+
+            # set v(0) = 1 and solve for t to compute the spike time,
+            # and set the refractory times of the spiking neurons to
+            # tau_ref plus that time. Only the few neurons that spiked are
+            # indexed, which avoids computing the logarithm for all neurons
+            spiking = spiked_mask.nonzero()
+            if len(spiking[0]) > 0:
+                refractory_time[spiking] = tau_ref + (dt + tau_rc * np.log1p(
+                    -(voltage[spiking] - 1) / (J[spiking] - 1)))
+
+            # set spiked voltages to zero, and rectify negative voltages to a
+            # floor of min_voltage
+            np.less(voltage, min_voltage, out=below)
+            np.putmask(voltage, below, min_voltage)
+            np.putmask(voltage, spiked_mask, 0)
+        return step
 
 
 class AdaptiveLIFRate(LIFRate):
@@ -351,6 +507,9 @@ class AdaptiveLIFRate(LIFRate):
     tau_ref : float
         Absolute refractory period, in seconds. This is how long the
         membrane voltage is held at zero after a spike.
+    table_tolerance : float, optional (Default: None)
+        If given, rates are interpolated in a `.RateTable` with at most this
+        error (in Hz), rather than computed exactly. See `.rate_table`.
 
     References
     ----------
@@ -383,6 +542,9 @@ class AdaptiveLIFRate(LIFRate):
         LIFRate.step_math(self, dt, J - n, output)
         n += (dt / self.tau_n) * (self.inc_n * output - n)
 
+    def make_step(self, dt, J, output, adaptation):
+        return NeuronType.make_step(self, dt, J, output, adaptation)
+
 
 class AdaptiveLIF(AdaptiveLIFRate, LIF):
     """Adaptive spiking version of the LIF neuron model.
@@ -419,9 +581,37 @@ class AdaptiveLIF(AdaptiveLIFRate, LIF):
 
     def step_math(self, dt, J, output, voltage, ref, adaptation):
         """Implement the AdaptiveLIF nonlinearity."""
+        AdaptiveLIF._make_step(
+            self, dt, J, output, voltage, ref, adaptation)()
+
+    def make_step(self, dt, J, output, voltage, ref, adaptation):
+        # see `.LIF.make_step`
+        if type(self).step_math != AdaptiveLIF.step_math:
+            return NeuronType.make_step(
+                self, dt, J, output, voltage, ref, adaptation)
+        return AdaptiveLIF._make_step(
+            self, dt, J, output, voltage, ref, adaptation)
+
+    def _make_step(self, dt, J, output, voltage, ref, adaptation):
         n = adaptation
-        LIF.step_math(self, dt, J - n, output, voltage, ref)
-        n += (dt / self.tau_n) * (self.inc_n * output - n)
+        decay = dt / self.tau_n
+        inc_n = self.inc_n
+
+        # the adapted current, and a scratch buffer for the adaptation
+        J_n = np.empty_like(J)
+        x = np.empty_like(n)
+        lif_step = LIF._make_step(self, dt, J_n, output, voltage, ref)
+
+        def step():
+            np.subtract(J, n, out=J_n)
+            lif_step()
+
+            # n += (dt / tau_n) * (inc_n * output - n)
+            np.multiply(output, inc_n, out=x)
+            np.subtract(x, n, out=x)
+            np.multiply(x, decay, out=x)
+            np.add(n, x, out=n)
+        return step
 
 
 class Izhikevich(NeuronType):
@@ -456,6 +646,10 @@ class Izhikevich(NeuronType):
         (Originally 'c') The voltage to reset to after a spike, in millivolts.
     reset_recovery : float, optional (Default: 8.)
         (Originally 'd') The recovery value to reset to after a spike.
+    rate_resolution : float, optional (Default: None)
+        If given, rates are interpolated between currents spaced this far
+        apart, rather than simulated for every current, and each grid
+        current is simulated only until its rate settles. See `.rate_grid`.
 
     References
     ----------
@@ -470,14 +664,17 @@ class Izhikevich(NeuronType):
     coupling = NumberParam('coupling', low=0)
     reset_voltage = NumberParam('reset_voltage')
     reset_recovery = NumberParam('reset_recovery')
+    rate_resolution = NumberParam(
+        'rate_resolution', low=0, low_open=True, optional=True)
 
     def __init__(self, tau_recovery=0.02, coupling=0.2,
-                 reset_voltage=-65., reset_recovery=8.):
+                 reset_voltage=-65., reset_recovery=8., rate_resolution=None):
         super(Izhikevich, self).__init__()
         self.tau_recovery = tau_recovery
         self.coupling = coupling
         self.reset_voltage = reset_voltage
         self.reset_recovery = reset_recovery
+        self.rate_resolution = rate_resolution
 
     @property
     def _argreprs(self):
@@ -490,41 +687,119 @@ class Izhikevich(NeuronType):
         add("coupling", 0.2)
         add("reset_voltage", -65.)
         add("reset_recovery", 8.)
+        add("rate_resolution", None)
         return args
 
+    @property
+    def rate_grid(self):
+        """The `.RateGrid` used to compute rates, or None.
+
+        The grid is only used if ``rate_resolution`` is set. It is shared by
+        all ensembles whose neuron types have equal parameters, so the neurons
+        are simulated only once for each grid current. The grid covers at
+        most ``2**14`` resolution steps; rates for currents above that are
+        simulated directly.
+        """
+        if self.rate_resolution is None:
+            return None
+        if self not in _rate_grids:
+            # the grid must not refer to ``self``, which is its key
+            exact = Izhikevich(tau_recovery=self.tau_recovery,
+                               coupling=self.coupling,
+                               reset_voltage=self.reset_voltage,
+                               reset_recovery=self.reset_recovery)
+
+            def settled_rates(J):
+                return exact._settled_rates(J, check_time=0.05)
+
+            # ``make_step`` clips currents below -30
+            lo = -30.
+            _rate_grids[self] = RateGrid(
+                settled_rates, self.rate_resolution,
+                lo=lo, hi=lo + 2**14 * self.rate_resolution)
+        return _rate_grids[self]
+
     def rates(self, x, gain, bias):
         """Estimates steady-state firing rate given gain and bias.
 
-        Uses the `nengo.utils.neurons.settled_firingrate` helper function.
+        Uses the `nengo.utils.neurons.settled_firingrate` helper function,
+        through the `.rate_grid` if ``rate_resolution`` is set.
         """
         J = gain * x + bias
+        if self.rate_resolution is not None:
+            return self.rate_grid(J)
+        return self._settled_rates(J)
+
+    def _settled_rates(self, J, check_time=None):
         voltage = np.zeros_like(J)
         recovery = np.zeros_like(J)
         return settled_firingrate(self.step_math, J, [voltage, recovery],
-                                  settle_time=0.001, sim_time=1.0)
+                                  settle_time=0.001, sim_time=1.0,
+                                  check_time=check_time,
+                                  make_step=self.make_step)
 
     def step_math(self, dt, J, spiked, voltage, recovery):
         """Implement the Izhikevich nonlinearity."""
-        # Numerical instability occurs for very low inputs.
-        # We'll clip them be greater than some value that was chosen by
-        # looking at the simulations for many parameter sets.
-        # A more principled minimum value would be better.
-        J = np.maximum(-30., J)
-
-        dV = (0.04 * voltage ** 2 + 5 * voltage + 140 - recovery + J) * 1000
-        voltage[:] += dV * dt
-
-        # We check for spikes and reset the voltage here rather than after,
-        # which differs from the original implementation by Izhikevich.
-        # However, calculating recovery for voltage values greater than
-        # threshold can cause the system to blow up, which we want
-        # to avoid at all costs.
-        spiked[:] = (voltage >= 30) / dt
-        voltage[spiked > 0] = self.reset_voltage
-
-        dU = (self.tau_recovery * (self.coupling * voltage - recovery)) * 1000
-        recovery[:] += dU * dt
-        recovery[spiked > 0] = recovery[spiked > 0] + self.reset_recovery
+        Izhikevich._make_step(self, dt, J, spiked, voltage, recovery)()
+
+    def make_step(self, dt, J, spiked, voltage, recovery):
+        # see `.LIF.make_step`
+        if type(self).step_math != Izhikevich.step_math:
+            return NeuronType.make_step(
+                self, dt, J, spiked, voltage, recovery)
+        return Izhikevich._make_step(self, dt, J, spiked, voltage, recovery)
+
+    def _make_step(self, dt, J, spiked, voltage, recovery):
+        tau_recovery = self.tau_recovery
+        coupling = self.coupling
+        reset_voltage = self.reset_voltage
+        reset_recovery = self.reset_recovery
+
+        # scratch buffers, so that steps allocate memory only for spiking
+        # neurons
+        x = np.empty_like(voltage)
+        y = np.empty_like(voltage)
+        spiked_mask = np.empty(voltage.shape, dtype=bool)
+
+        def step():
+            # dV = (0.04 * voltage ** 2 + 5 * voltage + 140 - recovery + J)
+            # with J clipped to be greater than -30. Numerical instability
+            # occurs for very low inputs; this minimum was chosen by looking
+            # at the simulations for many parameter sets. A more principled
+            # minimum value would be better.
+            np.square(voltage, out=x)
+            np.multiply(x, 0.04, out=x)
+            np.multiply(voltage, 5, out=y)
+            np.add(x, y, out=x)
+            np.add(x, 140, out=x)
+            np.subtract(x, recovery, out=x)
+            np.maximum(J, -30., out=y)
+            np.add(x, y, out=x)
+            np.multiply(x, 1000, out=x)
+            np.multiply(x, dt, out=x)
+            np.add(voltage, x, out=voltage)
+
+            # We check for spikes and reset the voltage here rather than
+            # after, which differs from the original implementation by
+            # Izhikevich. However, calculating recovery for voltage values
+            # greater than threshold can cause the system to blow up, which
+            # we want to avoid at all costs.
+            np.greater_equal(voltage, 30, out=spiked_mask)
+            np.divide(spiked_mask, dt, out=spiked)
+            np.putmask(voltage, spiked_mask, reset_voltage)
+
+            # dU = tau_recovery * (coupling * voltage - recovery)
+            np.multiply(voltage, coupling, out=x)
+            np.subtract(x, recovery, out=x)
+            np.multiply(x, tau_recovery, out=x)
+            np.multiply(x, 1000, out=x)
+            np.multiply(x, dt, out=x)
+            np.add(recovery, x, out=recovery)
+
+            spiking = spiked_mask.nonzero()
+            if len(spiking[0]) > 0:
+                recovery[spiking] += reset_recovery
+        return step
 
 
 class NeuronTypeParam(Parameter):
@@ -38,6 +38,7 @@ RC_DEFAULTS = {
         'readonly': False,
         'size': '512 MB',
         'path': nengo.utils.paths.decoder_cache_dir,
+        'shared_path': '',
     },
     'progress': {
         'updater': 'auto',
@@ -1,20 +1,28 @@
 """Reference simulator for nengo models."""
 
 import logging
+import os
+import struct
+import time
 import warnings
-from collections import Mapping
+from collections import defaultdict, Mapping
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
 import nengo.utils.numpy as npext
 from nengo.builder import Model
-from nengo.builder.signal import SignalDict
+from nengo.builder.operator import SimPyFunc
+from nengo.builder.optimizer import optimize as optimize_model
+from nengo.builder.processes import SimProcess
+from nengo.builder.signal import SignalDict, TrialSignalDict
 from nengo.cache import get_default_decoder_cache
 from nengo.exceptions import ReadonlyError, SimulatorClosed
 from nengo.utils.compat import range, ResourceWarning
 from nengo.utils.graphs import toposort
 from nengo.utils.progress import ProgressTracker
-from nengo.utils.simulator import operator_depencency_graph
+from nengo.utils.simulator import (
+    operator_depencency_graph, operator_layers)
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +31,13 @@ class ProbeDict(Mapping):
     """Map from Probe -> ndarray
 
     This is more like a view on the dict that the simulator manipulates.
-    However, for speed reasons, the simulator uses Python lists,
-    and we want to return NumPy arrays. Additionally, this mapping
-    is readonly, which is more appropriate for its purpose.
+    The simulator stores the samples of each probe in a preallocated
+    `.ProbeBuffer` (or a `.ProbeFile`, if ``probe_dir`` is given), and this
+    mapping returns them as readonly NumPy arrays without copying them:
+    views on the buffer, or memory maps of the file. These arrays do not
+    grow as the simulator keeps running; index the mapping again to get
+    the new samples. Additionally, this mapping is readonly, which is more
+    appropriate for its purpose.
     """
 
     def __init__(self, raw):
@@ -33,7 +45,9 @@ class ProbeDict(Mapping):
 
     def __getitem__(self, key):
         rval = self.raw[key]
-        if isinstance(rval, list):
+        if isinstance(rval, ProbeBuffer):
+            rval = rval.data
+        elif isinstance(rval, list):
             rval = np.asarray(rval)
             rval.setflags(write=False)
         return rval
@@ -51,6 +65,278 @@ class ProbeDict(Mapping):
         return str(self.raw)
 
 
+class ProbeBuffer(object):
+    """Stores the samples of a probe in a preallocated array.
+
+    Samples are copied into a preallocated array, which is grown
+    geometrically if it runs out of space. The simulator reserves space for
+    all of the samples of a run before the run starts, so usually
+    no allocations are needed while running.
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of each sample.
+    dtype : numpy.dtype
+        The data type of the samples.
+    capacity : int, optional (Default: 0)
+        The number of samples to allocate space for initially.
+    trial_axis : bool, optional (Default: False)
+        Whether the first axis of each sample is a trial axis. If True,
+        ``data`` puts the trial axis before the sample axis.
+    """
+
+    def __init__(self, shape, dtype, capacity=0, trial_axis=False):
+        self.shape = shape
+        self.dtype = dtype
+        self.trial_axis = trial_axis
+        self.n_samples = 0
+        self._array = np.empty((capacity,) + self.shape, dtype=self.dtype)
+
+    def __len__(self):
+        return self.n_samples
+
+    @property
+    def capacity(self):
+        """(int) Number of samples that fit without growing the buffer."""
+        return len(self._array)
+
+    @property
+    def data(self):
+        """(ndarray) A readonly view on the samples stored so far."""
+        view = self._array[:self.n_samples]
+        view.setflags(write=False)
+        return np.swapaxes(view, 0, 1) if self.trial_axis else view
+
+    def append(self, x):
+        """Copies the sample ``x`` into the buffer."""
+        if self.n_samples >= self.capacity:
+            self.reserve(1)
+        self._array[self.n_samples] = x
+        self.n_samples += 1
+
+    def reserve(self, n):
+        """Makes sure that ``n`` more samples fit into the buffer.
+
+        If the buffer has to grow, it will at least double in size.
+        """
+        needed = self.n_samples + n
+        if needed > self.capacity:
+            array = np.empty((max(needed, 2 * self.capacity),) + self.shape,
+                             dtype=self.dtype)
+            array[:self.n_samples] = self._array[:self.n_samples]
+            self._array = array
+
+
+class ProbeFile(ProbeBuffer):
+    """Streams the samples of a probe to a ``.npy`` file.
+
+    Samples are collected in a small in-memory chunk, which is appended to
+    the file whenever it is full, so the memory used does not grow with the
+    length of the simulation. The header of the file is rewritten with the
+    current number of samples on `.ProbeFile.flush`, so the file can be
+    loaded with `numpy.load` at any time after flushing.
+
+    Parameters
+    ----------
+    filename : str
+        The file to write to. Existing files will be overwritten.
+    shape : tuple
+        The shape of each sample.
+    dtype : numpy.dtype
+        The data type of the samples.
+    chunk_size : int, optional (Default: 1024)
+        The number of samples to collect before writing them to the file.
+    trial_axis : bool, optional (Default: False)
+        Whether the first axis of each sample is a trial axis. If True,
+        ``data`` puts the trial axis before the sample axis. The file
+        always stores samples along the first axis.
+    """
+
+    header_size = 256  # leaves room for the shape to grow
+
+    def __init__(self, filename, shape, dtype, chunk_size=1024,
+                 trial_axis=False):
+        super(ProbeFile, self).__init__(
+            shape, dtype, capacity=chunk_size, trial_axis=trial_axis)
+        self.filename = filename
+        self._n_chunk = 0
+        self._memmap = None
+        if os.path.exists(filename):
+            # unlinking keeps memory maps of the old data valid (on POSIX)
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        self._file = open(filename, 'w+b')
+        self._write_header()
+
+    @property
+    def closed(self):
+        """(bool) Whether the file has been closed."""
+        return self._file is None
+
+    @property
+    def data(self):
+        """(numpy.memmap) A readonly memory map of the samples so far."""
+        self.flush()
+        if self.n_samples == 0:
+            return super(ProbeFile, self).data
+        if self._memmap is None or len(self._memmap) != self.n_samples:
+            self._memmap = np.load(self.filename, mmap_mode='r')
+        return (np.swapaxes(self._memmap, 0, 1) if self.trial_axis else
+                self._memmap)
+
+    def append(self, x):
+        """Copies the sample ``x`` into the current chunk."""
+        self._array[self._n_chunk] = x
+        self._n_chunk += 1
+        self.n_samples += 1
+        if self._n_chunk == len(self._array):
+            self._write_chunk()
+
+    def close(self):
+        """Flushes all samples to the file and closes it."""
+        if not self.closed:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        """Writes all samples and the updated header to the file."""
+        if not self.closed:
+            self._write_chunk()
+            self._write_header()
+            self._file.flush()
+
+    def reserve(self, n):
+        """Does nothing; samples are written to the file in chunks."""
+        pass
+
+    def _write_chunk(self):
+        if self._n_chunk > 0:
+            self._array[:self._n_chunk].tofile(self._file)
+            self._n_chunk = 0
+
+    def _write_header(self):
+        header = repr({
+            'descr': np.lib.format.dtype_to_descr(np.dtype(self.dtype)),
+            'fortran_order': False,
+            'shape': tuple(int(d) for d in (self.n_samples,) + self.shape),
+        })
+        magic = np.lib.format.magic(1, 0)
+        n_header = self.header_size - len(magic) - 2
+        header = header.ljust(n_header - 1) + '\n'
+        assert len(header) == n_header, "Probe sample shape is too long"
+        self._file.seek(0)
+        self._file.write(magic + struct.pack('<H', n_header) +
+                         header.encode('latin1'))
+        self._file.seek(0, os.SEEK_END)
+
+
+class ParallelStepper(object):
+    """Runs the step functions of operators concurrently on a thread pool.
+
+    Operators in the same layer of the dependency graph do not depend on
+    each other, so they can run concurrently, as long as they do not
+    increment overlapping signals. Operators in each layer are grouped such
+    that operators incrementing overlapping signals are in the same group;
+    groups are run concurrently, while the operators within a group are
+    run one after another.
+
+    Since NumPy releases the GIL in BLAS calls and most ufuncs, large
+    operators can run in parallel. Small operators are run in the calling
+    thread, because the synchronization would take longer than the
+    computation. Operators calling arbitrary Python code
+    (`.SimPyFunc` and `.SimProcess`) are also run in the calling thread.
+
+    Parameters
+    ----------
+    dg : dict
+        The dependency graph of the operators.
+    ops : list of Operator
+        The operators to run, in a valid order.
+    steps : list of callable
+        The step function of each operator in ``ops``.
+    pool : `multiprocessing.pool.ThreadPool`
+        The thread pool to run the operators on.
+    min_cost : int, optional (Default: 10000)
+        Groups of operators with an estimated cost (the number of elements
+        in their signals) below this value are run in the calling thread.
+    """
+
+    def __init__(self, dg, ops, steps, pool, min_cost=10000):
+        self.pool = pool
+        self.min_cost = min_cost
+
+        layers = operator_layers(dg)
+        by_layer = defaultdict(list)
+        for op, step in zip(ops, steps):
+            by_layer[layers[op]].append((op, step))
+
+        self.plan = []
+        for layer in sorted(by_layer):
+            inline, parallel = [], []
+            for group in self.independent_groups(by_layer[layer]):
+                if self.runs_inline(op for op, _ in group):
+                    inline.extend(step for _, step in group)
+                else:
+                    parallel.append([step for _, step in group])
+            if len(parallel) < 2:
+                inline.extend(step for group in parallel for step in group)
+                parallel = []
+            self.plan.append((inline, parallel))
+
+    @staticmethod
+    def independent_groups(op_steps):
+        """Groups operators that increment overlapping signals."""
+        group_of = list(range(len(op_steps)))
+
+        def find(i):
+            while group_of[i] != i:
+                group_of[i] = group_of[group_of[i]]
+                i = group_of[i]
+            return i
+
+        by_base = defaultdict(list)
+        for i, (op, _) in enumerate(op_steps):
+            for sig in op.incs:
+                for j, other in by_base[sig.base]:
+                    if sig.may_share_memory(other):
+                        group_of[find(i)] = find(j)
+                by_base[sig.base].append((i, sig))
+
+        groups = defaultdict(list)
+        for i, op_step in enumerate(op_steps):
+            groups[find(i)].append(op_step)
+        return [groups[i] for i in sorted(groups)]
+
+    def runs_inline(self, ops):
+        """Whether a group of operators should run in the calling thread."""
+        cost = 0
+        for op in ops:
+            if isinstance(op, (SimPyFunc, SimProcess)):
+                return True
+            cost += sum(sig.size for sig in op.all_signals)
+        return cost < self.min_cost
+
+    @staticmethod
+    def _run_group(steps):
+        with np.errstate(invalid='raise', divide='ignore'):
+            for step in steps:
+                step()
+
+    def step(self):
+        """Runs all step functions once."""
+        for inline, parallel in self.plan:
+            if parallel:
+                result = self.pool.map_async(self._run_group, parallel)
+            for step in inline:
+                step()
+            if parallel:
+                result.get()
+
+
 class Simulator(object):
     """Reference simulator for Nengo models.
 
@@ -86,6 +372,28 @@ class Simulator(object):
         want to build the network manually, or you want to inject build
         artifacts in the model before building the network, then you can
         pass in a `.Model` instance.
+    optimize : bool, optional (Default: True)
+        If True, the operators of the built model will be merged where
+        possible to reduce the overhead of each simulation step. This makes
+        the build slower, but usually pays off after a few dozen steps.
+        See `nengo.builder.optimizer.optimize` for details.
+    probe_dir : str, optional (Default: None)
+        If given, the data of all probes will be streamed to ``.npy`` files
+        in this directory while running, instead of being kept in memory.
+        The data of the i-th probe in ``model.probes`` will be written to
+        ``probe<i>.npy``, and ``sim.data[probe]`` returns a readonly
+        `numpy.memmap` of that file.
+    n_trials : int, optional (Default: None)
+        If given, this number of independent trials of the model will be
+        simulated at once. All built parameters (e.g., decoders) are shared
+        by the trials, but each trial has its own state, and noise differs
+        between trials. Probe data will have the shape
+        ``(n_trials, n_samples) + probed_shape``. Note that the functions of
+        ``Node`` objects are called once per trial on every timestep.
+    n_threads : int, optional (Default: None)
+        If greater than 1, independent operators will be run concurrently
+        on a pool of this many threads (see `.ParallelStepper`), and
+        decoders will be solved concurrently while building the model.
 
     Attributes
     ----------
@@ -116,8 +424,20 @@ class Simulator(object):
     # would skip all test whose names start with 'test_pes'.
     unsupported = []
 
-    def __init__(self, network, dt=0.001, seed=None, model=None):
+    # The number of times the progress bar is updated in each run.
+    # Steps between updates are run in a tight loop.
+    progress_updates = 100
+
+    def __init__(self, network, dt=0.001, seed=None, model=None,
+                 optimize=True, probe_dir=None, n_trials=None,
+                 n_threads=None):
         self.closed = False
+        self.n_trials = n_trials
+        self._n_threads = n_threads
+        self._pool = None  # made in `.Simulator.reset`, after the build
+        self.probe_dir = probe_dir
+        if probe_dir is not None and not os.path.exists(probe_dir):
+            os.makedirs(probe_dir)
 
         if model is None or model.decoder_cache is None:
             cache = get_default_decoder_cache()
@@ -128,7 +448,8 @@ class Simulator(object):
             if model is None:
                 self.model = Model(dt=float(dt),
                                    label="%s, dt=%f" % (network, dt),
-                                   decoder_cache=cache)
+                                   decoder_cache=cache,
+                                   n_threads=n_threads)
             else:
                 self.model = model
 
@@ -138,16 +459,28 @@ class Simulator(object):
 
             cache.shrink()
 
-        # -- map from Signal.base -> ndarray
-        self.signals = SignalDict()
-        for op in self.model.operators:
-            op.init_signals(self.signals)
+        self.dg = operator_depencency_graph(self.model.operators)
+        if optimize:
+            logger.info("Optimizing model...")
+            self.dg = optimize_model(self.model, self.dg)
 
         # Order the steps (they are made in `Simulator.reset`)
-        self.dg = operator_depencency_graph(self.model.operators)
-        self._step_order = [op for op in toposort(self.dg)
+        op_order = toposort(self.dg)
+        self._step_order = [op for op in op_order
                             if hasattr(op, 'make_step')]
 
+        # -- map from Signal.base -> ndarray
+        #    signals are packed in the order they are accessed by operators
+        if self.n_trials is None:
+            self.signals = SignalDict()
+            self.signals.pack(
+                sig for op in op_order for sig in op.all_signals)
+        else:
+            self.signals = TrialSignalDict(
+                self.n_trials, shared=[self.model.step, self.model.time])
+        for op in self.model.operators:
+            op.init_signals(self.signals)
+
         # Add built states to the probe dictionary
         self._probe_outputs = self.model.params
 
@@ -159,6 +492,9 @@ class Simulator(object):
 
     def __del__(self):
         """Raise a ResourceWarning if we are deallocated while open."""
+        if getattr(self, '_pool', None) is not None:
+            self._pool.terminate()
+            self._pool = None
         if not self.closed:
             warnings.warn(
                 "Simulator with model=%s was deallocated while open. Please "
@@ -198,18 +534,32 @@ class Simulator(object):
         a `.SimulatorClosed` exception.
         """
         self.closed = True
+        self._close_probe_files()
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
         self.signals = None  # signals may no longer exist on some backends
 
     def _probe(self):
         """Copy all probed signals to buffers."""
         self._probe_step_time()
 
-        for probe in self.model.probes:
-            period = (1 if probe.sample_every is None else
-                      probe.sample_every / self.dt)
+        for period, signal, buf in self._probe_schedule:
             if self.n_steps % period < 1:
-                tmp = self.signals[self.model.sig[probe]['in']].copy()
-                self._probe_outputs[probe].append(tmp)
+                buf.append(signal)
+
+    def _reserve_probe_buffers(self, steps):
+        """Reserves space for the samples of the next ``steps`` steps."""
+        step_numbers = np.arange(self.n_steps + 1, self.n_steps + steps + 1)
+        for period, _, buf in self._probe_schedule:
+            buf.reserve(np.count_nonzero(step_numbers % period < 1))
+
+    def _close_probe_files(self):
+        for probe in self.model.probes:
+            buf = self._probe_outputs.get(probe, None)
+            if isinstance(buf, ProbeFile):
+                buf.close()
 
     def _probe_step_time(self):
         self._n_steps = self.signals[self.model.step].copy()
@@ -238,12 +588,41 @@ class Simulator(object):
 
         # rebuild steps (resets ops with their own state, like Processes)
         self.rng = np.random.RandomState(self.seed)
-        self._steps = [op.make_step(self.signals, self.dt, self.rng)
-                       for op in self._step_order]
-
-        # clear probe data
-        for probe in self.model.probes:
-            self._probe_outputs[probe] = []
+        if self.n_trials is None:
+            self._steps = [op.make_step(self.signals, self.dt, self.rng)
+                           for op in self._step_order]
+        else:
+            self._steps = [
+                op.make_batched_step(self.signals, self.dt, self.rng)
+                for op in self._step_order]
+        if (self._pool is None and self._n_threads is not None
+                and self._n_threads > 1):
+            # only made once the build succeeded, so that a failed build
+            # does not leave threads behind
+            self._pool = ThreadPool(self._n_threads)
+        self._stepper = (None if self._pool is None else ParallelStepper(
+            self.dg, self._step_order, self._steps, self._pool))
+
+        # clear probe data and precompute the sampling periods
+        self._close_probe_files()
+        self._probe_schedule = []
+        for i, probe in enumerate(self.model.probes):
+            sig = self.model.sig[probe]['in']
+            signal = self.signals[sig]
+            shape = (sig.shape if self.n_trials is None else
+                     (self.n_trials,) + sig.shape)
+            trial_axis = self.n_trials is not None
+            if self.probe_dir is None:
+                buf = ProbeBuffer(
+                    shape, signal.dtype, trial_axis=trial_axis)
+            else:
+                buf = ProbeFile(
+                    os.path.join(self.probe_dir, "probe%d.npy" % i),
+                    shape, signal.dtype, trial_axis=trial_axis)
+            period = (1 if probe.sample_every is None else
+                      probe.sample_every / self.dt)
+            self._probe_outputs[probe] = buf
+            self._probe_schedule.append((period, signal, buf))
 
         self._probe_step_time()
 
@@ -284,10 +663,55 @@ class Simulator(object):
             For more control over the progress bar, pass in a `.ProgressBar`
             or `.ProgressUpdater` instance.
         """
-        with ProgressTracker(steps, progress_bar) as progress:
-            for i in range(steps):
-                self.step()
-                progress.step()
+        if self.closed:
+            raise SimulatorClosed("Simulator cannot run because it is closed.")
+
+        self._reserve_probe_buffers(steps)
+        step_fns = (self._steps if self._stepper is None else
+                    [self._stepper.step])
+        every_step, sample_at = self._probe_plan(steps)
+        chunk_size = max(steps // self.progress_updates, 1)
+
+        start_time = time.time()
+        try:
+            with ProgressTracker(steps, progress_bar) as progress, \
+                    np.errstate(invalid='raise', divide='ignore'):
+                for start in range(0, steps, chunk_size):
+                    stop = min(start + chunk_size, steps)
+                    for i in range(start, stop):
+                        for step_fn in step_fns:
+                            step_fn()
+                        for signal, buf in every_step:
+                            buf.append(signal)
+                        for signal, buf in sample_at.get(i, ()):
+                            buf.append(signal)
+                    self._probe_step_time()
+                    progress.step(stop - start)
+        finally:
+            self._probe_step_time()
+
+        elapsed = time.time() - start_time
+        if steps > 0:
+            logger.debug("Ran %d steps in %.3f s (%.1f us per step)",
+                         steps, elapsed, 1e6 * elapsed / steps)
+
+    def _probe_plan(self, steps):
+        """Determines which probes to sample on each of the next steps.
+
+        Returns a list of ``(signal, buffer)`` pairs that are sampled on
+        every step, and a dictionary mapping the index of each step on which
+        other probes are sampled to their ``(signal, buffer)`` pairs.
+        """
+        step_numbers = np.arange(self.n_steps + 1, self.n_steps + steps + 1)
+        every_step = []
+        sample_at = defaultdict(list)
+        for period, signal, buf in self._probe_schedule:
+            if period == 1:
+                every_step.append((signal, buf))
+                continue
+            for i in np.flatnonzero(step_numbers % period < 1):
+                sample_at[i].append((signal, buf))
+        return every_step, sample_at
 
     def step(self):
         """Advance the simulator by 1 step (``dt`` seconds)."""
@@ -296,8 +720,11 @@ class Simulator(object):
 
         old_err = np.seterr(invalid='raise', divide='ignore')
         try:
-            for step_fn in self._steps:
-                step_fn()
+            if self._stepper is not None:
+                self._stepper.step()
+            else:
+                for step_fn in self._steps:
+                    step_fn()
         finally:
             np.seterr(**old_err)
 
@@ -4,9 +4,11 @@ import pytest
 import nengo
 from nengo.builder import Model
 from nengo.builder.ensemble import BuiltEnsemble
-from nengo.builder.operator import DotInc, PreserveValue
-from nengo.builder.signal import Signal, SignalDict
-from nengo.exceptions import ObsoleteError, SignalError
+from nengo.builder.operator import (
+    DotInc, Operator, PreserveValue, SparseDotInc, SpikeDotInc)
+from nengo.builder.signal import Signal, SignalDict, TrialSignalDict
+from nengo.exceptions import (
+    BuildError, ObsoleteError, SignalError, ValidationError)
 from nengo.utils.compat import itervalues, range
 
 
@@ -222,6 +224,183 @@ def test_signaldict_reset():
     assert np.allclose(signaldict[two_d], np.array([[1], [1]]))
 
 
+def test_signaldict_pack():
+    """Tests that packed signals are views on shared buffers."""
+    signaldict = SignalDict()
+    a = Signal([1., 2.])
+    b = Signal([[3.], [4.]])
+    c = Signal(5.)
+    ints = Signal([6, 7])
+    ro = Signal([8., 9.], readonly=True)
+
+    signaldict.pack([a, b[1], c, ints, ro])
+    assert len(signaldict.buffers) == 2
+    for sig in (a, b, b[1], c, ints, ro):
+        signaldict.init(sig)
+
+    assert np.allclose(signaldict.buffers[0], [1, 2, 3, 4, 5])
+    assert np.all(signaldict.buffers[1] == [6, 7])
+    assert signaldict[b].shape == (2, 1)
+    assert signaldict[c].shape == ()
+    assert not np.may_share_memory(signaldict[ro], signaldict.buffers[0])
+
+    signaldict[b[1]] = -1.
+    assert np.allclose(signaldict.buffers[0], [1, 2, 3, -1, 5])
+    signaldict.reset(b)
+    assert np.allclose(signaldict[b], [[3.], [4.]])
+
+
+def test_trialsignaldict():
+    signaldict = TrialSignalDict(3)
+    state = Signal([[1., 2.], [3., 4.]])
+    weights = Signal([5., 6.], readonly=True)
+    for sig in (state, state[1], weights):
+        signaldict.init(sig)
+
+    assert signaldict[state].shape == (3, 2, 2)
+    assert signaldict[state[1]].shape == (3, 1, 2)
+    assert signaldict[weights].shape == (2,)
+
+    signaldict.trial(1)[state[1]][...] = -1.
+    assert np.all(signaldict[state][1] == [[1, 2], [-1, -1]])
+    assert np.all(signaldict[state][[0, 2]] == state.initial_value)
+    assert signaldict.trial(1)[weights] is signaldict[weights]
+
+    signaldict.reset(state)
+    assert np.all(signaldict[state] == state.initial_value)
+
+
+def test_sparsedotinc(rng):
+    A = rng.uniform(-1, 1, size=(5, 4))
+    A[rng.rand(5, 4) > 0.3] = 0
+    rows, cols = np.nonzero(A)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=5))])
+
+    data = Signal(A[rows, cols], name="data")
+    X = Signal(rng.uniform(-1, 1, size=4), name="X")
+    Y = Signal(np.zeros(5), name="Y")
+    op = SparseDotInc(data, X, Y, cols, indptr)
+
+    signals = SignalDict()
+    op.init_signals(signals)
+    step = op.make_step(signals, 0.001, rng)
+    step()
+    step()
+    assert np.allclose(signals[Y], 2 * np.dot(A, X.initial_value))
+
+    with pytest.raises(BuildError):
+        SparseDotInc(data, X, Signal(np.zeros(4)), cols, indptr)
+
+
+@pytest.mark.parametrize('order', ['C', 'F'])
+@pytest.mark.parametrize('readonly', [True, False])
+def test_spikedotinc(readonly, order, rng):
+    A = Signal(np.asarray(rng.uniform(-1, 1, size=(5, 8)), order=order),
+               name="A", readonly=readonly)
+    X = Signal(np.zeros(8), name="X")
+    Y = Signal(np.zeros(5), name="Y")
+    op = SpikeDotInc(A, X, Y)
+
+    signals = SignalDict()
+    op.init_signals(signals)
+    step = op.make_step(signals, 0.001, rng)
+    step()
+    assert np.all(signals[Y] == 0)
+
+    signals[X][[1, 6]] = 1000.
+    step()
+    assert np.allclose(signals[Y], np.dot(A.initial_value, signals[X]))
+
+    with pytest.raises(BuildError):
+        SpikeDotInc(A, X, Signal(np.zeros(4)))
+
+
+@pytest.mark.parametrize('order', ['C', 'F'])
+def test_spikedotinc_batched(order, rng):
+    A = Signal(np.asarray(rng.uniform(-1, 1, size=(5, 8)), order=order),
+               name="A", readonly=True)
+    X = Signal(np.zeros(8), name="X")
+    Y = Signal(np.zeros(5), name="Y")
+    op = SpikeDotInc(A, X, Y)
+
+    signals = TrialSignalDict(3)
+    op.init_signals(signals)
+    step = op.make_batched_step(signals, 0.001, rng)
+    step()
+    assert np.all(signals[Y] == 0)
+
+    # the trials share one weight matrix, and spike independently
+    assert signals[A].shape == (5, 8)
+    signals[X][0, [1, 6]] = 1000.
+    signals[X][2, 3] = 1000.
+    step()
+    assert np.allclose(signals[Y], np.dot(signals[X], A.initial_value.T))
+    assert np.all(signals[Y][1] == 0)
+
+
+def test_validation_modes(RefSimulator, seed):
+    class BrokenOp(Operator):
+        def __init__(self, tag=None):
+            super(BrokenOp, self).__init__(tag=tag)
+            self.sets, self.incs, self.reads, self.updates = [], [], [], []
+
+        def make_step(self, signals, dt, rng):
+            raise ValueError("broken")
+
+    with pytest.raises(ValueError):
+        Model(validation='eager').add_op(BrokenOp())
+
+    Model(validation='off').add_op(BrokenOp())
+
+    model = Model(validation='deferred')
+    model.add_op(BrokenOp(tag="first"))
+    model.add_op(BrokenOp(tag="second"))
+    with pytest.raises(BuildError) as excinfo:
+        model.validate()
+    assert "first" in str(excinfo.value) and "second" in str(excinfo.value)
+    model.validate()  # failed operators are only reported once
+
+    with pytest.raises(ValidationError):
+        Model(validation='later')
+
+    with nengo.Network(seed=seed) as net:
+        a = nengo.Ensemble(10, 1)
+        nengo.Connection(a, a)
+        p = nengo.Probe(a)
+
+    data = []
+    for validation in Model.validation_modes:
+        with RefSimulator(net, model=Model(validation=validation)) as sim:
+            sim.run(0.01)
+        data.append(sim.data[p])
+    assert all(np.array_equal(data[0], d) for d in data[1:])
+
+
+def test_solver_threads(seed):
+    with nengo.Network(seed=seed) as net:
+        ens = nengo.networks.EnsembleArray(20, 4)
+        b = nengo.Ensemble(30, 2)
+        conns = [nengo.Connection(ens.ea_ensembles[0], b[0],
+                                  solver=nengo.solvers.LstsqNoise()),
+                 nengo.Connection(ens.output[1:3], b,
+                                  transform=nengo.dists.Uniform(-1, 1)),
+                 nengo.Connection(b, ens.input[2:], function=np.square),
+                 nengo.Connection(b[1], ens.ea_ensembles[3],
+                                  solver=nengo.solvers.LstsqL2(weights=True))]
+        conns.extend(net.all_connections)
+
+    model = Model()
+    model.build(net)
+    threaded_model = Model(n_threads=4)
+    threaded_model.build(net)
+
+    assert threaded_model.solver_pool is None
+    assert len(threaded_model.decoder_results) == 0
+    for conn in conns:
+        assert np.array_equal(model.params[conn].weights,
+                              threaded_model.params[conn].weights)
+
+
 def test_signal_reshape():
     """Tests Signal.reshape"""
     three_d = Signal(np.ones((2, 2, 2)))
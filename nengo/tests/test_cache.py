@@ -1,4 +1,5 @@
 import errno
+import hashlib
 import multiprocessing
 import os
 import timeit
@@ -8,7 +9,9 @@ from numpy.testing import assert_equal
 import pytest
 
 import nengo
-from nengo.cache import DecoderCache, Fingerprint, get_fragment_size
+from nengo.cache import (
+    array_digest, CacheIndex, DecoderCache, DirectoryStore, Fingerprint,
+    get_fragment_size, SharedStore)
 from nengo.exceptions import FingerprintError
 from nengo.solvers import LstsqL2
 from nengo.utils.compat import int_types
@@ -23,7 +26,7 @@ class SolverMock(object):
         self.__name__ = name
 
     def __call__(self, solver, neuron_type, gain, bias, x, targets,
-                 rng=np.random, E=None):
+                 rng=np.random, E=None, activities=None):
         self.n_calls[self] += 1
         if E is None:
             return np.random.rand(x.shape[1], targets.shape[1]), {'info': 'v'}
@@ -205,6 +208,159 @@ def test_decoder_cache_shrink_threadsafe(monkeypatch, tmpdir):
         cache.shrink(limit)
 
 
+def test_decoder_cache_shrink_lru(monkeypatch, tmpdir):
+    cache_dir = str(tmpdir)
+    solver_mock = SolverMock()
+    another_solver = SolverMock('another_solver')
+
+    for solver in (solver_mock, another_solver):
+        with DecoderCache(cache_dir=cache_dir) as cache:
+            cache.wrap_solver(solver)(**get_solver_test_args())
+
+    with DecoderCache(cache_dir=cache_dir) as cache:
+        cache_size = cache.get_size_in_bytes()
+
+        # shrinking below the limit does not need to look at the files
+        with monkeypatch.context() as m:
+            m.setattr(cache, 'get_files', None)
+            m.setattr('os.listdir', None)
+            cache.shrink(cache_size)
+
+        # access the older result, so that the newer one is removed
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        cache.shrink(cache_size - 1)
+        assert cache.get_size_in_bytes() < cache_size
+
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 1
+        cache.wrap_solver(another_solver)(**get_solver_test_args())
+        assert SolverMock.n_calls[another_solver] == 2
+
+
+def test_decoder_cache_shrink_watermark(tmpdir):
+    cache_dir = str(tmpdir)
+    solvers = [SolverMock('solver%d' % i) for i in range(10)]
+
+    for solver in solvers:
+        with DecoderCache(cache_dir=cache_dir) as cache:
+            cache.wrap_solver(solver)(**get_solver_test_args())
+
+    with DecoderCache(cache_dir=cache_dir) as cache:
+        cache_size = cache.get_size_in_bytes()
+
+        cache.shrink(cache_size - 1, watermark=1.)
+        size = cache.get_size_in_bytes()
+        assert 0.8 * cache_size < size < cache_size
+
+        # once the limit is exceeded, the cache is shrunk below the watermark
+        cache.shrink(size - 1)
+        assert cache.get_size_in_bytes() <= 0.9 * (size - 1)
+
+
+def test_decoder_cache_stats(tmpdir):
+    solver_mock = SolverMock()
+
+    with DecoderCache(cache_dir=str(tmpdir)) as cache:
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        stats = cache.stats()
+        assert stats['hits'] == 0 and stats['misses'] == 1
+        assert stats['bytes_read'] == 0 and stats['bytes_written'] > 0
+
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['bytes_read'] == stats['bytes_written']
+        assert stats['time_saved'] > 0
+        assert stats['key_time'] > 0 and stats['io_time'] > 0
+
+
+def test_model_cache_stats(tmpdir, RefSimulator, seed):
+    with nengo.Network(seed=seed) as model:
+        a = nengo.Ensemble(10, 1)
+        nengo.Connection(a, nengo.Ensemble(10, 1))
+
+    cache = DecoderCache(cache_dir=str(tmpdir))
+    # the ensembles and the connection, each stored once
+    for hits, misses in [(0, 3), (3, 0)]:
+        with RefSimulator(model, model=nengo.builder.Model(
+                dt=0.001, decoder_cache=cache)) as sim:
+            assert sim.model.cache_stats['hits'] == hits
+            assert sim.model.cache_stats['misses'] == misses
+
+
+def test_cache_cli(tmpdir, capsys):
+    cache_dir = str(tmpdir)
+    with DecoderCache(cache_dir=cache_dir) as cache:
+        cache.wrap_solver(SolverMock())(**get_solver_test_args())
+        cache.wrap_solver(SolverMock('another'))(**get_solver_test_args())
+        path, = cache.get_files()
+    with open(path, 'r+b') as f:
+        f.truncate(os.stat(path).st_size - 1)
+    unreferenced = os.path.join(os.path.dirname(path), 'unreferenced.nco')
+    open(unreferenced, 'w').close()
+
+    assert nengo.cache.main(['--cache-dir', cache_dir, 'info']) == 0
+    assert "Entries: 2" in capsys.readouterr()[0]
+
+    assert nengo.cache.main(['--cache-dir', cache_dir, 'verify']) == 1
+    out = capsys.readouterr()[0]
+    assert "Unreadable: %s" % path in out
+    assert "Unreferenced: %s" % unreferenced in out
+
+    assert nengo.cache.main(
+        ['--cache-dir', cache_dir, 'verify', '--remove']) == 0
+    assert nengo.cache.main(['--cache-dir', cache_dir, 'verify']) == 0
+    assert "0 unreadable and 0 unreferenced" in capsys.readouterr()[0]
+
+    with DecoderCache(cache_dir=cache_dir) as cache:
+        cache.wrap_solver(SolverMock())(**get_solver_test_args())
+    assert nengo.cache.main(
+        ['--cache-dir', cache_dir, 'prune', '--size', '0 B']) == 0
+    assert "Entries: 0" in capsys.readouterr()[0]
+
+
+class FailingStore(SharedStore):
+    def get(self, key):
+        raise IOError("Shared store unavailable.")
+
+    def put(self, key, data):
+        raise IOError("Shared store unavailable.")
+
+
+def test_decoder_cache_shared(tmpdir):
+    shared = DirectoryStore(str(tmpdir.join('shared')))
+    solver_mock = SolverMock()
+
+    with DecoderCache(cache_dir=str(tmpdir.join('a')), shared=shared) as a:
+        decoders1, solver_info1 = a.wrap_solver(solver_mock)(
+            **get_solver_test_args())
+
+    with DecoderCache(cache_dir=str(tmpdir.join('b')), shared=shared) as b:
+        decoders2, solver_info2 = b.wrap_solver(solver_mock)(
+            **get_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 1
+        assert b.stats()['hits'] == b.stats()['shared_hits'] == 1
+        assert_equal(decoders1, decoders2)
+        assert not decoders2.flags.writeable
+        assert solver_info1 == solver_info2
+
+    # the result was copied to the local cache
+    with DecoderCache(cache_dir=str(tmpdir.join('b')),
+                      shared=FailingStore()) as b:
+        b.wrap_solver(solver_mock)(**get_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 1
+        assert b.stats()['hits'] == 1 and b.stats()['shared_hits'] == 0
+
+
+def test_decoder_cache_shared_failures(tmpdir):
+    solver_mock = SolverMock()
+
+    with DecoderCache(cache_dir=str(tmpdir), shared=FailingStore()) as cache:
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        cache.wrap_solver(solver_mock)(**get_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 1
+
+
 def test_decoder_cache_with_E_argument_to_solver(tmpdir):
     cache_dir = str(tmpdir)
     solver_mock = SolverMock()
@@ -220,6 +376,43 @@ def test_decoder_cache_with_E_argument_to_solver(tmpdir):
         assert solver_info1 == solver_info2
 
 
+def test_decoder_cache_hash_fn(tmpdir):
+    solver_mock = SolverMock()
+
+    with DecoderCache(cache_dir=str(tmpdir), hash_fn=hashlib.sha1) as cache:
+        cache.wrap_solver(solver_mock)(**get_weight_solver_test_args())
+        cache.wrap_solver(solver_mock)(**get_weight_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 1
+        assert cache.stats()['key_time'] > 0
+
+    with DecoderCache(cache_dir=str(tmpdir)) as cache:
+        cache.wrap_solver(solver_mock)(**get_weight_solver_test_args())
+        assert SolverMock.n_calls[solver_mock] == 2  # different keys
+
+
+def test_array_digest_memoized():
+    n_calls = [0]
+
+    def hash_fn():
+        n_calls[0] += 1
+        return hashlib.sha1()
+
+    x = np.array(np.arange(12.).reshape(3, 4))
+    digest = array_digest(x.T[1:], hash_fn)
+    assert array_digest(x.T[1:], hash_fn) == digest
+    assert n_calls[0] == 2  # writeable arrays are hashed every time
+
+    x.setflags(write=False)
+    assert array_digest(x.T[1:], hash_fn) == digest
+    assert array_digest(x.T[1:], hash_fn) == digest
+    assert n_calls[0] == 3
+
+    assert array_digest(x.T[:3], hash_fn) != digest
+    assert array_digest(x.T[1:].ravel(), hash_fn) != digest
+    assert array_digest(x.T[1:].astype(np.float32), hash_fn) != digest
+    assert n_calls[0] == 6
+
+
 class DummyA(object):
     def __init__(self, attr=0):
         self.attr = attr
@@ -277,6 +470,61 @@ def test_cache_works(tmpdir, RefSimulator, seed):
         assert len(os.listdir(cache_dir)) == 3  # legacy.txt, index, and *.nco
 
 
+def test_cache_hits_are_memory_mapped(tmpdir, RefSimulator, seed):
+    cache_dir = str(tmpdir)
+
+    with nengo.Network(seed=seed) as model:
+        a = nengo.Ensemble(10, 1)
+        conn = nengo.Connection(a, nengo.Ensemble(10, 1))
+        p = nengo.Probe(a, synapse=0.01)
+
+    data = []
+    for _ in range(2):
+        with RefSimulator(model, model=nengo.builder.Model(
+                dt=0.001, decoder_cache=DecoderCache(cache_dir=cache_dir))
+        ) as sim:
+            sim.run(0.01)
+        data.append(sim.data[p])
+        weights = sim.model.params[conn].weights
+
+    assert isinstance(weights, np.memmap)
+    assert not weights.flags.writeable
+    assert np.array_equal(data[0], data[1])
+
+
+def test_cache_built_objects(tmpdir, RefSimulator, seed, monkeypatch):
+    cache_dir = str(tmpdir)
+
+    with nengo.Network(seed=seed) as model:
+        a = nengo.Ensemble(10, 1)
+        b = nengo.Ensemble(10, 1)
+        conn = nengo.Connection(a, b, function=lambda x: x ** 2)
+
+    def build():
+        return nengo.builder.Model(
+            dt=0.001, decoder_cache=DecoderCache(cache_dir=cache_dir))
+
+    with RefSimulator(model, model=build()) as sim:
+        params = sim.model.params
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Built objects not loaded from cache")
+
+    with monkeypatch.context() as m:
+        m.setattr(nengo.builder.ensemble, 'sample_ensemble', fail)
+        m.setattr(nengo.builder.connection, 'get_encoded_activities', fail)
+        with RefSimulator(model, model=build()) as sim:
+            for obj in (a, b, conn):
+                for x, y in zip(params[obj], sim.model.params[obj]):
+                    assert_equal(x, y)
+
+    # the cache detects changes of the function through the targets
+    conn.function = lambda x: -x
+    with RefSimulator(model, model=build()) as sim:
+        assert not np.allclose(
+            params[conn].weights, sim.model.params[conn].weights)
+
+
 def test_cache_not_used_without_seed(tmpdir, RefSimulator):
     cache_dir = str(tmpdir)
 
@@ -290,6 +538,120 @@ def test_cache_not_used_without_seed(tmpdir, RefSimulator):
         assert len(os.listdir(cache_dir)) == 2  # legacy.txt and index
 
 
+def test_cache_index_shared(tmpdir):
+    filename = str(tmpdir.join('index'))
+    path = str(tmpdir.join('ab', 'cdef.nco'))
+
+    with CacheIndex(filename) as index, CacheIndex(filename) as index2:
+        index['key'] = (path, 0, 10)
+        assert index2['key'] == (path, 0, 10)
+        index2['key2'] = (path, 10, 20)
+        assert 'key2' in index
+
+        index.remove_file_entry(path)
+        index2.refresh()
+        assert 'key' not in index2 and len(index2) == 0
+
+        # partially written records are read once they are complete
+        with open(filename, 'ab') as f:
+            f.write(b'+\tkey3\tab/cdef.nco\t0')
+            f.flush()
+            assert 'key3' not in index
+            f.write(b'\t5\n')
+        assert index['key3'] == (path, 0, 5)
+
+
+def test_cache_index_compaction(tmpdir):
+    filename = str(tmpdir.join('index'))
+    paths = [str(tmpdir.join('ab', 'c%d.nco' % i)) for i in range(10)]
+
+    with CacheIndex(filename, compact_min=10) as index:
+        with CacheIndex(filename) as index2:
+            for i, path in enumerate(paths):
+                index[str(i)] = (path, 0, i)
+            for path in paths[:8]:
+                index.remove_file_entry(path)
+            index.sync()
+
+            with open(filename) as f:
+                assert len(f.readlines()) == 2
+            index2.refresh()
+            assert len(index2) == 2 and index2['9'] == (paths[9], 0, 9)
+
+        index['10'] = (paths[0], 0, 10)
+        with open(filename) as f:
+            assert len(f.readlines()) == 3
+
+
+def test_cache_index_lru(tmpdir):
+    filename = str(tmpdir.join('index'))
+    a, b, c = (str(tmpdir.join('ab', name)) for name in ('a', 'b', 'c'))
+
+    with CacheIndex(filename, compact_min=8, fragment_size=16) as index:
+        index['a0'] = (a, 0, 10)
+        index['b0'] = (b, 0, 20)
+        index['a1'] = (a, 10, 20)
+        index['c0'] = (c, 0, 40)
+        assert index.size_in_bytes == 32 + 32 + 48
+
+        index.touch(b)
+        with CacheIndex(filename, fragment_size=16) as index2:
+            assert index2.pop_least_recently_used() == (a, 32)
+            assert index2.size_in_bytes == 32 + 48
+
+        index.touch(c)
+        index.touch(b)
+        index.sync()  # compacts the log, which keeps the order of access
+        with open(filename) as f:
+            assert len(f.readlines()) == 2
+        assert index.size_in_bytes == 32 + 48
+        assert index.pop_least_recently_used() == (c, 48)
+        assert index.pop_least_recently_used() == (b, 32)
+        assert index.size_in_bytes == 0
+        with pytest.raises(KeyError):
+            index.pop_least_recently_used()
+
+
+def test_cache_index_ignores_corrupted_records(tmpdir):
+    filename = str(tmpdir.join('index'))
+    with open(filename, 'w') as f:
+        f.write("corrupted\n+\tkey\tab/cdef.nco\t0\t5\n")
+
+    with CacheIndex(filename) as index:
+        assert index['key'] == (str(tmpdir.join('ab', 'cdef.nco')), 0, 5)
+
+
+def add_index_entries(filename, n_entries, i):
+    with CacheIndex(filename) as index:
+        for j in range(n_entries):
+            index['%d-%d' % (i, j)] = (filename + '.nco', j, j + 1)
+
+
+@pytest.mark.benchmark
+@pytest.mark.slow
+def test_cache_index_contention_benchmark(tmpdir, logger):
+    filename = str(tmpdir.join('index'))
+    n_processes, n_entries = 32, 1000
+
+    processes = [
+        multiprocessing.Process(
+            target=add_index_entries, args=(filename, n_entries, i))
+        for i in range(n_processes)]
+    start = timeit.default_timer()
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+    duration = timeit.default_timer() - start
+    logger.info("%d processes added %d entries each in %.3f s",
+                n_processes, n_entries, duration)
+
+    for p in processes:
+        assert p.exitcode == 0
+    with CacheIndex(filename) as index:
+        assert len(index) == n_processes * n_entries
+
+
 def build_many_ensembles(cache_dir, RefSimulator):
     with nengo.Network(seed=1) as model:
         for _ in range(100):
@@ -303,6 +303,147 @@ def test_dist_transform(Simulator, seed):
     assert np.allclose(w, sim.model.params[conn].weights)
 
 
+def test_sparse_weights(RefSimulator, seed, rng):
+    transform = rng.uniform(-1e-3, 1e-3, size=(120, 100))
+    transform[rng.rand(*transform.shape) > 0.05] = 0
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=np.sin)
+        a = nengo.Ensemble(100, 1)
+        b = nengo.Ensemble(120, 1)
+        nengo.Connection(u, a)
+        nengo.Connection(a.neurons, b.neurons, transform=transform)
+        p = nengo.Probe(b.neurons, 'input')
+
+    with RefSimulator(net) as sim:
+        sim.run(0.05)
+    assert any(isinstance(op, nengo.builder.operator.SparseDotInc)
+               for op in sim.model.operators)
+
+    dense_model = nengo.builder.Model(sparse_threshold=None)
+    with RefSimulator(net, model=dense_model) as dense_sim:
+        dense_sim.run(0.05)
+    assert not any(isinstance(op, nengo.builder.operator.SparseDotInc)
+                   for op in dense_sim.model.operators)
+    assert np.allclose(sim.data[p], dense_sim.data[p])
+
+
+def test_sparse_weights_probed(RefSimulator, seed, rng):
+    scipy_sparse = pytest.importorskip('scipy.sparse')
+    transform = rng.uniform(-1e-3, 1e-3, size=(200, 200))
+    transform[rng.rand(*transform.shape) > 0.03] = 0
+    with nengo.Network(seed=seed) as net:
+        a = nengo.Ensemble(200, 1)
+        b = nengo.Ensemble(200, 1)
+        probed = nengo.Connection(a.neurons, b.neurons, transform=transform)
+        nengo.Connection(a.neurons, b.neurons, transform=transform)
+        nengo.Connection(a.neurons, b.neurons,
+                         transform=scipy_sparse.csr_matrix(transform))
+        p = nengo.Probe(probed, 'weights')
+        p_sparse = nengo.Probe(net.connections[-1], 'weights')
+
+    with RefSimulator(net) as sim:
+        sim.run(0.003)
+    # only the unprobed connection is simulated as sparse
+    assert sum(isinstance(op, nengo.builder.operator.SparseDotInc)
+               for op in sim.model.operators) == 1
+    weights = sim.data[b].gain[:, np.newaxis] * transform
+    assert sim.data[p].shape == (3, 200, 200)
+    assert np.allclose(sim.data[p], weights)
+    assert sim.data[p_sparse].shape == (3, 200, 200)
+    assert np.allclose(sim.data[p_sparse], weights)
+
+
+def test_sparse_transform(RefSimulator, seed, rng):
+    scipy_sparse = pytest.importorskip('scipy.sparse')
+    transform = scipy_sparse.random(
+        50, 3, density=0.2, format='coo', random_state=rng)
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: [np.sin(t), np.cos(t), t])
+        a = nengo.Ensemble(50, 1, seed=seed)
+        b = nengo.Ensemble(50, 1, seed=seed)
+        nengo.Connection(u, a.neurons, transform=transform)
+        nengo.Connection(u, b.neurons, transform=transform.toarray())
+        pa = nengo.Probe(a.neurons, 'input')
+        pb = nengo.Probe(b.neurons, 'input')
+
+    with RefSimulator(net) as sim:
+        sim.run(0.01)
+    assert sum(isinstance(op, nengo.builder.operator.SparseDotInc)
+               for op in sim.model.operators) == 1
+    assert np.allclose(sim.data[pa], sim.data[pb])
+
+    with pytest.raises(ValidationError):
+        nengo.Connection(u, a.neurons, transform=transform.T)
+
+
+def test_spike_weights(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: np.sin(t * np.arange(1, 9)))
+        a = nengo.Ensemble(200, 8, neuron_type=nengo.LIF())
+        b = nengo.Ensemble(80, 1, neuron_type=nengo.LIFRate())
+        nengo.Connection(u, a)
+        conn = nengo.Connection(a.neurons, b.neurons, synapse=None,
+                                transform=np.ones((80, 200)) * 1e-3)
+        nengo.Connection(b.neurons, a.neurons,
+                         transform=np.ones((200, 80)) * 1e-3)
+        p = nengo.Probe(conn, 'output', synapse=None)
+        pa = nengo.Probe(a.neurons, synapse=None)
+
+    with RefSimulator(net) as sim:
+        sim.run(0.05)
+
+        # the weights are stored column-major, so they are not copied
+        sig = sim.model.sig[conn]['weights']
+        assert sig.initial_value.flags.f_contiguous
+        assert np.may_share_memory(sim.signals[sig], sig.initial_value)
+
+    assert sum(isinstance(op, nengo.builder.operator.SpikeDotInc)
+               for op in sim.model.operators) == 1
+    weights = sim.model.params[conn].weights
+    assert np.allclose(sim.data[p], np.dot(sim.data[pa], weights.T))
+
+    # trials share the weights, and each matches the single simulation
+    with RefSimulator(net, n_trials=2) as trials_sim:
+        trials_sim.run(0.05)
+    for trial_data in trials_sim.data[p]:
+        assert np.allclose(trial_data, sim.data[p])
+
+
+def test_shared_activities(seed, monkeypatch):
+    n_calls = [0]
+    rates = nengo.LIF.rates
+
+    def counting_rates(self, x, gain, bias):
+        n_calls[0] += 1
+        return rates(self, x, gain, bias)
+
+    monkeypatch.setattr(nengo.LIF, 'rates', counting_rates)
+    with nengo.Network(seed=seed) as net:
+        a = nengo.Ensemble(50, 2)
+        b = nengo.Ensemble(50, 1)
+        conns = [nengo.Connection(a, b, function=lambda x: x[0] * x[1]),
+                 nengo.Connection(a[0], b),
+                 nengo.Connection(a, b, function=lambda x: x[1] ** 2)]
+        nengo.Connection(a, b, eval_points=np.ones((10, 2)),
+                         function=lambda x: x[1])
+
+    model = nengo.builder.Model()
+    model.build(net)
+    assert n_calls[0] == 2
+    assert len(model.activity_cache) == 0
+
+    monkeypatch.setattr(nengo.LIF, 'rates', rates)
+    for conn in conns:
+        eval_points = model.params[conn].eval_points
+        targets = np.array([conn.function(x) if conn.function else x[0]
+                            for x in eval_points])
+        activities = nengo.builder.ensemble.get_activities(
+            model, a, eval_points)
+        decoders, _ = nengo.solvers.LstsqL2()(
+            activities, targets.reshape(len(targets), -1))
+        assert np.allclose(model.params[conn].weights, decoders.T)
+
+
 def test_weights(Simulator, nl, plt, seed):
     n1, n2 = 100, 50
 
@@ -1,3 +1,7 @@
+import gc
+import timeit
+import weakref
+
 import numpy as np
 import pytest
 
@@ -7,7 +11,7 @@ from nengo.processes import WhiteSignal
 from nengo.solvers import LstsqL2nz
 from nengo.utils.ensemble import tuning_curves
 from nengo.utils.matplotlib import implot, rasterplot
-from nengo.utils.neurons import rates_kernel
+from nengo.utils.neurons import rates_kernel, settled_firingrate
 from nengo.utils.numpy import rms, rmse
 
 
@@ -135,6 +139,292 @@ def test_lif_zero_tau_ref(Simulator):
     assert np.allclose(sim.data[p][1:], max_rate)
 
 
+def lif_step_reference(lif, dt, J, spiked, voltage, refractory_time):
+    """The LIF step before it was made to work in place, for comparison."""
+    refractory_time -= dt
+    delta_t = (dt - refractory_time).clip(0, dt)
+    voltage -= (J - voltage) * np.expm1(-delta_t / lif.tau_rc)
+    spiked_mask = voltage > 1
+    spiked[:] = spiked_mask / dt
+    t_spike = dt + lif.tau_rc * np.log1p(
+        -(voltage[spiked_mask] - 1) / (J[spiked_mask] - 1))
+    voltage[voltage < lif.min_voltage] = lif.min_voltage
+    voltage[spiked_mask] = 0
+    refractory_time[spiked_mask] = lif.tau_ref + t_spike
+
+
+@pytest.mark.parametrize('lif', [
+    nengo.LIF(), nengo.LIF(min_voltage=-0.5), nengo.LIF(min_voltage=-np.inf),
+    nengo.LIF(tau_rc=0.05, tau_ref=0)])
+@pytest.mark.parametrize('shape', [(100,), (3, 50)])
+def test_lif_step_identical(lif, shape, rng):
+    dt = 1e-3
+    J = rng.uniform(-20, 20, size=shape)
+    args = [np.zeros(shape) for _ in range(3)]
+    ref_args = [np.zeros(shape) for _ in range(3)]
+
+    step = lif.make_step(dt, J, *args)
+    for _ in range(200):
+        step()
+        lif_step_reference(lif, dt, J, *ref_args)
+        J += rng.uniform(-1, 1, size=shape)
+        for x, y in zip(args, ref_args):
+            assert np.array_equal(x, y)
+            assert np.array_equal(np.signbit(x), np.signbit(y))
+
+
+@pytest.mark.benchmark
+@pytest.mark.slow
+def test_lif_step_benchmark(rng, analytics, logger):
+    dt = 1e-3
+    lif = nengo.LIF()
+    for n in (10, 100, 1000, 10000, 100000):
+        J = rng.uniform(-2, 20, size=n)
+        spiked, voltage, refractory_time = (np.zeros(n) for _ in range(3))
+        step = lif.make_step(dt, J, spiked, voltage, refractory_time)
+
+        def reference():
+            lif_step_reference(lif, dt, J, spiked, voltage, refractory_time)
+
+        def step_math():
+            lif.step_math(dt, J, spiked, voltage, refractory_time)
+
+        n_steps = max(10, 1000000 // n)
+        ref_us = 1e6 * min(timeit.repeat(
+            reference, number=n_steps, repeat=3)) / n_steps
+        step_us = 1e6 * min(timeit.repeat(
+            step, number=n_steps, repeat=3)) / n_steps
+        step_math_us = 1e6 * min(timeit.repeat(
+            step_math, number=n_steps, repeat=3)) / n_steps
+        logger.info("LIF step for %d neurons: %.1f us (step_math %.1f us, "
+                    "was %.1f us)", n, step_us, step_math_us, ref_us)
+        analytics.add_data('step_us_%d' % n, step_us)
+        analytics.add_data('step_math_us_%d' % n, step_math_us)
+        analytics.add_data('reference_us_%d' % n, ref_us)
+
+    # estimating rates with settled_firingrate reuses one step function
+    for n in (100, 10000):
+        J = rng.uniform(-2, 20, size=n)
+
+        def rates(step_math, make_step=None):
+            states = [np.zeros(n), np.zeros(n)]
+            return lambda: settled_firingrate(
+                step_math, J, states, make_step=make_step)
+
+        def reference_step_math(dt, J, *args):
+            lif_step_reference(lif, dt, J, *args)
+
+        ref_ms = 1e3 * min(timeit.repeat(
+            rates(reference_step_math), number=1, repeat=3))
+        rates_ms = 1e3 * min(timeit.repeat(
+            rates(lif.step_math, lif.make_step), number=1, repeat=3))
+        logger.info("LIF settled_firingrate for %d currents: %.1f ms "
+                    "(was %.1f ms)", n, rates_ms, ref_ms)
+        analytics.add_data('rates_ms_%d' % n, rates_ms)
+        analytics.add_data('rates_reference_ms_%d' % n, ref_ms)
+
+
+def izhikevich_step_reference(izh, dt, J, spiked, voltage, recovery):
+    """The Izhikevich step before it was made to work in place."""
+    J = np.maximum(-30., J)
+    dV = (0.04 * voltage ** 2 + 5 * voltage + 140 - recovery + J) * 1000
+    voltage[:] += dV * dt
+    spiked[:] = (voltage >= 30) / dt
+    voltage[spiked > 0] = izh.reset_voltage
+    dU = (izh.tau_recovery * (izh.coupling * voltage - recovery)) * 1000
+    recovery[:] += dU * dt
+    recovery[spiked > 0] = recovery[spiked > 0] + izh.reset_recovery
+
+
+def alif_step_reference(alif, dt, J, output, voltage, ref, adaptation):
+    """The AdaptiveLIF step before it was made to work in place."""
+    n = adaptation
+    lif_step_reference(alif, dt, J - n, output, voltage, ref)
+    n += (dt / alif.tau_n) * (alif.inc_n * output - n)
+
+
+@pytest.mark.parametrize('neuron_type, reference, n_states', [
+    (nengo.Izhikevich(), izhikevich_step_reference, 2),
+    (nengo.Izhikevich(reset_voltage=-55, reset_recovery=4),
+     izhikevich_step_reference, 2),
+    (nengo.AdaptiveLIF(), alif_step_reference, 3),
+    (nengo.AdaptiveLIF(tau_n=0.1, inc_n=0.5, min_voltage=-1),
+     alif_step_reference, 3)])
+def test_step_identical(neuron_type, reference, n_states, rng):
+    dt = 1e-3
+    J = rng.uniform(-40, 40, size=100)
+    args = [np.zeros(100) for _ in range(n_states + 1)]
+    ref_args = [np.zeros(100) for _ in range(n_states + 1)]
+    math_args = [np.zeros(100) for _ in range(n_states + 1)]
+
+    step = neuron_type.make_step(dt, J, *args)
+    for _ in range(200):
+        step()
+        reference(neuron_type, dt, J, *ref_args)
+        neuron_type.step_math(dt, J, *math_args)
+        J += rng.uniform(-1, 1, size=100)
+        for x, y, z in zip(args, ref_args, math_args):
+            assert np.array_equal(x, y)
+            assert np.array_equal(x, z)
+
+
+@pytest.mark.parametrize('neuron_type, n_states', [
+    (nengo.LIF(), 2), (nengo.AdaptiveLIF(), 3), (nengo.Izhikevich(), 2)])
+def test_step_math_stateless(neuron_type, n_states):
+    args = [np.zeros(10) for _ in range(n_states + 2)]
+    neuron_type.step_math(0.001, *args)
+    neuron_type.rates(np.linspace(-1, 1, 5)[:, np.newaxis],
+                      np.ones(10), np.ones(10))
+
+    # the neuron type keeps no references to the arrays
+    refs = [weakref.ref(x) for x in args]
+    del args
+    gc.collect()
+    assert all(ref() is None for ref in refs)
+
+
+@pytest.mark.parametrize('neuron_type', [
+    nengo.LIF, nengo.AdaptiveLIF, nengo.Izhikevich])
+def test_step_math_override(neuron_type, Simulator):
+    class Overridden(neuron_type):
+        def step_math(self, dt, J, output, *states):
+            output[...] = 7
+
+    with nengo.Network() as net:
+        ens = nengo.Ensemble(10, 1, neuron_type=Overridden(),
+                             gain=np.ones(10), bias=np.ones(10))
+        p = nengo.Probe(ens.neurons)
+
+    # the simulator uses ``step_math`` rather than the in-place step
+    with Simulator(net) as sim:
+        sim.run_steps(5)
+    assert np.all(sim.data[p] == 7)
+
+
+@pytest.mark.benchmark
+@pytest.mark.slow
+@pytest.mark.parametrize('neuron_type, reference, n_states', [
+    (nengo.Izhikevich(), izhikevich_step_reference, 2),
+    (nengo.AdaptiveLIF(), alif_step_reference, 3)])
+def test_step_benchmark(neuron_type, reference, n_states, rng, analytics,
+                        logger):
+    dt = 1e-3
+    name = type(neuron_type).__name__
+    for n in (100, 10000, 100000):
+        J = rng.uniform(-2, 20, size=n)
+        args = [np.zeros(n) for _ in range(n_states + 1)]
+        step = neuron_type.make_step(dt, J, *args)
+
+        def reference_step():
+            reference(neuron_type, dt, J, *args)
+
+        def step_math():
+            neuron_type.step_math(dt, J, *args)
+
+        n_steps = max(10, 1000000 // n)
+        ref_ns = 1e9 * min(timeit.repeat(
+            reference_step, number=n_steps, repeat=3)) / (n_steps * n)
+        step_ns = 1e9 * min(timeit.repeat(
+            step, number=n_steps, repeat=3)) / (n_steps * n)
+        step_math_ns = 1e9 * min(timeit.repeat(
+            step_math, number=n_steps, repeat=3)) / (n_steps * n)
+        logger.info("%s step for %d neurons: %.2f ns per neuron "
+                    "(step_math %.2f ns, was %.2f ns)",
+                    name, n, step_ns, step_math_ns, ref_ns)
+        analytics.add_data('%s_step_ns_%d' % (name, n), step_ns)
+        analytics.add_data('%s_step_math_ns_%d' % (name, n), step_math_ns)
+        analytics.add_data('%s_reference_ns_%d' % (name, n), ref_ns)
+
+    # estimating rates with settled_firingrate reuses one step function
+    for n in (100, 10000):
+        J = rng.uniform(-2, 20, size=n)
+
+        def rates(step_math, make_step=None):
+            states = [np.zeros(n) for _ in range(n_states)]
+            return lambda: settled_firingrate(
+                step_math, J, states, make_step=make_step)
+
+        def reference_step_math(dt, J, *args):
+            reference(neuron_type, dt, J, *args)
+
+        ref_ms = 1e3 * min(timeit.repeat(
+            rates(reference_step_math), number=1, repeat=3))
+        rates_ms = 1e3 * min(timeit.repeat(
+            rates(neuron_type.step_math, neuron_type.make_step),
+            number=1, repeat=3))
+        logger.info("%s settled_firingrate for %d currents: %.1f ms "
+                    "(was %.1f ms)", name, n, rates_ms, ref_ms)
+        analytics.add_data('%s_rates_ms_%d' % (name, n), rates_ms)
+        analytics.add_data('%s_rates_reference_ms_%d' % (name, n), ref_ms)
+
+
+@pytest.mark.parametrize('neuron_type', [
+    nengo.LIFRate, nengo.Sigmoid, nengo.AdaptiveLIFRate, nengo.LIF])
+def test_rate_table(neuron_type, Simulator, seed, rng):
+    tolerance = 0.01
+    exact = neuron_type()
+    tabulated = neuron_type(table_tolerance=tolerance)
+    assert exact.rate_table is None
+    assert tabulated.rate_table.max_error <= tolerance
+    assert repr(tabulated) == "%s(table_tolerance=0.01)" % (
+        neuron_type.__name__)
+
+    max_rates = rng.uniform(50, 300, size=100)
+    intercepts = rng.uniform(-0.95, 0.95, size=100)
+    gain, bias = exact.gain_bias(max_rates, intercepts)
+    x = np.linspace(-1.5, 1.5, 301)[:, np.newaxis]
+    assert np.allclose(tabulated.rates(x, gain, bias),
+                       exact.rates(x, gain, bias),
+                       atol=1.05 * tolerance, rtol=0)
+
+    with nengo.Network(seed=seed) as net:
+        stim = nengo.Node(lambda t: np.sin(6 * t))
+        probes = []
+        for neurons in (exact, tabulated):
+            ens = nengo.Ensemble(50, 1, neuron_type=neurons, seed=seed)
+            nengo.Connection(stim, ens, synapse=None)
+            probes.append(nengo.Probe(ens.neurons))
+
+    with Simulator(net) as sim:
+        sim.run(0.1)
+    if isinstance(exact, nengo.LIF):
+        # the table is only used for decoders, not for spiking neurons
+        assert np.array_equal(sim.data[probes[0]], sim.data[probes[1]])
+    else:
+        assert np.allclose(sim.data[probes[0]], sim.data[probes[1]],
+                           atol=2 * tolerance, rtol=0)
+
+
+def test_izhikevich_rate_grid(rng):
+    exact = nengo.Izhikevich()
+    gridded = nengo.Izhikevich(rate_resolution=0.05)
+    assert exact.rate_grid is None
+    assert repr(gridded) == "Izhikevich(rate_resolution=0.05)"
+
+    gain = rng.uniform(1, 20, size=50)
+    bias = rng.uniform(-10, 30, size=50)
+    x = np.linspace(-1, 1, 101)[:, np.newaxis]
+    error = np.abs(gridded.rates(x, gain, bias) - exact.rates(x, gain, bias))
+    # the exact rates count spikes over 1 s, so they are only accurate to 1 Hz
+    assert error.mean() < 0.5
+    assert np.percentile(error, 99) < 2.
+
+    # the grid is extended to the currents needed, and reused
+    n_currents = gridded.rate_grid.currents.size
+    assert n_currents <= (30. + (gain + bias).max()) / 0.05 + 2
+    gridded.rates(x, gain, bias)
+    assert gridded.rate_grid.currents.size == n_currents
+
+    # equal neuron types share a grid
+    assert nengo.Izhikevich(rate_resolution=0.05).rate_grid is (
+        gridded.rate_grid)
+
+    # very large currents are simulated directly, not gridded
+    rates = gridded.rates(np.array([1e4]), 1., 0.)
+    assert np.allclose(rates, exact.rates(np.array([1e4]), 1., 0.))
+    assert gridded.rate_grid.currents.size <= 2**14 + 1
+
+
 def test_alif_rate(Simulator, plt):
     n = 100
     max_rates = 50 * np.ones(n)
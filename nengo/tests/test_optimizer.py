@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import nengo
+from nengo.builder.neurons import SimNeurons
+from nengo.builder.operator import BatchDotInc
+from nengo.builder.signal import Signal, SignalDict
+from nengo.exceptions import BuildError
+
+
+def _network(seed):
+    with nengo.Network(seed=seed) as net:
+        stim = nengo.Node(lambda t: [np.sin(6 * t), np.cos(6 * t)])
+        ensembles = [nengo.Ensemble(30, 2) for _ in range(6)]
+        for ens in ensembles:
+            nengo.Connection(stim, ens)
+        for pre, post in zip(ensembles[:-1], ensembles[1:]):
+            nengo.Connection(pre, post, function=lambda x: x ** 2,
+                             synapse=0.01)
+        probes = [nengo.Probe(ens, synapse=0.01) for ens in ensembles]
+        probes.extend(nengo.Probe(ens.neurons) for ens in ensembles[:2])
+    return net, probes
+
+
+def test_optimize_same_results(RefSimulator, seed):
+    net, probes = _network(seed)
+    with RefSimulator(net, optimize=False) as sim:
+        sim.run(0.1)
+    with RefSimulator(net, optimize=True) as opt_sim:
+        opt_sim.run(0.1)
+
+    assert len(opt_sim.model.operators) < len(sim.model.operators)
+    for p in probes:
+        assert np.array_equal(sim.data[p], opt_sim.data[p])
+
+
+def test_optimize_updates_model_signals(RefSimulator, seed):
+    net, _ = _network(seed)
+    with RefSimulator(net, optimize=True) as sim:
+        for conn in net.all_connections:
+            weights = sim.signals[sim.model.sig[conn]['weights']]
+            assert np.array_equal(weights, sim.data[conn].weights)
+
+        for ens in net.all_ensembles:
+            encoders = sim.signals[sim.model.sig[ens]['encoders']]
+            assert np.array_equal(encoders, sim.data[ens].scaled_encoders)
+
+
+def test_batchdotinc(rng):
+    A = Signal(rng.uniform(-1, 1, size=(3, 4, 2)), name="A")
+    X = Signal(rng.uniform(-1, 1, size=(3, 2)), name="X")
+    Y = Signal(np.zeros((3, 4)), name="Y")
+    op = BatchDotInc(A, X, Y)
+
+    signals = SignalDict()
+    op.init_signals(signals)
+    step = op.make_step(signals, 0.001, rng)
+    step()
+    for i in range(3):
+        assert np.allclose(signals[Y][i],
+                           np.dot(A.initial_value[i], X.initial_value[i]))
+
+    with pytest.raises(BuildError):
+        BatchDotInc(A, X, Signal(np.zeros((3, 3)), name="Y"))
+
+
+def test_encoders_batched(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        stim = nengo.Node([0.5, -0.3])
+        ensembles = [nengo.Ensemble(20, 2) for _ in range(4)]
+        probes = []
+        for ens in ensembles:
+            nengo.Connection(stim, ens)
+            probes.append(nengo.Probe(ens.neurons))
+
+    with RefSimulator(net, optimize=False) as sim:
+        sim.run(0.01)
+    with RefSimulator(net) as opt_sim:
+        opt_sim.run(0.01)
+
+    batched = [op for op in opt_sim.model.operators
+               if isinstance(op, BatchDotInc)]
+    assert len(batched) == 1
+    assert batched[0].A.shape == (4, 20, 2)
+    for p in probes:
+        assert np.array_equal(sim.data[p], opt_sim.data[p])
+
+
+def test_neurons_merged(RefSimulator, seed):
+    neuron_types = [nengo.LIF(), nengo.LIF(), nengo.LIF(tau_rc=0.03),
+                    nengo.AdaptiveLIF(), nengo.LIFRate(), nengo.AdaptiveLIF()]
+    with nengo.Network(seed=seed) as net:
+        stim = nengo.Node(lambda t: np.sin(6 * t))
+        probes, decoded = [], []
+        for i, neuron_type in enumerate(neuron_types):
+            ens = nengo.Ensemble(10 + i, 1, neuron_type=neuron_type)
+            nengo.Connection(stim, ens)
+            probes.append(nengo.Probe(ens.neurons))
+            if 'voltage' in neuron_type.probeable:
+                probes.append(nengo.Probe(ens.neurons, 'voltage'))
+            decoded.append(nengo.Probe(ens, synapse=0.01))
+
+    with RefSimulator(net, optimize=False) as sim:
+        sim.run(0.05)
+    with RefSimulator(net) as opt_sim:
+        opt_sim.run(0.05)
+
+    merged = sorted(
+        (type(op.neurons).__name__, op.J.size) for op in
+        opt_sim.model.operators if isinstance(op, SimNeurons))
+    assert merged == [
+        ('AdaptiveLIF', 13 + 15), ('LIF', 12), ('LIF', 10 + 11),
+        ('LIFRate', 14)]
+
+    # neurons are simulated elementwise, so their states match exactly;
+    # the rounding of decoded outputs can depend on the alignment of the
+    # merged signals
+    for p in probes:
+        assert np.array_equal(sim.data[p], opt_sim.data[p])
+    for p in decoded:
+        assert np.any(sim.data[p] != 0)
+        assert np.allclose(sim.data[p], opt_sim.data[p])
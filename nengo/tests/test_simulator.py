@@ -1,11 +1,13 @@
 import gc
+import threading
+import timeit
 
 import numpy as np
 import pytest
 
 import nengo
 import nengo.simulator
-from nengo.exceptions import SimulatorClosed
+from nengo.exceptions import BuildError, SimulatorClosed
 from nengo.utils.compat import ResourceWarning
 from nengo.utils.testing import warns
 
@@ -54,6 +56,246 @@ def test_probedict():
     assert np.all(probedict.get("list") == np.asarray(raw.get("list")))
 
 
+def test_probebuffer():
+    buf = nengo.simulator.ProbeBuffer((2,), np.float64)
+    buf.reserve(3)
+    assert buf.capacity == 3 and len(buf) == 0
+
+    x = np.array([1., 2.])
+    for i in range(4):
+        buf.append(x + i)
+    assert len(buf) == 4
+    assert buf.capacity == 6
+    assert np.all(buf.data == [[1, 2], [2, 3], [3, 4], [4, 5]])
+    assert not buf.data.flags.writeable
+
+
+def test_probe_data_preallocated(RefSimulator):
+    with nengo.Network() as net:
+        u = nengo.Node(output=np.sin)
+        p = nengo.Probe(u)
+        p_every = nengo.Probe(u, sample_every=0.003)
+
+    with RefSimulator(net) as sim:
+        sim.run_steps(10)
+        buf = sim._probe_outputs[p]
+        assert buf.capacity == 10
+        assert sim._probe_outputs[p_every].capacity == 3
+
+        # the data are views on the preallocated array, not copies
+        data = sim.data[p]
+        assert np.may_share_memory(data, buf._array)
+        assert np.may_share_memory(sim.data[p], data)
+        assert not data.flags.writeable
+
+        sim.step()  # buffers grow when stepping without reserving
+        assert len(sim.data[p]) == 11 and buf.capacity == 20
+    assert np.allclose(sim.data[p], np.sin(sim.trange())[:, None])
+    assert len(sim.data[p_every]) == 3
+
+
+def test_probe_dir(RefSimulator, seed, tmpdir):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: [np.sin(t), t])
+        a = nengo.Ensemble(20, 1)
+        nengo.Connection(u[0], a)
+        probes = [nengo.Probe(u), nengo.Probe(a.neurons, sample_every=0.002),
+                  nengo.Probe(a, synapse=0.01)]
+
+    with RefSimulator(net) as sim:
+        sim.run(0.1)
+
+    probe_dir = str(tmpdir.join("probes"))
+    with RefSimulator(net, probe_dir=probe_dir) as file_sim:
+        assert file_sim._probe_outputs[probes[0]]._array.shape == (1024, 2)
+        file_sim.run(0.05)
+        file_sim.run(0.05)
+        file_data = []
+        for p in probes:
+            assert isinstance(file_sim.data[p], np.memmap)
+            file_data.append(np.array(file_sim.data[p]))
+
+    # the two simulators may round dot products differently, depending on
+    # the alignment of their signals
+    for p, data in zip(probes, file_data):
+        assert np.allclose(data, sim.data[p])
+
+    for i, p in enumerate(probes):
+        data = np.load(str(tmpdir.join("probes", "probe%d.npy" % i)))
+        assert np.array_equal(data, file_data[i])
+
+
+def test_probefile_reset(tmpdir):
+    filename = str(tmpdir.join("probe.npy"))
+    f = nengo.simulator.ProbeFile(filename, (), np.float64, chunk_size=2)
+    for i in range(5):
+        f.append(i)
+    data = f.data
+    assert np.array_equal(data, np.arange(5))
+    f.close()
+
+    f = nengo.simulator.ProbeFile(filename, (), np.float64, chunk_size=2)
+    assert len(f.data) == 0
+    f.append(-1)
+    f.close()
+    assert np.array_equal(np.load(filename), [-1])
+    assert np.array_equal(data, np.arange(5))
+
+
+def test_n_trials(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: np.sin(6 * t))
+        a = nengo.Ensemble(30, 1)
+        b = nengo.Ensemble(30, 1)
+        nengo.Connection(u, a)
+        nengo.Connection(a, b, function=np.square)
+        probes = [nengo.Probe(a, synapse=0.01), nengo.Probe(b.neurons),
+                  nengo.Probe(u, sample_every=0.003)]
+
+    with RefSimulator(net) as sim:
+        sim.run(0.1)
+    with RefSimulator(net, n_trials=3) as trials_sim:
+        trials_sim.run(0.1)
+
+    for p in probes:
+        assert trials_sim.data[p].shape == (3,) + sim.data[p].shape
+        for trial_data in trials_sim.data[p]:
+            assert np.allclose(trial_data, sim.data[p])
+
+
+def test_n_trials_noise(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        a = nengo.Ensemble(30, 1, noise=nengo.processes.WhiteNoise(
+            nengo.dists.Gaussian(0, 0.5)))
+        p = nengo.Probe(a, synapse=0.01)
+
+    with RefSimulator(net, n_trials=2) as sim:
+        sim.run(0.05)
+    assert not np.allclose(sim.data[p][0], sim.data[p][1])
+
+
+def test_n_threads(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: np.sin(6 * t) * np.ones(4))
+        ensembles = [nengo.Ensemble(200, 4) for _ in range(4)]
+        for ens in ensembles:
+            nengo.Connection(u, ens)
+            nengo.Connection(ens.neurons, ensembles[0].neurons,
+                             transform=np.ones((200, 200)) * -1e-4)
+        probes = [nengo.Probe(ens, synapse=0.01) for ens in ensembles]
+
+    with RefSimulator(net) as sim:
+        sim.run(0.05)
+    with RefSimulator(net, n_threads=2) as threaded_sim:
+        threaded_sim.run(0.05)
+        stepper = threaded_sim._stepper
+        assert any(len(parallel) > 1 for _, parallel in stepper.plan)
+
+    for p in probes:
+        assert np.allclose(sim.data[p], threaded_sim.data[p])
+
+
+def test_n_threads_stopped(RefSimulator):
+    n_threads = threading.active_count()
+
+    # a failed build does not leave threads behind
+    with pytest.raises(BuildError):
+        RefSimulator(object(), n_threads=2)
+    assert threading.active_count() == n_threads
+
+    # the threads are stopped if an open simulator is deallocated
+    with nengo.Network() as net:
+        nengo.Ensemble(10, 1)
+    sim = RefSimulator(net, n_threads=2)
+    assert threading.active_count() > n_threads
+    with warns(ResourceWarning):
+        del sim
+        gc.collect()
+    assert threading.active_count() == n_threads
+
+
+def test_parallelstepper_groups():
+    from nengo.builder.operator import Copy, DotInc
+    from nengo.builder.signal import Signal
+
+    x = Signal(np.ones(3), name="x")
+    y = Signal(np.zeros(4), name="y")
+    A = Signal(np.ones((4, 3)), name="A")
+    ops = [DotInc(A, x, y[:2]), DotInc(A[2:], x, y[2:]),
+           DotInc(A, x, y), Copy(x, Signal(np.zeros(3)))]
+    groups = nengo.simulator.ParallelStepper.independent_groups(
+        [(op, None) for op in ops])
+    assert [[op for op, _ in group] for group in groups] == [
+        ops[:3], ops[3:]]
+
+
+def test_run_steps_matches_step(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=lambda t: np.sin(6 * t))
+        a = nengo.Ensemble(20, 1)
+        nengo.Connection(u, a)
+        probes = [nengo.Probe(a, synapse=0.01),
+                  nengo.Probe(a, synapse=0.01, sample_every=0.003),
+                  nengo.Probe(a.neurons, sample_every=0.0025)]
+
+    with RefSimulator(net) as sim:
+        sim.run_steps(37)
+        sim.run_steps(23)
+    with RefSimulator(net) as step_sim:
+        for _ in range(60):
+            step_sim.step()
+
+    assert sim.n_steps == step_sim.n_steps == 60
+    assert sim.time == step_sim.time
+    for p in probes:
+        assert np.array_equal(sim.data[p], step_sim.data[p])
+
+
+@pytest.mark.benchmark
+@pytest.mark.slow
+def test_step_overhead_benchmark(RefSimulator, analytics, logger):
+    with nengo.Network() as net:
+        u = nengo.Node(output=np.sin)
+        a = nengo.Ensemble(10, 1)
+        nengo.Connection(u, a)
+        nengo.Probe(a, synapse=0.01)
+
+    n_steps = 2000
+    with RefSimulator(net) as sim:
+        def bare_loop():
+            # only the operators, to measure the overhead of the others
+            for _ in range(n_steps):
+                for step_fn in sim._steps:
+                    step_fn()
+
+        def step_loop():
+            for _ in range(n_steps):
+                sim.step()
+
+        def run_steps():
+            sim.run_steps(n_steps, progress_bar=False)
+
+        # interleave the runs and start each from a reset simulator, so
+        # that all of them see the same machine load and probe buffer sizes
+        times = {bare_loop: [], step_loop: [], run_steps: []}
+        for _ in range(10):
+            for fn, fn_times in times.items():
+                sim.reset()
+                fn_times.append(timeit.timeit(fn, number=1))
+
+    bare_us, step_us, run_us = (
+        1e6 * min(times[fn]) / n_steps
+        for fn in (bare_loop, step_loop, run_steps))
+    logger.info("Time per step of the operators: %.1f us", bare_us)
+    logger.info("Time per step with step(): %.1f us (%.1f us overhead)",
+                step_us, step_us - bare_us)
+    logger.info("Time per step with run_steps(): %.1f us (%.1f us overhead)",
+                run_us, run_us - bare_us)
+    analytics.add_data('bare_us', bare_us)
+    analytics.add_data('step_us', step_us)
+    analytics.add_data('run_us', run_us)
+
+
 def test_close_function(Simulator):
     m = nengo.Network()
     with m:
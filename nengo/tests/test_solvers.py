@@ -67,6 +67,29 @@ def test_cholesky(rng):
     assert np.allclose(x0, x2)
 
 
+@pytest.mark.parametrize('subsolver', [
+    lstsq.Cholesky(transpose=False), lstsq.Cholesky(transpose=True),
+    lstsq.SVD()])
+def test_cached_factorization(subsolver, rng):
+    A, b = get_system(200, 50, 3, rng=rng)
+    sigma = 0.1 * A.max()
+    x0, _ = subsolver(A, b, sigma)
+
+    A.setflags(write=False)
+    x1, _ = subsolver(A, b, sigma)
+    x2, _ = subsolver(A, 2 * b, sigma)
+    x3, _ = subsolver(A, b, 2 * sigma)
+    assert len(lstsq._factorizations[id(A)][1]) == (
+        1 if isinstance(subsolver, lstsq.SVD) else 2)
+    assert np.allclose(x0, x1)
+    assert np.allclose(2 * x0, x2)
+    assert not np.allclose(x0, x3)
+
+    key = id(A)
+    del A
+    assert key not in lstsq._factorizations
+
+
 def test_conjgrad(rng):
     A, b = get_system(1000, 100, 2, rng=rng)
     sigma = 0.1 * A.max()
@@ -1,5 +1,8 @@
 from __future__ import absolute_import
 
+import threading
+import weakref
+
 import numpy as np
 
 import nengo.utils.numpy as npext
@@ -22,6 +25,47 @@ def rmses(A, X, Y):
     return npext.rms(Y - np.dot(A, X), axis=0)
 
 
+# id(A) -> (weakref to A, {key: factorization}) for readonly matrices A
+_factorizations = {}
+_factorizations_lock = threading.RLock()
+
+
+def cached_factorization(A, key, factorize):
+    """Returns ``factorize()``, reusing the result for the same matrix.
+
+    The result is only reused if ``A`` is readonly, so that it cannot have
+    changed since it was factorized. This is the case for the activities
+    of an ensemble that are shared by all connections leaving it.
+    Factorizations are freed along with ``A``.
+
+    Parameters
+    ----------
+    A : ndarray
+        The matrix being factorized.
+    key : hashable
+        Identifies the factorization (e.g., the method and regularization).
+    factorize : callable
+        Computes the factorization of ``A``.
+    """
+    if A.flags.writeable:
+        return factorize()
+
+    def remove(ref, i=id(A)):
+        with _factorizations_lock:
+            if _factorizations.get(i, (None,))[0] is ref:
+                del _factorizations[i]
+
+    with _factorizations_lock:
+        ref, factors = _factorizations.get(id(A), (None, None))
+        if ref is None or ref() is not A:
+            factors = {}
+            _factorizations[id(A)] = (weakref.ref(A, remove), factors)
+        if key in factors:
+            return factors[key]
+
+    return factors.setdefault(key, factorize())
+
+
 class LeastSquaresSolver(FrozenObject):
     """Linear least squares system solver."""
 
@@ -45,26 +89,34 @@ class Cholesky(LeastSquaresSolver):
             # transpose if matrix is fat, but not if sigmas for each neuron
             transpose = m < n and sigma.size == 1
 
-        if transpose:
-            # substitution: x = A'*xbar, G*xbar = b where G = A*A' + lambda*I
-            G = np.dot(A, A.T)
-            b = y
-        else:
-            # multiplication by A': G*x = A'*b where G = A'*A + lambda*I
-            G = np.dot(A.T, A)
-            b = np.dot(A.T, y)
-
-        # add L2 regularization term 'lambda' = m * sigma**2
-        np.fill_diagonal(G, G.diagonal() + m * sigma**2)
+        def factorize():
+            if transpose:
+                # substitution: x = A'*xbar, G*xbar = b
+                # where G = A*A' + lambda*I
+                G = np.dot(A, A.T)
+            else:
+                # multiplication by A': G*x = A'*b where G = A'*A + lambda*I
+                G = np.dot(A.T, A)
+
+            # add L2 regularization term 'lambda' = m * sigma**2
+            np.fill_diagonal(G, G.diagonal() + m * sigma**2)
+
+            try:
+                import scipy.linalg
+                return scipy.linalg.cho_factor(G, overwrite_a=True)
+            except ImportError:
+                L = np.linalg.cholesky(G)
+                return np.linalg.inv(L.T)
+
+        factor = cached_factorization(
+            A, ('cholesky', transpose, np.asarray(sigma).tobytes()), factorize)
+        b = y if transpose else np.dot(A.T, y)
 
         try:
             import scipy.linalg
-            factor = scipy.linalg.cho_factor(G, overwrite_a=True)
             x = scipy.linalg.cho_solve(factor, b)
         except ImportError:
-            L = np.linalg.cholesky(G)
-            L = np.linalg.inv(L.T)
-            x = np.dot(L, np.dot(L.T, b))
+            x = np.dot(factor, np.dot(factor.T, b))
 
         x = np.dot(A.T, x) if transpose else x
         info = {'rmses': rmses(A, x, y)}
@@ -252,7 +304,8 @@ class SVD(LeastSquaresSolver):
 
     def __call__(self, A, Y, sigma, rng=None):
         Y, m, _, _, matrix_in = format_system(A, Y)
-        U, s, V = np.linalg.svd(A, full_matrices=0)
+        U, s, V = cached_factorization(
+            A, 'svd', lambda: np.linalg.svd(A, full_matrices=0))
         si = s / (s**2 + m * sigma**2)
         X = np.dot(V.T, si[:, None] * np.dot(U.T, Y))
         info = {'rmses': npext.rms(Y - np.dot(A, X), axis=0)}
@@ -133,13 +133,18 @@ def write(fileobj, metadata, array):
     fileobj.seek(array_end)
 
 
-def read(fileobj):
+def read(fileobj, mmap_mode=None):
     """Reads a Nengo cache object.
 
     Parameters
     ----------
     fileobj : file-like object
         The file object to read from.
+    mmap_mode : {None, 'r', 'c'}, optional (Default: None)
+        If not None, the array is memory-mapped from the file with the given
+        mode (see `numpy.memmap`) instead of being read into memory.
+        ``fileobj`` must then be a file on disk. Arrays that cannot be
+        memory-mapped (empty or object arrays) are read into memory.
 
     Returns
     -------
@@ -158,5 +163,28 @@ def read(fileobj):
             "NCO protocol version {} is not supported.".format(version))
 
     metadata = pickle.load(Subfile(fileobj, pickle_start, pickle_end))
-    array = np.load(Subfile(fileobj, array_start, array_end))
+    if mmap_mode is None:
+        array = np.load(Subfile(fileobj, array_start, array_end))
+    else:
+        array = _memmap_npy(
+            fileobj, Subfile(fileobj, array_start, array_end), mmap_mode)
     return metadata, array
+
+
+def _memmap_npy(fileobj, subfile, mmap_mode):
+    """Memory-maps the NPY data in ``subfile``, a part of ``fileobj``."""
+    npy_version = np.lib.format.read_magic(subfile)
+    if npy_version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(
+            subfile)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(
+            subfile)
+
+    if dtype.hasobject or np.prod(shape) == 0:
+        subfile.seek(0)
+        return np.load(subfile)
+
+    return np.memmap(fileobj.name, dtype=dtype, mode=mmap_mode,
+                     offset=subfile.start + subfile.tell(), shape=shape,
+                     order='F' if fortran_order else 'C')
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 import logging
+import threading
 
 import numpy as np
 
@@ -139,7 +140,8 @@ def rates_kernel(t, spikes, kind='gauss', tau=0.04):
 
 
 def settled_firingrate(step_math, J, states,
-                       dt=0.001, settle_time=0.1, sim_time=1.0):
+                       dt=0.001, settle_time=0.1, sim_time=1.0,
+                       check_time=None, rtol=1e-6, make_step=None):
     """Compute firing rates (in Hz) for given vector input, ``x``.
 
     Unlike the default naive implementation, this approach takes into
@@ -148,6 +150,22 @@ def settled_firingrate(step_math, J, states,
     initial transients settle. Then, we run the neurons for a second
     and find the average (which should approximate the firing rate).
 
+    Since the input currents are constant, many neurons soon either fire
+    periodically or settle to a fixed point. If ``check_time`` is given,
+    neurons are checked for both every ``check_time``, and those that are
+    found stop being simulated:
+
+    * A neuron fires periodically if its states right after its last spike
+      are equal to its states right after the last spike before the
+      previous check. Its rate is the number of spikes in between divided
+      by the time in between.
+    * A neuron is at a fixed point if it did not spike, and its output and
+      states did not change since the previous check.
+
+    Values are considered equal if they differ by at most ``rtol`` times
+    their magnitude (or ``rtol`` if the magnitude is less than 1). The
+    rates of the other neurons are averaged over ``sim_time``.
+
     Parameters
     ---------
     step_math : function
@@ -156,17 +174,384 @@ def settled_firingrate(step_math, J, states,
         a vector of currents to generate firing rates from
     *states : list of ndarrays
         additional state needed by the step function
+    dt : float, optional (Default: 0.001)
+        the simulation timestep
+    settle_time : float, optional (Default: 0.1)
+        how long to simulate before measuring the rates
+    sim_time : float, optional (Default: 1.0)
+        the longest time to average the rates over
+    check_time : float, optional (Default: None)
+        how often to check for periodic firing and fixed points, or None
+        to average all rates over ``sim_time``
+    rtol : float, optional (Default: 1e-6)
+        the relative tolerance of the periodicity and fixed point checks
+    make_step : function, optional (Default: None)
+        the ``make_step`` function of the neuron type. If given, it makes
+        one step function for the arrays, which is used for all steps
+        instead of ``step_math``.
     """
+    if make_step is None:
+        def make_step(dt, J, output, *states):
+            return lambda: step_math(dt, J, output, *states)
+
+    if check_time is None:
+        out = np.zeros_like(J)
+        total = np.zeros_like(J)
+        step = make_step(dt, J, out, *states)
+
+        # Simulate for the settle time
+        steps = int(settle_time / dt)
+        for _ in range(steps):
+            step()
+        # Simulate for sim time, and keep track
+        steps = int(sim_time / dt)
+        for _ in range(steps):
+            step()
+            total += out
+        return total / float(steps)
+    return _checked_firingrate(
+        make_step, J, states, dt, settle_time, sim_time, check_time, rtol)
+
+
+def _checked_firingrate(make_step, J, states, dt, settle_time, sim_time,
+                        check_time, rtol):
+    """Implements `.settled_firingrate` with periodicity checks."""
+    def close(x, y):
+        return np.abs(x - y) <= rtol * np.maximum(np.abs(x), 1)
+
+    J = np.array(J, dtype=np.float64)
+    shape = J.shape
+    J = J.reshape(-1)
+    states = [np.array(state, dtype=np.float64).reshape(-1)
+              for state in states]
     out = np.zeros_like(J)
-    total = np.zeros_like(J)
+    rates = np.zeros_like(J)
+    step_fn = make_step(dt, J, out, *states)
 
     # Simulate for the settle time
     steps = int(settle_time / dt)
     for _ in range(steps):
-        step_math(dt, J, out, *states)
+        step_fn()
+
+    # For the neurons still simulated (at indices ``active`` in ``rates``),
+    # track the total output, the number of spikes, and the step and states
+    # right after the last spike, now and at the previous check
+    active = np.arange(J.size)
+    total = np.zeros_like(J)
+    spiked = np.zeros(J.size, dtype=bool)
+    n_spikes = np.zeros(J.size, dtype=np.intp)
+    spike_step = np.zeros(J.size, dtype=np.intp)
+    spike_states = [np.zeros_like(J) for _ in states]
+    last = [x.copy() for x in [out] + states]
+    last_n_spikes = n_spikes.copy()
+    last_spike_step = spike_step.copy()
+    last_spike_states = [x.copy() for x in spike_states]
+
     # Simulate for sim time, and keep track
     steps = int(sim_time / dt)
-    for _ in range(steps):
-        step_math(dt, J, out, *states)
-        total += out
-    return total / float(steps)
+    check_steps = max(int(check_time / dt), 1)
+    step = 0
+    while step < steps and active.size > 0:
+        for _ in range(min(check_steps, steps - step)):
+            step_fn()
+            total += out
+            step += 1
+
+            np.equal(out, 1. / dt, out=spiked)
+            n_spikes += spiked
+            np.putmask(spike_step, spiked, step)
+            for state, spike_state in zip(states, spike_states):
+                np.putmask(spike_state, spiked, state)
+
+        periodic = (last_n_spikes > 0) & (n_spikes > last_n_spikes)
+        for x, x_last in zip(spike_states, last_spike_states):
+            periodic &= close(x, x_last)
+        rates[active[periodic]] = (
+            (n_spikes - last_n_spikes)[periodic]
+            / (dt * (spike_step - last_spike_step)[periodic]))
+
+        fixed = (n_spikes == last_n_spikes) & ~periodic
+        for x, x_last in zip([out] + states, last):
+            fixed &= close(x, x_last)
+        rates[active[fixed]] = out[fixed]
+
+        keep = ~(periodic | fixed)
+        if not keep.all():
+            active = active[keep]
+            J, out, total, spiked, n_spikes, spike_step = (
+                x[keep] for x in (J, out, total, spiked, n_spikes, spike_step))
+            states = [x[keep] for x in states]
+            spike_states = [x[keep] for x in spike_states]
+            step_fn = make_step(dt, J, out, *states)
+        last = [x.copy() for x in [out] + states]
+        last_n_spikes = n_spikes.copy()
+        last_spike_step = spike_step.copy()
+        last_spike_states = [x.copy() for x in spike_states]
+
+    rates[active] = total / float(steps)
+    return rates.reshape(shape)
+
+
+class RateTable(object):
+    """A lookup table approximating a neuron rate function.
+
+    ``function`` is tabulated at evenly spaced currents between ``lo`` and
+    ``hi`` and linearly interpolated in between. The number of points is
+    doubled until the interpolation error is at most ``tolerance`` in every
+    interval, except in a few intervals starting at ``lo`` where the
+    function may be too steep to tabulate (e.g., at the threshold of
+    `.LIFRate` neurons). Currents in these intervals, and above ``hi``
+    unless ``clip`` is True, are passed to ``function`` instead.
+    Currents below ``lo`` get the rate at ``lo``.
+
+    Parameters
+    ----------
+    function : callable
+        Maps an array of currents to an array of rates.
+    lo : float
+        The lowest tabulated current. The rate at ``lo`` is used for all
+        lower currents, so ``function`` must be constant (or within
+        ``tolerance`` of the rate at ``lo``) below it.
+    hi : float
+        The highest tabulated current.
+    tolerance : float
+        Maximum absolute error of the interpolated rates.
+    clip : bool, optional (Default: False)
+        Whether to use the rate at ``hi`` for higher currents, rather than
+        calling ``function``. Only set this if ``function`` is within
+        ``tolerance`` of the rate at ``hi`` above it.
+    max_points : int, optional (Default: 2**20)
+        Maximum number of points in the table.
+
+    Attributes
+    ----------
+    max_error : float
+        The largest interpolation error outside of the exact intervals,
+        measured at seven points within each interval.
+    exact_hi : float
+        Currents between ``lo`` and ``exact_hi`` are passed to ``function``.
+    n_points : int
+        The number of tabulated currents.
+    """
+
+    n_check = 7  # points per interval at which the error is measured
+    max_exact = 1. / 1024  # maximum fraction of exact intervals
+    block_size = 16384
+
+    def __init__(self, function, lo, hi, tolerance, clip=False,
+                 max_points=2**20):
+        if not lo < hi:
+            raise ValidationError("Must be less than 'hi' (got %s >= %s)"
+                                  % (lo, hi), attr='lo', obj=self)
+        if not tolerance > 0:
+            raise ValidationError("Must be positive (got %s)" % tolerance,
+                                  attr='tolerance', obj=self)
+        self.function = function
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.tolerance = tolerance
+        self.clip = clip
+
+        t = np.arange(1, self.n_check + 1) / float(self.n_check + 1)
+        n_points = 65
+        while True:
+            currents = np.linspace(self.lo, self.hi, n_points)
+            rates = function(currents)
+            check = function(
+                currents[:-1, np.newaxis] + np.outer(np.diff(currents), t))
+            interpolated = (rates[:-1, np.newaxis] +
+                            np.outer(np.diff(rates), t))
+            error = np.max(np.abs(check - interpolated), axis=1)
+
+            # intervals that do not meet the tolerance must all be at the
+            # start of the table, where they are computed exactly instead
+            bad = ~(error <= tolerance)
+            n_exact = np.argmin(bad) if not bad.all() else bad.size
+            if (not bad[n_exact:].any() and
+                    n_exact <= self.max_exact * bad.size):
+                break
+            if 2 * n_points - 1 > max_points:
+                raise ValidationError(
+                    "Cannot tabulate the rates to a tolerance of %s with at "
+                    "most %d points" % (tolerance, max_points),
+                    attr='tolerance', obj=self)
+            n_points = 2 * n_points - 1
+
+        self.n_points = n_points
+        self.exact_hi = currents[n_exact]
+        self.max_error = error[n_exact:].max()
+
+        # The tables are indexed by the position of the current relative to
+        # ``lo``, plus one, clipped to [0, n_points]. Index 0 holds currents
+        # below ``lo``, and index ``n_points`` currents at or above ``hi``.
+        self._scale = (n_points - 1) / (self.hi - self.lo)
+        self._offset = 1. - self.lo * self._scale
+        self._rates = np.concatenate([rates[:1], rates])
+        self._slopes = np.concatenate([[0.], np.diff(rates), [0.]])
+        self._exact = np.zeros(n_points + 1, dtype=bool)
+        self._exact[1:n_exact + 1] = True
+        self._exact[-1] = not clip
+
+    def __call__(self, J, output):
+        """Sets ``output`` to the approximate rates for currents ``J``.
+
+        Large arrays are processed in blocks of ``block_size`` elements,
+        so that the temporary arrays stay small and in the CPU cache.
+        """
+        J = np.asarray(J, dtype=np.float64)
+        out = (output if output.flags.c_contiguous
+               else np.empty(output.shape))
+        J_flat = J.reshape(-1)
+        out_flat = out.reshape(-1)
+
+        size = min(J_flat.size, self.block_size)
+        buffers = self._buffers(size)
+        for start in range(0, J_flat.size, size):
+            stop = min(start + size, J_flat.size)
+            self._lookup(J_flat[start:stop], out_flat[start:stop],
+                         *[b[:stop - start] for b in buffers])
+        if out is not output:
+            output[...] = out
+
+    def make_lookup(self, J, output):
+        """Returns a function setting ``output`` to the rates for ``J``.
+
+        The returned function takes no arguments and allocates memory
+        only for currents that are computed exactly.
+        """
+        buffers = self._buffers(output.shape)
+
+        def lookup():
+            self._lookup(J, output, *buffers)
+        return lookup
+
+    @staticmethod
+    def _buffers(shape):
+        return (np.empty(shape), np.empty(shape),
+                np.empty(shape, dtype=np.intp), np.empty(shape, dtype=bool))
+
+    def _lookup(self, J, output, x, y, index, exact):
+        np.multiply(J, self._scale, out=x)
+        np.add(x, self._offset, out=x)
+        np.clip(x, 0, self.n_points, out=x)
+        index[...] = x
+        np.subtract(x, index, out=x)
+        self._slopes.take(index, out=y, mode='clip')
+        np.multiply(x, y, out=x)
+        self._rates.take(index, out=y, mode='clip')
+        np.add(x, y, out=output)
+
+        self._exact.take(index, out=exact, mode='clip')
+        if exact.any():
+            output[exact] = self.function(J[exact])
+
+
+class RateGrid(object):
+    """Rates on a grid of input currents, computed as they are needed.
+
+    ``function`` is evaluated at multiples of ``resolution``, and rates at
+    other currents are linearly interpolated between them. The grid is
+    extended whenever rates outside of it are requested, so ``function`` is
+    evaluated only once for each grid current, no matter how many neurons
+    and evaluation points share it.
+
+    The grid can be shared between threads. It is extended by one thread at
+    a time, and replaced as a whole, so rates are always interpolated on a
+    consistent grid.
+
+    Parameters
+    ----------
+    function : callable
+        Maps an array of currents to an array of rates.
+    resolution : float
+        The spacing of the grid currents.
+    lo : float, optional (Default: None)
+        If given, the rate at ``lo`` is used for all lower currents, so
+        ``function`` must be constant below it.
+    hi : float, optional (Default: None)
+        If given, higher currents are passed to ``function`` instead,
+        so that a few large currents do not extend the grid by many points.
+
+    Attributes
+    ----------
+    currents : ndarray
+        The grid currents at which ``function`` has been evaluated.
+    rates : ndarray
+        The rates at ``currents``.
+    """
+
+    def __init__(self, function, resolution, lo=None, hi=None):
+        if resolution <= 0:
+            raise ValidationError("Must be positive", attr='resolution',
+                                  obj=self)
+        if lo is not None and hi is not None and hi < lo:
+            raise ValidationError("Must not be less than 'lo'", attr='hi',
+                                  obj=self)
+        self.function = function
+        self.resolution = resolution
+        self.lo = lo
+        self.hi = hi
+        self._lock = threading.Lock()
+        # (grid index of the first current, currents, rates), replaced as a
+        # whole when the grid is extended
+        self._grid = (0, np.zeros(0), np.zeros(0))
+
+    @property
+    def currents(self):
+        return self._grid[1]
+
+    @property
+    def rates(self):
+        return self._grid[2]
+
+    def __call__(self, J):
+        J = np.asarray(J, dtype=np.float64)
+        if J.size == 0:
+            return np.zeros_like(J)
+        if self.lo is not None:
+            J = np.maximum(J, self.lo)
+        if self.hi is not None and J.max() > self.hi:
+            above = J > self.hi
+            rates = np.empty_like(J)
+            rates[above] = self.function(J[above])
+            if not above.all():
+                rates[~above] = self(J[~above])
+            return rates
+        currents, rates = self.extend(J.min(), J.max())
+        return np.interp(J, currents, rates)
+
+    def extend(self, lo, hi):
+        """Evaluate ``function`` on the grid currents needed for
+        interpolating between ``lo`` and ``hi``.
+
+        Returns the ``currents`` and ``rates`` of a grid covering them.
+        """
+        lo = int(np.floor(lo / self.resolution))
+        hi = int(np.ceil(hi / self.resolution))
+        first, currents, _ = grid = self._grid
+        if currents.size == 0 or lo < first or hi >= first + currents.size:
+            with self._lock:
+                grid = self._extend(lo, hi)
+        return grid[1], grid[2]
+
+    def _extend(self, lo, hi):
+        """Extends the grid to the grid indices ``lo`` to ``hi``."""
+        first, currents, rates = self._grid
+        n = currents.size
+        if n == 0:
+            below, above = np.arange(lo, hi + 1), np.arange(0)
+        else:
+            below = np.arange(lo, first)
+            above = np.arange(first + n, hi + 1)
+        if below.size + above.size == 0:
+            return self._grid
+
+        # evaluate all new currents in a single call to ``function``
+        new = np.concatenate([below, above]) * self.resolution
+        new_rates = np.asarray(self.function(new), dtype=np.float64)
+        self._grid = (
+            min(lo, first) if n > 0 else lo,
+            np.concatenate([new[:below.size], currents, new[below.size:]]),
+            np.concatenate(
+                [new_rates[:below.size], rates, new_rates[below.size:]]))
+        return self._grid
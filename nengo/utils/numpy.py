@@ -3,6 +3,8 @@ Extra functions to extend the capabilities of Numpy.
 """
 from __future__ import absolute_import
 
+import sys
+
 import numpy as np
 
 from .compat import PY2, is_integer, is_iterable
@@ -81,13 +83,25 @@ def array_hash(a, n=100):
         return hash(v.data if PY2 else v.data.tobytes())
 
 
+def is_spmatrix(obj):
+    """Check if ``obj`` is a SciPy sparse matrix.
+
+    SciPy is not imported if it has not been imported already, since
+    no sparse matrices can exist in that case.
+    """
+    sparse = sys.modules.get('scipy.sparse', None)
+    return sparse is not None and sparse.issparse(obj)
+
+
 def array_base(x):
     """Get base array (that is *not* a view) for ``x``.
 
     In Numpy >= 1.7, this is simply ``x.base``. However, in Numpy <= 1.6,
     we need to loop back through the bases, since bases can be views.
+    Bases that are not arrays (e.g., the ``mmap`` of a `numpy.memmap`)
+    are not followed.
     """
-    while x.base is not None:
+    while isinstance(x.base, np.ndarray):
         x = x.base
     return x
 
@@ -1,31 +1,20 @@
 from collections import defaultdict
-import itertools
+import heapq
+
+import numpy as np
 
 from .compat import iteritems
-from .graphs import add_edges
+from .graphs import toposort
 from .stdlib import groupby
 
 
 def operator_depencency_graph(operators):  # noqa: C901
-    # -- all views of a base object in a particular dictionary
-    by_base_sets = defaultdict(set)
-    by_base_writes = defaultdict(set)
-    by_base_reads = defaultdict(set)
     reads = defaultdict(list)
     sets = defaultdict(list)
     incs = defaultdict(list)
     ups = defaultdict(list)
 
     for op in operators:
-        for sig in op.sets:
-            by_base_sets[sig.base].add(sig)
-
-        for sig in op.sets + op.incs:
-            by_base_writes[sig.base].add(sig)
-
-        for sig in op.reads:
-            by_base_reads[sig.base].add(sig)
-
         for sig in op.reads:
             reads[sig].append(op)
 
@@ -38,7 +27,8 @@ def operator_depencency_graph(operators):  # noqa: C901
         for sig in op.updates:
             ups[sig].append(op)
 
-    validate_ops(sets, ups, incs)
+    overlaps = signal_overlaps(set(reads).union(sets, incs, ups))
+    validate_ops(sets, ups, incs, overlaps=overlaps)
 
     # -- Scheduling algorithm for serial evaluation:
     #    1) All sets on a given memory block
@@ -48,34 +38,76 @@ def operator_depencency_graph(operators):  # noqa: C901
 
     dg = {op: set() for op in operators}  # ops are nodes of the graph
 
+    def add_deps(pre_sigs, pre_dicts, post_ops):
+        pre_ops = set()
+        for sig in pre_sigs:
+            for d in pre_dicts:
+                pre_ops.update(d.get(sig, ()))
+        for pre_op in pre_ops:
+            dg[pre_op].update(post_ops)
+
     # -- incs depend on sets
     for sig, post_ops in iteritems(incs):
-        pre_ops = list(sets[sig])
-        for sig2 in by_base_sets[sig.base]:
-            if sig.may_share_memory(sig2):
-                pre_ops.extend(sets[sig2])
-        add_edges(dg, itertools.product(set(pre_ops), post_ops))
+        add_deps(overlaps[sig], (sets,), post_ops)
 
     # -- reads depend on writes (sets and incs)
     for sig, post_ops in iteritems(reads):
-        pre_ops = sets[sig] + incs[sig]
-        for sig2 in by_base_writes[sig.base]:
-            if sig.may_share_memory(sig2):
-                pre_ops.extend(sets[sig2] + incs[sig2])
-        add_edges(dg, itertools.product(set(pre_ops), post_ops))
+        add_deps(overlaps[sig], (sets, incs), post_ops)
 
     # -- updates depend on reads, sets, and incs.
     for sig, post_ops in iteritems(ups):
-        pre_ops = sets[sig] + incs[sig] + reads[sig]
-        for sig2 in by_base_reads[sig.base].union(by_base_writes[sig.base]):
-            if sig.may_share_memory(sig2):
-                pre_ops.extend(sets[sig2] + incs[sig2] + reads[sig2])
-        add_edges(dg, itertools.product(set(pre_ops), post_ops))
+        add_deps(overlaps[sig], (sets, incs, reads), post_ops)
 
     return dg
 
 
-def validate_ops(sets, ups, incs):
+def signal_overlaps(signals):
+    """Finds the signals that may share memory with each signal.
+
+    This gives the same result as calling `.Signal.may_share_memory` on all
+    pairs of views of the same base, but sorts the views of each base by
+    their memory bounds and sweeps over them, which takes
+    ``O(n log n + k)`` time for ``n`` views with ``k`` overlapping pairs.
+
+    Returns a dict mapping each signal to the set of signals that may share
+    memory with it, which always includes the signal itself.
+    """
+    overlaps = {sig: {sig} for sig in signals}
+    for _, views in groupby(overlaps, lambda s: s.base, hashable=True):
+        bounds = sorted((np.byte_bounds(sig.initial_value) + (i,)
+                         for i, sig in enumerate(views)))
+        active = []  # heap of (high, i) for views that may overlap the next
+        for low, high, i in bounds:
+            while active and active[0][0] <= low:
+                heapq.heappop(active)
+            if high <= low:
+                continue  # empty views do not share memory
+            sig = views[i]
+            for _, j in active:
+                overlaps[sig].add(views[j])
+                overlaps[views[j]].add(sig)
+            heapq.heappush(active, (high, i))
+    return overlaps
+
+
+def operator_layers(dg):
+    """Assigns each operator the length of the longest path leading to it.
+
+    Operators in the same layer cannot depend on each other, directly or
+    indirectly. They can therefore be merged or run in any order
+    (or concurrently, as long as they do not increment the same signals).
+    """
+    layers = dict.fromkeys(dg, 0)
+    for op in toposort(dg):
+        for post in dg[op]:
+            layers[post] = max(layers[post], layers[op] + 1)
+    return layers
+
+
+def validate_ops(sets, ups, incs, overlaps=None):
+    if overlaps is None:
+        overlaps = signal_overlaps(set(sets).union(ups, incs))
+
     # -- assert that only one op sets any particular view
     for sig in sets:
         sig_sets = sets[sig] + (sets.get(sig.base, []) if sig.is_view else [])
@@ -87,20 +119,22 @@ def validate_ops(sets, ups, incs):
         assert len(sig_ups) == 1, (sig, sig_ups)
 
     # --- assert that any sig that is incremented is also set/updated
+    #     (possibly through another view overlapping it, e.g. after merging)
     for sig in incs:
         sig_sets_ups = sets.get(sig, []) + ups.get(sig, []) + (
             sets.get(sig.base, []) + ups.get(sig.base, [])
             if sig.is_view else [])
-        assert len(sig_sets_ups) > 0, (sig)
+        assert len(sig_sets_ups) > 0 or any(
+            sig2 in sets or sig2 in ups for sig2 in overlaps[sig]), (sig)
 
     # -- assert that no two views are both set and aliased
-    for _, base_group in groupby(sets, lambda x: x.base, hashable=True):
-        for sig, sig2 in itertools.combinations(base_group, 2):
-            assert not sig.may_share_memory(sig2), (
+    for sig in sets:
+        for sig2 in overlaps[sig]:
+            assert sig2 is sig or sig2 not in sets, (
                 "%s shares memory with %s" % (sig, sig2))
 
     # -- assert that no two views are both updated and aliased
-    for _, base_group in groupby(ups, lambda x: x.base, hashable=True):
-        for sig, sig2 in itertools.combinations(base_group, 2):
-            assert not sig.may_share_memory(sig2), (
+    for sig in ups:
+        for sig2 in overlaps[sig]:
+            assert sig2 is sig or sig2 not in ups, (
                 "%s shares memory with %s" % (sig, sig2))
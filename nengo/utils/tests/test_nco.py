@@ -103,3 +103,24 @@ def test_nco_roundtrip(tmpdir):
 
     assert pickle_data == pickle_data2
     assert_equal(array, array2)
+
+
+@pytest.mark.parametrize('array', [
+    np.array([[4., 3.], [2., 1.]]), np.asfortranarray(np.eye(3)), np.ones(0)])
+def test_nco_mmap(array, tmpdir):
+    tmpfile = tmpdir.join('test.nco')
+
+    with tmpfile.open('wb') as f:
+        nco.write(f, 'first', np.arange(5))
+        start = f.tell()
+        nco.write(f, 'second', array)
+
+    with tmpfile.open('rb') as f:
+        f.seek(start)
+        pickle_data, array2 = nco.read(f, mmap_mode='r')
+
+    assert pickle_data == 'second'
+    assert_equal(array, array2)
+    if array.size > 0:
+        assert isinstance(array2, np.memmap)
+        assert not array2.flags.writeable
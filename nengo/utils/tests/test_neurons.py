@@ -1,13 +1,18 @@
+import time
+
 import pytest
 
 import numpy as np
 
 import nengo
 from nengo.dists import Choice
+from nengo.exceptions import ValidationError
 from nengo.processes import WhiteSignal
 from nengo.utils.matplotlib import implot
-from nengo.utils.neurons import rates_isi, rates_kernel
+from nengo.utils.neurons import (
+    RateGrid, RateTable, rates_isi, rates_kernel, settled_firingrate)
 from nengo.utils.numpy import rms
+from nengo.utils.testing import ThreadedAssertion
 
 
 def _test_rates(Simulator, rates, plt, seed):
@@ -91,3 +96,173 @@ def test_rates(Simulator, seed, logger):
         rel_rmse = _test_rates(Simulator, function, None, seed)
         logger.info('rate estimator: %s', name)
         logger.info('relative RMSE: %0.4f', rel_rmse)
+
+
+def test_rate_table(rng):
+    def function(J):
+        # steep at zero, like the LIF response curve at the threshold
+        return np.sqrt(np.maximum(J, 0))
+
+    tolerance = 1e-3
+    table = RateTable(function, 0., 10., tolerance)
+    assert table.max_error <= tolerance
+    assert 0 < table.exact_hi <= 10 * table.max_exact
+
+    J = rng.uniform(-2, 12, size=(50, 1000))
+    J[0, :3] = [0., table.exact_hi, 10.]
+    out = np.zeros_like(J)
+    table(J, out)
+    assert np.allclose(out, function(J), atol=1.05 * tolerance, rtol=0)
+    assert np.all(out[J <= 0] == 0)
+    exact = ((J > 0) & (J < table.exact_hi)) | (J > 10)
+    assert np.array_equal(out[exact], function(J[exact]))
+
+    # blocks, preallocated lookups, and non-contiguous outputs all agree
+    table.block_size = 999
+    out2 = np.zeros_like(J)
+    table(J, out2)
+    assert np.array_equal(out, out2)
+    out2[...] = 0
+    table.make_lookup(J, out2)()
+    assert np.array_equal(out, out2)
+    out2 = np.zeros(J.shape[::-1]).T
+    table(J, out2)
+    assert np.array_equal(out, out2)
+
+
+def test_rate_table_clip():
+    table = RateTable(np.tanh, -5, 5, 1e-3, clip=True)
+    out = np.zeros(4)
+    table(np.array([-10., -5., 5., 100.]), out)
+    assert np.array_equal(out, np.tanh([-5., -5., 5., 5.]))
+
+
+def test_rate_table_errors():
+    with pytest.raises(ValidationError):
+        RateTable(np.sin, 1., 0., 1e-3)
+    with pytest.raises(ValidationError):
+        RateTable(np.sin, 0., 1., 0.)
+    with pytest.raises(ValidationError):
+        RateTable(lambda J: np.sin(100 * J), 0., 10., 1e-6, max_points=1000)
+
+
+def test_settled_firingrate():
+    dt = 0.001
+    J = np.linspace(-10, 40, 400).reshape(20, 20)
+    izh = nengo.Izhikevich()
+    n_steps = [0]
+
+    def step_math(dt, J, output, voltage, recovery):
+        n_steps[0] += J.size
+        izh.step_math(dt, J, output, voltage, recovery)
+
+    def states():
+        return [np.zeros_like(J), np.zeros_like(J)]
+
+    # by default, all neurons are simulated for the whole time
+    rates = settled_firingrate(step_math, J, states(), dt=dt)
+    assert n_steps[0] == J.size * 1100
+    spiked, total, state = np.zeros_like(J), np.zeros_like(J), states()
+    for i in range(1100):
+        izh.step_math(dt, J, spiked, *state)
+        total += spiked if i >= 100 else 0
+    assert np.array_equal(rates, total / 1000.)
+
+    n_steps[0] = 0
+    rates = settled_firingrate(step_math, J, states(), dt=dt, check_time=0.05)
+    assert rates.shape == J.shape
+    assert np.all(rates[J <= 0] == 0)
+
+    # many neurons fire periodically or not at all, and stop early
+    assert n_steps[0] < 0.7 * J.size * 1100
+
+    # without early stopping, the rates are averaged over a long time
+    ref = settled_firingrate(izh.step_math, J, states(), dt=dt,
+                             settle_time=1., sim_time=10.)
+    assert np.allclose(rates, ref, atol=2., rtol=0)
+
+    # rate neurons reach a fixed point after one step
+    rates = settled_firingrate(nengo.LIFRate().step_math, J, [], dt=dt,
+                               check_time=0.05)
+    assert np.allclose(rates, nengo.LIFRate().rates(J, 1., 0.))
+
+    # with ``make_step``, one step function is made for each set of arrays
+    make_steps = []
+
+    def make_step(dt, J, output, *states):
+        make_steps.append(J.size)
+        return izh.make_step(dt, J, output, *states)
+
+    n_steps[0] = 0
+    assert np.array_equal(
+        settled_firingrate(step_math, J, states(), dt=dt,
+                           make_step=make_step),
+        settled_firingrate(step_math, J, states(), dt=dt))
+    assert make_steps == [J.size]
+    assert n_steps[0] == J.size * 1100
+    del make_steps[:]
+    assert np.array_equal(
+        settled_firingrate(step_math, J, states(), dt=dt, check_time=0.05,
+                           make_step=make_step),
+        settled_firingrate(step_math, J, states(), dt=dt, check_time=0.05))
+    assert make_steps[0] == J.size and len(make_steps) <= 21
+    assert make_steps == sorted(make_steps, reverse=True)
+
+
+def test_rate_grid():
+    calls = []
+
+    def function(J):
+        calls.append(J)
+        return 2 * J + 1
+
+    grid = RateGrid(function, 0.5, lo=-1.)
+    assert np.allclose(grid(np.array([0.2, 1.1])), [1.4, 3.2])
+    assert np.allclose(calls[-1], [0., 0.5, 1., 1.5])
+
+    # each grid current is only evaluated once
+    J = np.array([[-3., 0.3], [2.1, 0.7]])
+    assert np.allclose(grid(J), 2 * np.maximum(J, -1.) + 1)
+    assert len(calls) == 2
+    assert np.allclose(calls[-1], [-1., -0.5, 2., 2.5])
+    assert np.allclose(grid.currents, np.arange(-1., 2.6, 0.5))
+    grid(np.linspace(-5, 2.5, 7))
+    assert len(calls) == 2
+
+    # currents above ``hi`` are passed to the function, not gridded
+    grid = RateGrid(function, 0.5, lo=-1., hi=1.)
+    assert np.allclose(grid(np.array([0.2, 1e6])), [1.4, 2e6 + 1])
+    assert np.allclose(calls[-2], [1e6])
+    assert np.allclose(grid.currents, [0., 0.5])
+
+    with pytest.raises(ValidationError):
+        RateGrid(function, 0.)
+    with pytest.raises(ValidationError):
+        RateGrid(function, 0.5, lo=1., hi=0.)
+
+
+def test_rate_grid_threadsafe():
+    evaluated = []
+
+    def function(J):
+        evaluated.extend(J)
+        time.sleep(0.001)  # give other threads a chance to run
+        return 2 * J + 1
+
+    grid = RateGrid(function, 0.25)
+
+    class ExtendGrid(ThreadedAssertion):
+        def init_thread(self, worker):
+            worker.rng = np.random.RandomState(worker.n)
+
+        def assert_thread(self, worker):
+            # each call needs the grid to be extended, up or down
+            for i in range(20):
+                J = worker.rng.uniform(-i - 1, i + 1, size=10)
+                assert np.allclose(grid(J), 2 * J + 1)
+
+    ExtendGrid(n_threads=4)
+
+    # each grid current is still evaluated only once
+    assert len(evaluated) == len(set(evaluated)) == grid.currents.size
+    assert np.allclose(np.diff(grid.currents), 0.25)
@@ -0,0 +1,96 @@
+import itertools
+import timeit
+
+import numpy as np
+import pytest
+
+import nengo
+from nengo.builder.operator import Copy, Reset, SlicedCopy
+from nengo.builder.signal import Signal
+from nengo.utils.simulator import (
+    operator_depencency_graph, signal_overlaps, validate_ops)
+
+
+def test_signal_overlaps(rng):
+    base = Signal(np.zeros((6, 8)), name="base")
+    other = Signal(np.zeros(8), name="other")
+    views = [base, base[0], base[1:3], base[:, 2], base[2:4, 5:], base[5, 1],
+             base[3:3], other, other[:4], other[3:], other[4:]]
+    for _ in range(20):
+        i, j = rng.randint(0, 6, size=2)
+        views.append(base[min(i, j):max(i, j), i:])
+
+    overlaps = signal_overlaps(views)
+    for sig, sig2 in itertools.product(views, views):
+        assert (sig2 in overlaps[sig]) == (
+            sig is sig2 or (sig.base is sig2.base
+                            and sig.may_share_memory(sig2)))
+
+
+def test_validate_ops():
+    base = Signal(np.zeros(4), name="base")
+    sets = {base[:2]: ['a'], base[2:]: ['b']}
+    validate_ops(sets, {}, {base[1:3]: ['c']})
+
+    with pytest.raises(AssertionError):
+        validate_ops({base[:3]: ['a'], base[2:]: ['b']}, {}, {})
+    with pytest.raises(AssertionError):
+        validate_ops(sets, {}, {Signal(np.zeros(2)): ['c']})
+
+
+def test_operator_depencency_graph():
+    base = Signal(np.zeros(4), name="base")
+    dst = Signal(np.zeros(2), name="dst")
+    out = Signal(np.zeros(1), name="out")
+    reset, reset_dst = Reset(base), Reset(dst)
+    incs = [SlicedCopy(base[:2], dst, inc=True),
+            SlicedCopy(base[2:], dst, inc=True)]
+    read = Copy(dst[1:], out)
+
+    dg = operator_depencency_graph([reset, reset_dst, read] + incs)
+    assert dg[reset] == set(incs)
+    assert dg[reset_dst] == set(incs + [read])
+    assert all(dg[op] == {read} for op in incs)
+    assert dg[read] == set()
+
+
+def test_model_dependency_graph(RefSimulator, seed):
+    with nengo.Network(seed=seed) as net:
+        u = nengo.Node(output=[0.5, -0.5])
+        a = nengo.networks.EnsembleArray(10, 2)
+        nengo.Connection(u, a.input)
+        nengo.Connection(a.output[0], a.input[1])
+        nengo.Probe(a.output)
+
+    with RefSimulator(net, optimize=False) as sim:
+        operators = sim.model.operators
+
+    # compare to checking all pairs of signals
+    def accesses(op):
+        return [(sig, 0) for sig in op.sets] + [
+            (sig, 1) for sig in op.incs] + [
+            (sig, 2) for sig in op.reads] + [(sig, 3) for sig in op.updates]
+
+    expected = {op: set() for op in operators}
+    for pre, post in itertools.product(operators, operators):
+        for (sig, i), (sig2, j) in itertools.product(
+                accesses(pre), accesses(post)):
+            if i < j and sig.base is sig2.base and (
+                    sig is sig2 or sig.may_share_memory(sig2)):
+                expected[pre].add(post)
+    assert operator_depencency_graph(operators) == expected
+
+
+@pytest.mark.benchmark
+@pytest.mark.slow
+def test_dependency_graph_benchmark(analytics, logger):
+    for n_ops in (1000, 10000, 100000, 1000000):
+        x = Signal(np.zeros(n_ops + 1), name="x")
+        y = Signal(np.zeros(n_ops + 1), name="y")
+        ops = [Reset(y)] + [SlicedCopy(x[i:i + 2], y[i:i + 2], inc=True)
+                            for i in range(n_ops - 1)]
+
+        t = min(timeit.repeat(
+            lambda: operator_depencency_graph(ops), number=1, repeat=3))
+        logger.info("%d operators: %.3f s", len(ops), t)
+        analytics.add_data('dg_%d' % n_ops, t)
@@ -34,6 +34,9 @@ setup(
     author_email="info@appliedbrainresearch.com",
     packages=find_packages(),
     scripts=[],
+    entry_points={
+        'console_scripts': ['nengo-cache = nengo.cache:main'],
+    },
     data_files=[('nengo', ['nengo-data/nengorc'])],
     url="https://github.com/nengo/nengo",
     license="Free for non-commercial use",